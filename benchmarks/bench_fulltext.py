@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关键字搜索性能对比：LIKE 模糊匹配 vs FTS5 全文索引
+
+在临时数据库中生成指定数量的帖子，分别用 get_lost_items 原来的 LIKE 查询
+和全文索引查询执行同一组关键字（取一页 + 统计总数），输出每个关键字的中位延迟。
+
+用法:
+    python benchmarks/bench_fulltext.py                 # 默认 10 万和 100 万条
+    python benchmarks/bench_fulltext.py --sizes 20000   # 快速试跑
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# 添加项目根目录和 server 目录到Python路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, "server"))
+
+import fulltext
+from frontend.init_database import init_database
+
+ITEM_NAMES = ["黑色手机", "蓝牙耳机", "校园卡", "钱包", "雨伞", "U盘", "钥匙串", "高数课本",
+              "保温杯", "眼镜", "充电宝", "身份证", "笔记本电脑", "学生证", "手表", "iPhone 13"]
+ADJECTIVES = ["红色的", "蓝色的", "黑色的", "白色的", "旧的", "全新的", "带挂件的", "贴了贴纸的"]
+LOCATIONS = ["图书馆三楼", "第一食堂", "第二食堂", "教学楼A区", "教学楼B区", "体育馆",
+             "操场", "宿舍楼下", "实验楼", "校门口公交站"]
+TYPES = ["失物信息", "招领信息"]
+CATEGORIES = ["书本", "耳机", "雨伞", "钱包", "钥匙", "U盘", "手机", "证件", "其他"]
+
+KEYWORDS = ["手机", "图书馆", "蓝牙耳机", "校园卡", "贴纸", "iphone", "phone", "不存在的物品"]
+
+PAGE_SQL = """
+    SELECT p.id, p.item_name, p.created_at, u.username
+    FROM {from_clause}
+    LEFT JOIN users u ON p.user_id = u.id
+    WHERE {where}
+    ORDER BY p.created_at DESC
+    LIMIT 50 OFFSET 0
+"""
+COUNT_SQL = "SELECT COUNT(*) FROM {from_clause} WHERE {where}"
+
+
+def populate(db_path: str, size: int, seed: int = 42):
+    """生成 size 条帖子"""
+    rng = random.Random(seed)
+    init_database(db_path)
+    conn = sqlite3.connect(db_path)
+    fulltext.register_functions(conn)
+    conn.executemany(
+        "INSERT INTO users (username, password, salt) VALUES (?, 'x', 'x')",
+        [(f"user{i}",) for i in range(1000)]
+    )
+    batch = []
+    for i in range(size):
+        name = rng.choice(ITEM_NAMES)
+        batch.append((
+            rng.randint(1, 1000),
+            rng.choice(TYPES),
+            name,
+            rng.choice(CATEGORIES),
+            f"{rng.choice(ADJECTIVES)}{name}，在{rng.choice(LOCATIONS)}附近",
+            rng.choice(LOCATIONS),
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00",
+        ))
+        if len(batch) == 10000:
+            _insert(conn, batch)
+            batch = []
+    if batch:
+        _insert(conn, batch)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def _insert(conn, rows):
+    conn.executemany(
+        "INSERT INTO posts (user_id, type, item_name, item_category, description, location, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+
+def like_query(keyword):
+    where = "(p.item_name LIKE ? OR p.description LIKE ? OR p.location LIKE ?)"
+    param = f"%{keyword}%"
+    return "posts p", where, [param, param, param]
+
+
+def fts_query(keyword):
+    """与 get_lost_items 相同：关键字无法走索引（含英文或数字等）时退回 LIKE"""
+    match = fulltext.build_match_query(keyword)
+    if match is None:
+        return like_query(keyword)
+    return "posts_fts JOIN posts p ON p.id = posts_fts.rowid", "posts_fts MATCH ?", [match]
+
+
+def time_query(conn, builder, keyword, repeat):
+    """执行一页查询 + 总数统计，返回中位耗时（毫秒）和命中总数"""
+    from_clause, where, params = builder(keyword)
+    page_sql = PAGE_SQL.format(from_clause=from_clause, where=where)
+    count_sql = COUNT_SQL.format(from_clause=from_clause, where=where)
+    samples = []
+    total = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(page_sql, params).fetchall()
+        total = conn.execute(count_sql, params).fetchone()[0]
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), total
+
+
+def run(size: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        populate(db_path, size)
+        print(f"\n=== {size} 条帖子（生成耗时 {time.perf_counter() - start:.1f}s）===")
+        print(f"{'关键字':<12}{'命中':>10}{'LIKE(ms)':>12}{'FTS5(ms)':>12}{'加速比':>10}")
+
+        conn = sqlite3.connect(db_path)
+        fulltext.register_functions(conn)
+        for keyword in KEYWORDS:
+            like_ms, like_total = time_query(conn, like_query, keyword, repeat)
+            fts_ms, fts_total = time_query(conn, fts_query, keyword, repeat)
+            speedup = like_ms / fts_ms if fts_ms else float("inf")
+            mark = "" if like_total == fts_total else f"  (LIKE 命中 {like_total})"
+            print(f"{keyword:<12}{fts_total:>10}{like_ms:>12.2f}{fts_ms:>12.2f}{speedup:>9.1f}x{mark}")
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LIKE 与 FTS5 关键字搜索延迟对比")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="帖子数量")
+    parser.add_argument("--repeat", type=int, default=5, help="每个关键字重复次数")
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
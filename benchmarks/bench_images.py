@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片下载吞吐：每秒能返回多少张图片
+
+在临时目录生成一批按内容哈希命名的图片，用 werkzeug 多线程服务器跑 flask_app，
+多个客户端线程用长连接反复请求 /data/uploads/...，分别测试：
+  full   完整下载
+  304    带 If-None-Match 的条件请求
+  range  只取前 16KB（Range 请求）
+并对比开启/关闭文件描述符缓存的结果。
+
+用法:
+    python benchmarks/bench_images.py
+    python benchmarks/bench_images.py --clients 16 --duration 10 --size 200000
+"""
+import argparse
+import hashlib
+import http.client
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目根目录和 server 目录到Python路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, "server"))
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import flask_app
+from static_files import UploadServer
+
+MODES = ("full", "304", "range")
+
+
+class QuietHandler(WSGIRequestHandler):
+    """长连接且不打印访问日志"""
+    protocol_version = "HTTP/1.1"
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def create_images(root: str, count: int, size: int, seed: int = 42) -> list:
+    """生成 count 个随机内容的图片文件，返回 URL 路径列表"""
+    rng = random.Random(seed)
+    urls = []
+    for _ in range(count):
+        data = rng.randbytes(size)
+        digest = hashlib.sha256(data).hexdigest()
+        relative = f"{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+        path = os.path.join(root, *relative.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        urls.append(f"/data/uploads/{relative}")
+    return urls
+
+
+def client_loop(port: int, urls: list, mode: str, deadline: float, counter: list, index: int):
+    """单个客户端：长连接循环请求，直到 deadline"""
+    rng = random.Random(index)
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    etags = {}
+    done = 0
+    received = 0
+    while time.perf_counter() < deadline:
+        url = rng.choice(urls)
+        headers = {}
+        if mode == "304" and url in etags:
+            headers["If-None-Match"] = etags[url]
+        elif mode == "range":
+            headers["Range"] = "bytes=0-16383"
+        conn.request("GET", url, headers=headers)
+        response = conn.getresponse()
+        body = response.read()
+        if response.status not in (200, 206, 304):
+            raise RuntimeError(f"{url}: HTTP {response.status}")
+        etags[url] = response.getheader("ETag")
+        done += 1
+        received += len(body)
+    conn.close()
+    counter[index] = (done, received)
+
+
+def run(port: int, urls: list, mode: str, clients: int, duration: float) -> tuple:
+    """返回 (每秒图片数, 每秒 MB)"""
+    counter = [(0, 0)] * clients
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client_loop, args=(port, urls, mode, deadline, counter, i))
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = sum(done for done, _ in counter)
+    received = sum(size for _, size in counter)
+    return total / elapsed, received / elapsed / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图片下载吞吐基准")
+    parser.add_argument("--images", type=int, default=500, help="图片数量")
+    parser.add_argument("--size", type=int, default=60_000, help="每张图片字节数")
+    parser.add_argument("--clients", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--duration", type=float, default=5.0, help="每项测试秒数")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_images_")
+    urls = create_images(root, args.images, args.size)
+
+    print(f"{args.images} 张图片 x {args.size} 字节，{args.clients} 个客户端，每项 {args.duration} 秒")
+    print(f"{'描述符缓存':<10}{'模式':<8}{'图片/秒':>12}{'MB/秒':>10}")
+    for fd_cache_size in (1024, 0):
+        flask_app.upload_server = UploadServer(root, fd_cache_size=fd_cache_size)
+        server = make_server("127.0.0.1", 0, flask_app.app, threaded=True, request_handler=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            for mode in MODES:
+                rate, mb_rate = run(server.server_port, urls, mode, args.clients, args.duration)
+                label = "开启" if fd_cache_size else "关闭"
+                print(f"{label:<10}{mode:<8}{rate:>12.0f}{mb_rate:>10.1f}")
+        finally:
+            server.shutdown()
+            if flask_app.upload_server.fd_cache is not None:
+                print(f"  {flask_app.upload_server.fd_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
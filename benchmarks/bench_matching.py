@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+失物/招领匹配延迟
+
+用 dataset.py 生成指定规模的数据集（match_terms 倒排索引由触发器同步建立），随机抽取
+active 帖子，分别测：
+  find     只计算匹配（索引缩小候选 + 打分），即 /api/post 之后写线程上的读部分
+  refresh  计算并写入 matches 表（refresh_matches，每次一个事务）
+输出 p50/p95/p99 延迟、平均候选数和匹配数，以及倒排索引的行数。
+
+生成 100 万条帖子需要几分钟，可以用 --db 保留数据库重复测试。
+
+用法:
+    python benchmarks/bench_matching.py                          # 100 万条帖子
+    python benchmarks/bench_matching.py --posts 100000 --samples 200
+    python benchmarks/bench_matching.py --db /tmp/match_1m.db    # 不存在时生成，存在时直接使用
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+# 添加项目根目录和 server 目录到Python路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, "server"))
+
+import dataset
+import fulltext
+import matching
+from db_pool import DEFAULT_PRAGMAS
+from load_test import percentile
+
+
+def open_db(db_path: str):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    for name, value in DEFAULT_PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    fulltext.register_functions(conn)
+    return conn
+
+
+def measure(conn, post_ids: list, mode: str) -> dict:
+    timings = []
+    candidates = 0
+    matched = 0
+    for post_id in post_ids:
+        if mode == "find":
+            row = conn.execute(f"SELECT {matching._POST_COLUMNS} FROM posts WHERE id = ?", (post_id,)).fetchone()
+            start = time.perf_counter()
+            result = matching.find_matches(conn, post_id)
+            timings.append(time.perf_counter() - start)
+            post = matching._Post(row)
+            candidates += len(matching.find_candidates(conn, post, fulltext.match_terms(*row[3:6])))
+        else:
+            start = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            count = matching.refresh_matches(conn, post_id)
+            conn.execute("COMMIT")
+            timings.append(time.perf_counter() - start)
+            result = [None] * count
+        matched += len(result)
+    timings.sort()
+    summary = {f"p{pct}": percentile(timings, pct) * 1000 for pct in (50, 95, 99)}
+    summary["candidates"] = candidates / len(post_ids) if mode == "find" else None
+    summary["matches"] = matched / len(post_ids)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="失物/招领匹配延迟")
+    parser.add_argument("--posts", type=int, default=1_000_000, help="帖子数")
+    parser.add_argument("--users", type=int, default=5000, help="用户数")
+    parser.add_argument("--samples", type=int, default=500, help="抽样帖子数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--db", help="数据库文件：不存在时生成并保留，存在时直接使用")
+    args = parser.parse_args()
+
+    workdir = None
+    db_path = args.db
+    if db_path is None:
+        workdir = tempfile.mkdtemp(prefix="bench_matching_")
+        db_path = os.path.join(workdir, "bench.db")
+    try:
+        if not os.path.exists(db_path):
+            print(f"生成 {args.posts} 条帖子……")
+            generated = dataset.generate(db_path, args.users, args.posts, args.seed)
+            print(f"  耗时 {generated['seconds']}s")
+        conn = open_db(db_path)
+        posts, active = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(status = 'active'), 0) FROM posts"
+        ).fetchone()
+        terms = conn.execute("SELECT COUNT(*) FROM match_terms").fetchone()[0]
+        print(f"帖子 {posts} 条（active {active} 条），倒排索引 {terms} 行")
+
+        active_ids = [row[0] for row in conn.execute("SELECT id FROM posts WHERE status = 'active'")]
+        sample = random.Random(args.seed).sample(active_ids, min(args.samples, len(active_ids)))
+        print(f"{'模式':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'平均候选':>10}{'平均匹配':>10}")
+        for mode in ("find", "refresh"):
+            result = measure(conn, sample, mode)
+            candidates = f"{result['candidates']:.0f}" if result["candidates"] is not None else "-"
+            print(f"{mode:<10}{result['p50']:>10.2f}{result['p95']:>10.2f}{result['p99']:>10.2f}"
+                  f"{candidates:>10}{result['matches']:>10.1f}")
+        conn.close()
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/api/stream 并发订阅测试
+
+用 dataset.py 生成数据集，启动只有一个工作进程的 serve.py，然后：
+1. 建立 --subscribers 个 SSE 长连接（客户端用一个线程 + selectors 持有全部连接），全部保持空闲；
+2. 在这些连接保持期间测普通请求（get_lost_items）的延迟，与建立连接之前对比，
+   确认长连接没有占满请求线程；
+3. 逐条发布 --events 条帖子，统计每个订阅者收到每条事件的延迟（从发布请求返回算起）和送达率；
+4. 用 Last-Event-ID 重新连接一次，确认能从断点补齐；
+5. 读取工作进程的常驻内存和线程数。
+
+用法:
+    python benchmarks/bench_stream.py                          # 1000 个订阅者
+    python benchmarks/bench_stream.py --subscribers 2000 --events 50
+"""
+import argparse
+import os
+import re
+import resource
+import selectors
+import signal
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+import requests
+
+# 添加项目根目录和 server 目录到Python路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, "server"))
+
+import dataset
+from load_test import percentile, start_local_server
+
+EVENT_ID = re.compile(rb"^id: (\d+)$", re.M)
+
+
+class Subscriber:
+    """一个 SSE 连接：只解析事件 id"""
+
+    def __init__(self, host, port, path, headers=""):
+        self.sock = socket.create_connection((host, port))
+        self.sock.sendall(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n{headers}\r\n".encode())
+        self.sock.setblocking(False)
+        self.buffer = b""
+        self.ready = False           # 已收到响应头和 retry 行
+        self.received = {}           # 事件 id -> 收到时间
+
+    def on_readable(self, now):
+        data = self.sock.recv(65536)
+        if not data:
+            raise ConnectionError("服务器关闭了连接")
+        self.buffer += data
+        if not self.ready and b"retry:" in self.buffer:
+            self.ready = True
+        # 只处理完整的事件（以空行结尾），剩余部分留到下次
+        end = self.buffer.rfind(b"\n\n")
+        if end >= 0:
+            for match in EVENT_ID.finditer(self.buffer, 0, end):
+                self.received.setdefault(int(match.group(1)), now)
+            self.buffer = self.buffer[end + 2:]
+
+
+def pump(selector, seconds):
+    """在 seconds 秒内处理所有可读的连接"""
+    deadline = time.perf_counter() + seconds
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        for key, _ in selector.select(remaining):
+            key.data.on_readable(time.perf_counter())
+
+
+def measure_requests(base_url, count) -> dict:
+    session = requests.Session()
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        session.get(base_url + "/api/get_lost_items", params={"limit": 20, "offset": i % 50}, timeout=30)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {f"p{pct}": percentile(timings, pct) * 1000 for pct in (50, 99)}
+
+
+def worker_usage(base_url) -> dict:
+    """从 /api/metrics 的 pid 标签找到工作进程，读取它的常驻内存和线程数"""
+    text = requests.get(base_url + "/api/metrics", timeout=10).text
+    match = re.search(r'lostfound_event_stream_subscribers\{pid="(\d+)"\} (\d+)', text)
+    if not match:
+        return {}
+    pid = int(match.group(1))
+    usage = {"pid": pid, "subscribers": int(match.group(2))}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    usage["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("Threads:"):
+                    usage["threads"] = int(line.split()[1])
+    except OSError:
+        pass
+    return usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/stream 并发订阅测试")
+    parser.add_argument("--subscribers", type=int, default=1000, help="同时保持的订阅连接数")
+    parser.add_argument("--events", type=int, default=20, help="测送达延迟时发布的帖子数")
+    parser.add_argument("--requests", type=int, default=200, help="测普通请求延迟的请求数")
+    parser.add_argument("--users", type=int, default=200, help="数据集用户数")
+    parser.add_argument("--posts", type=int, default=20000, help="数据集帖子数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--threads", type=int, default=8, help="工作进程的请求线程数")
+    args = parser.parse_args()
+    args.workers = 1
+
+    # 客户端和服务器（子进程继承）都要为每个连接占一个文件描述符
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = args.subscribers * 2 + 256
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+    workdir = tempfile.mkdtemp(prefix="bench_stream_")
+    os.environ["STREAM_MAX_SUBSCRIBERS"] = str(args.subscribers + 1)  # 再留一个给断点续传测试
+    server = None
+    subscribers = []
+    selector = selectors.DefaultSelector()
+    try:
+        server, base_url = start_local_server(workdir, args)
+        host, port = base_url[len("http://"):].split(":")
+        port = int(port)
+
+        baseline = measure_requests(base_url, args.requests)
+        print(f"普通请求（无订阅）: p50 {baseline['p50']:.2f}ms  p99 {baseline['p99']:.2f}ms")
+
+        start = time.perf_counter()
+        for _ in range(args.subscribers):
+            subscriber = Subscriber(host, port, "/api/stream")
+            selector.register(subscriber.sock, selectors.EVENT_READ, subscriber)
+            subscribers.append(subscriber)
+        while not all(s.ready for s in subscribers) and time.perf_counter() - start < 60:
+            pump(selector, 0.1)
+        ready = sum(s.ready for s in subscribers)
+        print(f"建立 {ready}/{args.subscribers} 个订阅连接，耗时 {time.perf_counter() - start:.2f}s")
+
+        loaded = measure_requests(base_url, args.requests)
+        print(f"普通请求（{ready} 个空闲订阅）: p50 {loaded['p50']:.2f}ms  p99 {loaded['p99']:.2f}ms")
+        print(f"工作进程: {worker_usage(base_url)}")
+
+        session = requests.Session()
+        session.post(base_url + "/api/login", json={"username": "user00001", "password": dataset.DEFAULT_PASSWORD},
+                     timeout=30)
+        published = []  # 发布请求返回的时间
+        for i in range(args.events):
+            session.post(base_url + "/api/post", data={
+                "type": dataset.TYPES[i % 2], "item_name": f"推送测试{i}", "item_category": "其他", "location": "测试",
+            }, timeout=30)
+            published.append(time.perf_counter())
+            pump(selector, 0.2)
+        pump(selector, 3)
+
+        # 事件 id 是变更序号，按出现顺序对应发布顺序
+        event_ids = sorted({event_id for s in subscribers for event_id in s.received})[:args.events]
+        latencies = []
+        for s in subscribers:
+            for event_id, published_at in zip(event_ids, published):
+                if event_id in s.received:
+                    latencies.append(s.received[event_id] - published_at)
+        latencies.sort()
+        expected = len(subscribers) * args.events
+        print(f"送达 {len(latencies)}/{expected} 个事件，延迟 p50 {percentile(latencies, 50) * 1000:.0f}ms  "
+              f"p99 {percentile(latencies, 99) * 1000:.0f}ms  最大 {percentile(latencies, 100) * 1000:.0f}ms"
+              f"（本进程的写入立即推送，其他进程的写入在 1 秒轮询间隔内送达）")
+
+        if event_ids:
+            resumed = Subscriber(host, port, "/api/stream", f"Last-Event-ID: {event_ids[0] - 1}\r\n")
+            selector.register(resumed.sock, selectors.EVENT_READ, resumed)
+            pump(selector, 2)
+            print(f"Last-Event-ID 续传: 收到 {len(set(resumed.received) & set(event_ids))}/{len(event_ids)} 个事件")
+            subscribers.append(resumed)
+        print(f"工作进程: {worker_usage(base_url)}")
+    finally:
+        for s in subscribers:
+            s.sock.close()
+        selector.close()
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(60)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
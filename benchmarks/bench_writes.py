@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发写入对比：每个线程各自写库 vs 单写线程组提交
+
+在临时数据库中让 N 个写线程在固定时间内不停发帖（与 /api/post 相同的 INSERT，
+会触发 FTS、计数、版本号等触发器），对比两种方式：
+  direct  每个线程一个连接，INSERT 后立即 commit（原来的写法），等锁超时记为错误
+  queue   所有线程把任务交给 WriteQueue，等待组提交完成
+
+输出每秒发帖数、单次写入的 p50/p99 延迟、错误数，以及 queue 模式的平均组大小。
+
+用法:
+    python benchmarks/bench_writes.py                       # 1/8/32 个写线程
+    python benchmarks/bench_writes.py --writers 64 --duration 10 --synchronous FULL
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目根目录和 server 目录到Python路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, "server"))
+
+import fulltext
+from db_pool import DEFAULT_PRAGMAS, ConnectionPool
+from db_writer import WriteQueue
+from frontend.init_database import init_database
+
+ITEM_NAMES = ["黑色手机", "蓝牙耳机", "校园卡", "钱包", "雨伞", "U盘", "钥匙串", "高数课本"]
+LOCATIONS = ["图书馆三楼", "第一食堂", "教学楼A区", "体育馆", "宿舍楼下"]
+TYPES = ["失物信息", "招领信息"]
+
+INSERT_SQL = """
+    INSERT INTO posts (user_id, type, item_name, item_category, description, time, location)
+    VALUES (?, ?, ?, '其他', ?, '2024-01-01', ?)
+"""
+
+
+def random_post(rng: random.Random) -> tuple:
+    return (rng.randint(1, 100), rng.choice(TYPES), rng.choice(ITEM_NAMES),
+            f"在{rng.choice(LOCATIONS)}附近", rng.choice(LOCATIONS))
+
+
+def create_database(synchronous: str) -> ConnectionPool:
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_writes_"), "bench.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_database(path)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO users (username, password, salt) VALUES (?, 'x', 'x')",
+                     [(f"user{i}",) for i in range(100)])
+    conn.commit()
+    conn.close()
+    pragmas = tuple((name, value) for name, value in DEFAULT_PRAGMAS if name != "synchronous")
+    pool = ConnectionPool(path, pragmas=pragmas + (("synchronous", synchronous),))
+    pool.add_connect_hook(fulltext.register_functions)
+    return pool
+
+
+def direct_writer(pool, deadline, latencies, errors, index):
+    """原来的写法：自己的连接，写完立即提交"""
+    rng = random.Random(index)
+    conn = pool.connect()
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.execute(INSERT_SQL, random_post(rng))
+            conn.commit()
+        except sqlite3.OperationalError:  # database is locked
+            conn.rollback()
+            errors[index] += 1
+            continue
+        latencies[index].append(time.perf_counter() - start)
+    conn.close()
+
+
+def queue_writer(write_queue, deadline, latencies, errors, index):
+    """提交给写线程并等待组提交完成"""
+    rng = random.Random(index)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            write_queue.execute(lambda conn, post: conn.execute(INSERT_SQL, post), random_post(rng))
+        except sqlite3.Error:
+            errors[index] += 1
+            continue
+        latencies[index].append(time.perf_counter() - start)
+
+
+def run(mode: str, writers: int, duration: float, synchronous: str) -> dict:
+    pool = create_database(synchronous)
+    write_queue = None
+    if mode == "queue":
+        write_queue = WriteQueue(pool.connect).start()
+        target, first_arg = queue_writer, write_queue
+    else:
+        target, first_arg = direct_writer, pool
+
+    latencies = [[] for _ in range(writers)]
+    errors = [0] * writers
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=target, args=(first_arg, deadline, latencies, errors, i))
+               for i in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    samples = sorted(x for per_thread in latencies for x in per_thread)
+    result = {
+        "rate": len(samples) / elapsed,
+        "p50": statistics.median(samples) * 1000 if samples else 0.0,
+        "p99": samples[int(len(samples) * 0.99)] * 1000 if samples else 0.0,
+        "errors": sum(errors),
+        "avg_batch": 1.0,
+    }
+    if write_queue is not None:
+        result["avg_batch"] = write_queue.stats()["avg_batch"]
+        write_queue.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发写入基准")
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 8, 32], help="写线程数")
+    parser.add_argument("--duration", type=float, default=5.0, help="每项测试秒数")
+    parser.add_argument("--synchronous", default="NORMAL", choices=["OFF", "NORMAL", "FULL"],
+                        help="PRAGMA synchronous")
+    args = parser.parse_args()
+
+    print(f"synchronous={args.synchronous}，每项 {args.duration} 秒")
+    print(f"{'写线程':<8}{'方式':<8}{'帖子/秒':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'错误':>8}{'平均组大小':>12}")
+    for writers in args.writers:
+        for mode in ("direct", "queue"):
+            r = run(mode, writers, args.duration, args.synchronous)
+            print(f"{writers:<8}{mode:<8}{r['rate']:>10.0f}{r['p50']:>10.2f}{r['p99']:>10.2f}"
+                  f"{r['errors']:>8}{r['avg_batch']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
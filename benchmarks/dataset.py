@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可复现的合成数据集
+
+按固定种子生成 N 个用户和 M 条帖子：物品名称、类别、地点、描述都取自校园里常见的中文
+说法，类别与发布界面的下拉框一致；一部分帖子带图片（少量不同的小图片被多次引用，
+和真实的去重存储一样登记在 images 表）。同样的参数和种子总是生成同样的数据
+（密码的盐也由种子决定；哈希算法和参数取决于 PASSWORD_HASHER 等环境变量，见 server/passwords.py）。
+
+所有用户的密码都是 DEFAULT_PASSWORD，用户名为 user00001、user00002……，
+load_test.py 据此登录。
+
+用法:
+    python benchmarks/dataset.py --db /tmp/lostfound.db --users 1000 --posts 100000
+    python benchmarks/dataset.py --db /tmp/lostfound.db --upload-dir /tmp/uploads --images 200
+"""
+import argparse
+import contextlib
+import datetime
+import hashlib
+import io
+import os
+import random
+import sqlite3
+import sys
+import time
+
+# 添加项目根目录和 server 目录到Python路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, "server"))
+
+import fulltext
+from frontend.init_database import init_database
+from image_store import ImageStore, StagedImage
+from passwords import PasswordHasher
+
+try:
+    from PIL import Image
+except ImportError:  # 没有 Pillow 时图片只是随机字节
+    Image = None
+
+DEFAULT_PASSWORD = "password123"
+
+# 类别 -> 该类别下的常见物品
+ITEMS_BY_CATEGORY = {
+    "手机": ["黑色手机", "iPhone 13", "华为手机", "小米手机", "手机壳", "OPPO手机"],
+    "耳机": ["蓝牙耳机", "AirPods", "有线耳机", "头戴式耳机", "耳机充电盒"],
+    "钱包": ["钱包", "零钱包", "卡包", "棕色皮夹"],
+    "钥匙": ["钥匙串", "宿舍钥匙", "自行车钥匙", "电动车钥匙", "门禁卡"],
+    "证件": ["校园卡", "身份证", "学生证", "银行卡", "驾驶证", "图书证"],
+    "书本": ["高数课本", "英语四级词汇", "线性代数", "笔记本", "考研资料", "大学物理"],
+    "雨伞": ["雨伞", "折叠伞", "透明雨伞", "长柄伞"],
+    "U盘": ["U盘", "移动硬盘", "SD卡", "读卡器"],
+    "其他": ["保温杯", "眼镜", "充电宝", "笔记本电脑", "手表", "水杯", "帽子", "围巾", "计算器", "篮球"],
+}
+CATEGORIES = list(ITEMS_BY_CATEGORY)
+# 各类别出现的相对频率
+CATEGORY_WEIGHTS = [18, 12, 10, 12, 16, 10, 8, 6, 8]
+
+ADJECTIVES = ["红色的", "蓝色的", "黑色的", "白色的", "粉色的", "旧的", "全新的", "带挂件的",
+              "贴了贴纸的", "有划痕的", "印着名字的"]
+LOCATIONS = ["图书馆三楼", "图书馆自习室", "第一食堂", "第二食堂", "教学楼A区", "教学楼B区",
+             "体育馆", "操场", "宿舍楼下", "实验楼", "校门口公交站", "校医院", "行政楼", "快递站"]
+DESCRIPTION_TEMPLATES = [
+    "{adj}{name}，在{location}附近{verb}",
+    "{time_hint}在{location}{verb}{adj}{name}，{contact}",
+    "{adj}{name}，{extra}，{contact}",
+    "在{location}{verb}一个{name}，{extra}",
+]
+VERBS = {"失物信息": "丢失", "招领信息": "捡到"}
+TIME_HINTS = ["今天上午", "昨天下午", "中午", "晚自习后", "上周五", "早上八点左右"]
+EXTRAS = ["里面有重要资料", "对我很重要", "已交到宿管处", "可以描述细节认领", "有明显磨损", "外面套了保护套"]
+CONTACTS = ["请联系我", "拾到者请私信", "失主请尽快认领", "有酬谢"]
+TYPES = ["失物信息", "招领信息"]
+TYPE_WEIGHTS = [60, 40]
+
+# 帖子状态分布：大部分尚未解决
+STATUSES = ["active", "found"]
+STATUS_WEIGHTS = [85, 15]
+
+# 发布时间均匀分布在这个日期之前的 DAYS 天内（固定日期，结果不随运行时间变化）
+BASE_DATE = datetime.datetime(2024, 12, 31, 23, 0, 0)
+DAYS = 365
+
+INSERT_BATCH = 10000
+
+
+def _random_description(rng: random.Random, post_type: str, name: str, location: str) -> str:
+    return rng.choice(DESCRIPTION_TEMPLATES).format(
+        adj=rng.choice(ADJECTIVES), name=name, location=location, verb=VERBS[post_type],
+        time_hint=rng.choice(TIME_HINTS), extra=rng.choice(EXTRAS), contact=rng.choice(CONTACTS),
+    )
+
+
+def random_post(rng: random.Random) -> dict:
+    """生成一条帖子的表单字段（load_test.py 发帖也用这个函数）"""
+    category = rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0]
+    name = rng.choice(ITEMS_BY_CATEGORY[category])
+    post_type = rng.choices(TYPES, TYPE_WEIGHTS)[0]
+    location = rng.choice(LOCATIONS)
+    happened = BASE_DATE - datetime.timedelta(seconds=rng.randrange(DAYS * 86400))
+    return {
+        "type": post_type,
+        "item_name": name,
+        "item_category": category,
+        "description": _random_description(rng, post_type, name, location),
+        "time": happened.strftime("%Y-%m-%d %H:%M"),
+        "location": location,
+    }
+
+
+def make_image_stub(rng: random.Random, index: int) -> tuple:
+    """生成一张小图片，返回 (字节, 扩展名, 宽, 高)"""
+    width, height = rng.choice([(160, 120), (120, 160), (200, 150)])
+    if Image is None:
+        return rng.randbytes(2048 + index), ".jpg", None, None
+    color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "JPEG", quality=70)
+    return buffer.getvalue(), ".jpg", width, height
+
+
+def create_image_stubs(conn, upload_dir: str, count: int, rng: random.Random) -> list:
+    """写入 count 张图片并登记到 images 表，返回 (image_path, 宽, 高) 列表"""
+    store = ImageStore(upload_dir)
+    images = []
+    for i in range(count):
+        data, ext, width, height = make_image_stub(rng, i)
+        staged = StagedImage(hashlib.sha256(data).hexdigest(), len(data), ext, "")
+        path = store.file_path(staged.image_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        conn.execute(
+            "INSERT OR IGNORE INTO images (path, hash, size, refcount) VALUES (?, ?, ?, 0)",
+            (staged.image_path, staged.digest, staged.size)
+        )
+        images.append((staged.image_path, width, height))
+    return images
+
+
+def generate(db_path: str, users: int = 1000, posts: int = 100_000, seed: int = 42,
+             upload_dir: str = None, images: int = 100, image_ratio: float = 0.2) -> dict:
+    """
+    在 db_path 生成数据集（数据库应为空或不存在）
+
+    Args:
+        upload_dir: 图片存放目录；为 None 时不生成图片
+        images: 不同图片的数量
+        image_ratio: 带图片的帖子比例
+
+    Returns:
+        dict: 实际生成的数量和耗时
+    """
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_database(db_path)
+    conn = sqlite3.connect(db_path)
+    fulltext.register_functions(conn)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")  # 只在生成时关闭，数据库由服务器按默认设置打开
+    conn.execute("PRAGMA cache_size = -262144")  # 触发器同步写入的全文/匹配索引键是随机分布的，页缓存不够时反复换页
+
+    # 所有用户同一个密码，哈希一次即可（盐相同不影响校验）；盐由种子导出，不消耗 rng，帖子数据不受影响
+    salt = hashlib.sha256(f"dataset-salt-{seed}".encode()).hexdigest()[:32]
+    password_hash = PasswordHasher().default.encode(DEFAULT_PASSWORD, salt)
+    conn.executemany(
+        "INSERT INTO users (username, password, salt) VALUES (?, ?, ?)",
+        [(f"user{i:05d}", password_hash, salt) for i in range(1, users + 1)]
+    )
+
+    stubs = create_image_stubs(conn, upload_dir, images, rng) if upload_dir and images else []
+
+    batch = []
+    for _ in range(posts):
+        post = random_post(rng)
+        created = BASE_DATE - datetime.timedelta(seconds=rng.randrange(DAYS * 86400))
+        image_path = width = height = None
+        if stubs and rng.random() < image_ratio:
+            image_path, width, height = rng.choice(stubs)
+        batch.append((
+            rng.randint(1, users), post["type"], post["item_name"], post["item_category"],
+            post["description"], post["time"], post["location"],
+            rng.choices(STATUSES, STATUS_WEIGHTS)[0], created.strftime("%Y-%m-%d %H:%M:%S"),
+            image_path, width, height,
+        ))
+        if len(batch) == INSERT_BATCH:
+            _insert_posts(conn, batch)
+            batch = []
+    if batch:
+        _insert_posts(conn, batch)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    return {"users": users, "posts": posts, "images": len(stubs), "seconds": round(time.perf_counter() - start, 2)}
+
+
+def _insert_posts(conn, rows):
+    conn.executemany(
+        "INSERT INTO posts (user_id, type, item_name, item_category, description, time, location, "
+        "status, created_at, image_path, image_width, image_height) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成数据集")
+    parser.add_argument("--db", required=True, help="数据库文件（不存在或为空）")
+    parser.add_argument("--users", type=int, default=1000, help="用户数")
+    parser.add_argument("--posts", type=int, default=100_000, help="帖子数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--upload-dir", help="图片目录，不指定则不生成图片")
+    parser.add_argument("--images", type=int, default=100, help="不同图片的数量")
+    parser.add_argument("--image-ratio", type=float, default=0.2, help="带图片的帖子比例")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db) and os.path.getsize(args.db):
+        parser.error(f"{args.db} 已存在，请指定新的数据库文件")
+    result = generate(args.db, args.users, args.posts, args.seed, args.upload_dir, args.images, args.image_ratio)
+    print(f"已生成 {result['users']} 个用户、{result['posts']} 条帖子、{result['images']} 张图片，"
+          f"耗时 {result['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端压测
+
+M 个并发客户端各自用长连接向服务器发送按比例混合的请求：
+  login   登录
+  search  信息墙列表/关键字搜索（随机关键字、类型、类别）
+  detail  物品详情
+  post    发布新帖子
+  edit    编辑自己发布的帖子
+统计每个接口的吞吐和 p50/p95/p99 延迟，以 JSON 输出，不同版本的结果可以直接对比。
+
+不指定 --url 时，先用 dataset.py 在临时目录按种子生成数据集，再用 server/serve.py
+启动本地服务器，测完自动关闭。
+
+用法:
+    python benchmarks/load_test.py --clients 32 --duration 30
+    python benchmarks/load_test.py --mix search=70,detail=20,post=5,edit=3,login=2 --output run.json
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --users 1000 --posts 100000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+# 添加项目根目录和 server 目录到Python路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, "server"))
+
+import dataset
+
+DEFAULT_MIX = "search=50,detail=30,post=8,edit=7,login=5"
+
+SEARCH_KEYWORDS = ["", "", "手机", "校园卡", "图书馆", "耳机", "钥匙", "雨伞", "第一食堂", "黑色", "iphone"]
+
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"未知的操作: {name}（可选 {', '.join(OPERATIONS)}）")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_samples: list, pct: float) -> float:
+    """最近秩法百分位"""
+    if not sorted_samples:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_samples)) - 1)
+    return sorted_samples[index]
+
+
+class Client:
+    """一个并发客户端：自己的会话、随机数和已发布的帖子"""
+
+    def __init__(self, base_url: str, index: int, users: int, posts: int, seed: int):
+        self.base_url = base_url
+        self.rng = random.Random(seed * 100003 + index)
+        self.session = requests.Session()
+        self.username = f"user{index % users + 1:05d}"
+        self.max_post_id = posts
+        self.my_items = []
+
+    def call(self, method, path, **kwargs):
+        response = self.session.request(method, self.base_url + path, timeout=30, **kwargs)
+        ok = response.status_code < 400 and (not response.content.startswith(b"{")
+                                             or response.json().get("success", True))
+        return ok
+
+    def login(self):
+        return self.call("POST", "/api/login", json={"username": self.username, "password": dataset.DEFAULT_PASSWORD})
+
+    def search(self):
+        params = {"limit": 20}
+        keyword = self.rng.choice(SEARCH_KEYWORDS)
+        if keyword:
+            params["keyword"] = keyword
+        if self.rng.random() < 0.3:
+            params["type"] = self.rng.choice(dataset.TYPES)
+        if self.rng.random() < 0.3:
+            params["category"] = self.rng.choice(dataset.CATEGORIES)
+        return self.call("GET", "/api/get_lost_items", params=params)
+
+    def detail(self):
+        return self.call("GET", f"/api/get_item_detail/{self.rng.randint(1, max(self.max_post_id, 1))}")
+
+    def post(self):
+        response = self.session.post(self.base_url + "/api/post", data=dataset.random_post(self.rng), timeout=30)
+        return response.status_code < 400 and response.json().get("success", False)
+
+    def edit(self):
+        if not self.my_items:
+            self.refresh_my_items()
+        if not self.my_items:
+            return self.post()
+        item_id = self.rng.choice(self.my_items)
+        return self.call("POST", "/api/edit_item", json={
+            "id": item_id,
+            "description": dataset.random_post(self.rng)["description"],
+        })
+
+    def refresh_my_items(self):
+        response = self.session.get(self.base_url + "/api/my_items", params={"limit": 50}, timeout=30)
+        if response.ok:
+            self.my_items = [item["id"] for item in response.json()["data"]["items"]]
+
+
+OPERATIONS = {
+    "login": Client.login,
+    "search": Client.search,
+    "detail": Client.detail,
+    "post": Client.post,
+    "edit": Client.edit,
+}
+
+
+def client_loop(client: Client, weights: dict, deadline: float, results: dict):
+    """循环发送请求直到 deadline，results[操作名] = {"samples": [耗时...], "errors": 错误数}"""
+    names = list(weights)
+    shares = list(weights.values())
+    client.login()
+    while time.perf_counter() < deadline:
+        name = client.rng.choices(names, shares)[0]
+        start = time.perf_counter()
+        try:
+            ok = OPERATIONS[name](client)
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        result = results.setdefault(name, {"samples": [], "errors": 0})
+        result["samples"].append(elapsed)
+        if not ok:
+            result["errors"] += 1
+
+
+def run_load(base_url: str, clients: int, duration: float, weights: dict, users: int, posts: int,
+             seed: int) -> dict:
+    deadline = time.perf_counter() + duration
+    per_client = [{} for _ in range(clients)]
+    threads = [
+        threading.Thread(target=client_loop,
+                         args=(Client(base_url, i, users, posts, seed), weights, deadline, per_client[i]))
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    all_samples = []
+    total_errors = 0
+    for name in weights:
+        samples = sorted(x for result in per_client if name in result for x in result[name]["samples"])
+        errors = sum(result[name]["errors"] for result in per_client if name in result)
+        all_samples.extend(samples)
+        total_errors += errors
+        endpoints[name] = summarize(samples, errors, elapsed)
+    return {
+        "elapsed": round(elapsed, 3),
+        "total": summarize(sorted(all_samples), total_errors, elapsed),
+        "endpoints": endpoints,
+    }
+
+
+def summarize(samples: list, errors: int, elapsed: float) -> dict:
+    summary = {
+        "requests": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = round(percentile(samples, pct) * 1000, 2)
+    summary["max_ms"] = round(samples[-1] * 1000, 2) if samples else 0.0
+    return summary
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(workdir: str, args) -> tuple:
+    """生成数据集并启动 serve.py，返回 (进程, 基础 URL)"""
+    db_path = os.path.join(workdir, "bench.db")
+    upload_dir = os.path.join(workdir, "uploads")
+    generated = dataset.generate(db_path, args.users, args.posts, args.seed, upload_dir)
+    print(f"数据集: {generated}", file=sys.stderr)
+
+    port = free_port()
+    env = dict(os.environ, DB_PATH=db_path, UPLOAD_DIR=upload_dir, SECRET_KEY="load-test")
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_ROOT, "server", "serve.py"), "--bind", f"127.0.0.1:{port}",
+         "--workers", str(args.workers), "--threads", str(args.threads)],
+        env=env, stdout=subprocess.DEVNULL, stderr=open(os.path.join(workdir, "server.log"), "w"),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(base_url + "/api/stats", timeout=1)
+            return server, base_url
+        except requests.ConnectionError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"服务器启动失败，日志见 {workdir}/server.log")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端压测")
+    parser.add_argument("--url", help="已运行的服务器地址；不指定则生成数据集并启动本地服务器")
+    parser.add_argument("--clients", type=int, default=16, help="并发客户端数")
+    parser.add_argument("--duration", type=float, default=20.0, help="压测秒数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="操作比例，如 search=50,detail=30,post=10")
+    parser.add_argument("--users", type=int, default=1000, help="数据集用户数")
+    parser.add_argument("--posts", type=int, default=100_000, help="数据集帖子数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子（数据集和请求序列）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="本地服务器工作进程数")
+    parser.add_argument("--threads", type=int, default=8, help="本地服务器每个进程的线程数")
+    parser.add_argument("--output", help="结果 JSON 写入该文件（默认只打印）")
+    args = parser.parse_args()
+
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = None
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            server, base_url = start_local_server(workdir, args)
+        result = run_load(base_url, args.clients, args.duration, weights, args.users, args.posts, args.seed)
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(60)
+
+    report = {
+        "config": {
+            "url": args.url or "local",
+            "clients": args.clients,
+            "duration": args.duration,
+            "mix": weights,
+            "users": args.users,
+            "posts": args.posts,
+            "seed": args.seed,
+            "workers": None if args.url else args.workers,
+            "threads": None if args.url else args.threads,
+        },
+        **result,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,13 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt, QDateTime
 from .config import get_api_url, get_timeout
+from .http_cache import shared_cache
+from .change_feed import apply_changes
 
 class CenterTab(QWidget):
-    """个人中心-信息展示，仅展示当前用户发布的物品（按用户名筛选）"""
+    """个人中心-信息展示，仅展示当前登录用户发布的物品"""
+    PAGE_SIZE = 100  # 每次请求的条数
+
     def __init__(self, username, edit_btn=None, delete_btn=None, status_btn=None, session=None, parent=None):
         super().__init__(parent)
         self.username = username
@@ -52,21 +56,29 @@ class CenterTab(QWidget):
         self.setLayout(layout)
 
     def load_my_items(self):
+        """从 /api/my_items 加载当前登录用户的全部发布（按游标逐页取）"""
         try:
-            response = requests.get(get_api_url("get_lost_items"), timeout=get_timeout())
-            if response.status_code == 200:
-                result = response.json()
-                if result.get("success"):
-                    all_items = result["data"]["items"]
-                    # 用用户名筛选
-                    my_items = [item for item in all_items if item.get("publisher") == self.username]
-                    self.current_items = my_items
-                    self.update_table()
-                    self.status_label.setText(f"我的发布：{len(my_items)} 条")
-                else:
+            http = self.session if self.session else requests
+            my_items = []
+            params = {"limit": self.PAGE_SIZE}
+            while True:
+                status_code, result = shared_cache.get_json(
+                    get_api_url("my_items"), params=params, http=http, timeout=get_timeout()
+                )
+                if status_code != 200:
+                    QMessageBox.warning(self, "网络错误", f"HTTP错误: {status_code}")
+                    return
+                if not result.get("success"):
                     QMessageBox.warning(self, "加载失败", result.get("message", "未知错误"))
-            else:
-                QMessageBox.warning(self, "网络错误", f"HTTP错误: {response.status_code}")
+                    return
+                data = result["data"]
+                my_items.extend(data["items"])
+                if not data.get("next_cursor"):
+                    break
+                params = {"limit": self.PAGE_SIZE, "cursor": data["next_cursor"]}
+            self.current_items = my_items
+            self.update_table()
+            self.status_label.setText(f"我的发布：{len(my_items)} 条")
         except Exception as e:
             QMessageBox.warning(self, "网络错误", str(e))
 
@@ -90,38 +102,99 @@ class CenterTab(QWidget):
         item_id = self.table.item(row, 0).text()
         return item_id
 
+    def get_selected_item_ids(self):
+        """所有选中行的物品ID（支持多选）"""
+        rows = sorted({index.row() for index in self.table.selectedIndexes()})
+        if not rows:
+            QMessageBox.warning(self, "提示", "请先选中一条记录")
+            return []
+        return [int(self.table.item(row, 0).text()) for row in rows]
+
+    def post_json(self, endpoint, payload):
+        http = self.session if self.session else requests
+        resp = http.post(get_api_url(endpoint), json=payload, timeout=get_timeout())
+        return resp.json()
+
+    def apply_local_changes(self, updated=None, removed=()):
+        """
+        按服务器返回的结果直接修改本地列表，不再整表重新加载
+
+        Args:
+            updated: {物品ID: 变更的字段}
+            removed: 已删除的物品ID
+        """
+        updated = updated or {}
+        removed = set(removed)
+        items = []
+        for item in self.current_items:
+            if item.get('id') in removed:
+                continue
+            if item.get('id') in updated:
+                item = {**item, **updated[item['id']]}
+            items.append(item)
+        self.current_items = items
+        # 本地数据已变，条件请求缓存里的旧列表不能再用
+        shared_cache.clear()
+        sorting = self.table.isSortingEnabled()
+        self.table.setSortingEnabled(False)  # 填充期间关闭排序，避免行在写入时被重排
+        self.update_table()
+        self.table.setSortingEnabled(sorting)
+        self.status_label.setText(f"我的发布：{len(items)} 条")
+
+    def on_changes(self, changes):
+        """收到服务器的变更（ChangeFeed）：本人在其他设备上的发布、编辑、删除也同步到列表"""
+        items, _ = apply_changes(self.current_items, changes,
+                                 accept=lambda item: item.get('publisher') == self.username)
+        if items == self.current_items:
+            return
+        self.current_items = items
+        sorting = self.table.isSortingEnabled()
+        self.table.setSortingEnabled(False)
+        self.update_table()
+        self.table.setSortingEnabled(sorting)
+        self.status_label.setText(f"我的发布：{len(items)} 条")
+
     def handle_delete_post(self):
-        item_id = self.get_selected_item_id()
-        if not item_id:
+        item_ids = self.get_selected_item_ids()
+        if not item_ids:
             return
-        reply = QMessageBox.question(self, "确认删除", "确定要删除该条信息吗？", QMessageBox.Yes | QMessageBox.No)
+        reply = QMessageBox.question(self, "确认删除", f"确定要删除选中的 {len(item_ids)} 条信息吗？", QMessageBox.Yes | QMessageBox.No)
         if reply != QMessageBox.Yes:
             return
-        import requests
-        url = get_api_url("delete_item")
         try:
-            resp = requests.post(url, json={"id": int(item_id)}, cookies=self.session.cookies if self.session else None)
-            result = resp.json()
+            if len(item_ids) == 1:
+                result = self.post_json("delete_item", {"id": item_ids[0]})
+                removed = [item_ids[0]] if result.get("success") else []
+            else:
+                result = self.post_json("batch_items", {"ids": item_ids, "action": "delete"})
+                removed = (result.get("data") or {}).get("ids", [])
+            if removed:
+                self.apply_local_changes(removed=removed)
             if result.get("success"):
-                QMessageBox.information(self, "成功", "删除成功")
-                self.load_my_items()
+                QMessageBox.information(self, "成功", result.get("message", "删除成功"))
             else:
                 QMessageBox.warning(self, "失败", result.get("message", "删除失败"))
         except Exception as e:
             QMessageBox.warning(self, "网络错误", str(e))
 
     def handle_mark_found(self):
-        item_id = self.get_selected_item_id()
-        if not item_id:
+        item_ids = self.get_selected_item_ids()
+        if not item_ids:
             return
-        import requests
-        url = get_api_url("update_status")
         try:
-            resp = requests.post(url, json={"id": int(item_id)}, cookies=self.session.cookies if self.session else None)
-            result = resp.json()
+            if len(item_ids) == 1:
+                # 单条：在 active 与 found 之间切换
+                result = self.post_json("update_status", {"id": item_ids[0]})
+                data = result.get("data") if result.get("success") else None
+                updated = {data["id"]: {"status": data["status"]}} if data else {}
+            else:
+                # 多条：全部关闭（标记为 found）
+                result = self.post_json("batch_items", {"ids": item_ids, "action": "close"})
+                updated = {i: {"status": "found"} for i in (result.get("data") or {}).get("ids", [])}
+            if updated:
+                self.apply_local_changes(updated=updated)
             if result.get("success"):
                 QMessageBox.information(self, "成功", result.get("message", "状态已变更"))
-                self.load_my_items()
             else:
                 QMessageBox.warning(self, "失败", result.get("message", "操作失败"))
         except Exception as e:
@@ -132,13 +205,14 @@ class CenterTab(QWidget):
         if not item_id:
             return
         row = self.table.currentRow()
+        # 表格可排序，行号与 current_items 下标不一定一致，按 ID 取原始数据
+        current = next((item for item in self.current_items if item.get("id") == int(item_id)), {})
         item_data = {
             "id": int(item_id),
             "type": self.table.item(row, 2).text(),
             "item_name": self.table.item(row, 1).text(),
             "item_category": self.table.item(row, 3).text(),
-            "description": self.current_items[row].get("description", ""),
-            "image_path": self.current_items[row].get("image_path", ""),
+            "description": current.get("description", ""),
             "time": self.table.item(row, 5).text(),
             "location": self.table.item(row, 4).text(),
         }
@@ -146,14 +220,11 @@ class CenterTab(QWidget):
         if dialog.exec() == QDialog.Accepted:
             new_data = dialog.get_data()
             item_data.update(new_data)
-            import requests
-            url = get_api_url("edit_item")
             try:
-                resp = requests.post(url, json=item_data, cookies=self.session.cookies if self.session else None)
-                result = resp.json()
+                result = self.post_json("edit_item", item_data)
                 if result.get("success"):
+                    self.apply_local_changes(updated={int(item_id): result.get("data") or new_data})
                     QMessageBox.information(self, "成功", "编辑成功")
-                    self.load_my_items()
                 else:
                     QMessageBox.warning(self, "失败", result.get("message", "编辑失败"))
             except Exception as e:
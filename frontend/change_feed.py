@@ -0,0 +1,191 @@
+import requests
+from typing import Callable, Dict, List, Optional, Tuple
+from PySide6.QtCore import QThread, Signal
+from .config import get_api_url, get_timeout
+from .local_mirror import download_posts
+
+# 轮询间隔（毫秒）
+POLL_INTERVAL_MS = 5000
+
+# 每次请求的变更条数
+PAGE_SIZE = 500
+
+
+def fetch_changes(since: Optional[int] = None, limit: int = PAGE_SIZE) -> Dict:
+    """
+    请求 /api/changes
+
+    Args:
+        since: 上次返回的 next_since；为 None 时只取当前的 latest
+
+    Returns:
+        Dict: changes, next_since, latest, has_more, reset
+
+    Raises:
+        RuntimeError: 服务器返回错误
+        requests.RequestException: 网络错误
+    """
+    params = {"limit": limit}
+    if since is not None:
+        params["since"] = since
+    response = requests.get(get_api_url("changes"), params=params, timeout=get_timeout())
+    result = response.json()
+    if response.status_code != 200 or not result.get("success"):
+        raise RuntimeError(result.get("message", f"HTTP错误: {response.status_code}"))
+    return result["data"]
+
+
+def apply_changes(items: List[Dict], changes: List[Dict],
+                  accept: Optional[Callable[[Dict], bool]] = None) -> Tuple[List[Dict], int]:
+    """
+    把变更打到本地已有的列表上
+
+    - deleted：从列表中移除
+    - status：列表中有这条时只改状态
+    - updated：列表中有这条时整条替换，不再符合 accept 的移除
+    - created：符合 accept 的插到最前面（列表按发布时间倒序）
+
+    不在列表中的帖子的 updated/status 忽略（可能在没加载的页里）。重复应用同一批变更结果不变。
+
+    Args:
+        items: 当前列表
+        changes: /api/changes 返回的 changes
+        accept: 判断一条帖子是否属于当前视图（筛选条件），默认都属于
+
+    Returns:
+        Tuple[List[Dict], int]: (新列表, 条数变化)
+    """
+    accept = accept or (lambda item: True)
+    by_id = {item.get('id'): item for item in items}
+    created = []
+    for change in changes:
+        item_id = change['id']
+        op = change['op']
+        if op == 'deleted':
+            by_id.pop(item_id, None)
+        elif op == 'status':
+            if item_id in by_id:
+                item = {**by_id[item_id], 'status': change['status']}
+                if accept(item):
+                    by_id[item_id] = item
+                else:
+                    by_id.pop(item_id)
+        elif change.get('item'):
+            item = change['item']
+            if item_id in by_id:
+                if accept(item):
+                    by_id[item_id] = {**by_id[item_id], **item}
+                else:
+                    by_id.pop(item_id)
+            elif op == 'created' and accept(item):
+                by_id[item_id] = item
+                created.append(item_id)
+
+    # 新帖子按变更顺序到达，越晚越新，倒序插到最前面
+    new_ids = set(created)
+    result = [by_id[i] for i in reversed(created) if i in by_id]
+    result += [by_id[item.get('id')] for item in items
+               if item.get('id') in by_id and item.get('id') not in new_ids]
+    return result, len(result) - len(items)
+
+
+def keyword_matches(item: Dict, keyword: str) -> bool:
+    """本地近似判断帖子是否命中关键字（物品名称、描述、地点包含关键字）"""
+    if not keyword:
+        return True
+    text = ' '.join(item.get(key) or '' for key in ('item_name', 'description', 'location'))
+    return all(word in text for word in keyword.split())
+
+
+class ChangeFeed(QThread):
+    """
+    后台轮询 /api/changes，把变更以信号发给各个界面
+
+    先在界面线程调用 bootstrap() 取得当前序号，再加载各个列表，最后 start()：
+    加载期间发生的变更之后还会收到一次，apply_changes 重复应用不影响结果。
+
+    传入本地镜像（local_mirror.LocalMirror）时，同一次轮询的变更也写进镜像：
+    镜像还没下载过时先整体下载；镜像停在更早的序号（上次退出时）时从那里补齐，
+    补齐过程中早于界面加载时刻的变更只写镜像，不再发给界面。
+    """
+    changes_received = Signal(list)
+    reset_required = Signal()  # 离线太久，服务器已清理中间的变更，需要整体重新加载
+    mirror_ready = Signal()    # 本地镜像下载完成，可以改为本地搜索
+
+    def __init__(self, parent=None, mirror=None):
+        super().__init__(parent)
+        self.since = None
+        self.delivered = None  # 界面已经反映到的序号
+        self.mirror = mirror
+
+    def bootstrap(self):
+        """取得服务器当前的变更序号，失败时留到后台线程里再取"""
+        try:
+            self._start_from(fetch_changes()['latest'])
+        except Exception as e:
+            print(f"获取变更序号失败: {e}")
+
+    def _start_from(self, latest: int):
+        """界面从 latest 开始接收变更；镜像落后时从镜像的序号开始读"""
+        self.since = self.delivered = latest
+        if self.mirror is not None and self.mirror.ready:
+            if self.mirror.since > latest:
+                # 比服务器最新的序号还大：服务器数据库被换过
+                self.mirror.invalidate()
+            else:
+                self.since = self.mirror.since
+
+    def run(self):
+        try:
+            while not self.isInterruptionRequested():
+                try:
+                    self.poll()
+                except Exception as e:
+                    print(f"同步变更失败: {e}")
+                # 分段睡眠，退出时不必等满一个间隔
+                for _ in range(POLL_INTERVAL_MS // 100):
+                    if self.isInterruptionRequested():
+                        return
+                    self.msleep(100)
+        finally:
+            if self.mirror is not None:
+                self.mirror.close()
+
+    def poll(self):
+        """取完 since 之后的所有变更"""
+        if self.since is None:
+            # 启动时没取到序号：各列表的数据可能已经过时，取到后让它们重新加载一次
+            self._start_from(fetch_changes()['latest'])
+            self.reset_required.emit()
+            return
+        if self.mirror is not None and not self.mirror.ready:
+            self.mirror.bootstrap(self.since, self._download())
+            self.mirror_ready.emit()
+        while True:
+            data = fetch_changes(self.since)
+            if data['reset']:
+                if self.mirror is not None:
+                    self.mirror.invalidate()
+                self.since = self.delivered = data['next_since']
+                self.reset_required.emit()
+                return
+            if self.mirror is not None:
+                self.mirror.apply_changes(data['changes'], data['next_since'])
+            changes = [change for change in data['changes'] if change['seq'] > self.delivered]
+            self.since = data['next_since']
+            self.delivered = max(self.delivered, self.since)
+            if changes:
+                self.changes_received.emit(changes)
+            if not data['has_more']:
+                return
+
+    def _download(self):
+        """整体下载镜像的帖子，退出程序时中断"""
+        for items in download_posts():
+            if self.isInterruptionRequested():
+                raise InterruptedError("下载已中断")
+            yield items
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
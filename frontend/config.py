@@ -1,5 +1,6 @@
 # 服务器配置文件
 # 可以根据不同的部署环境修改这些配置
+import os
 
 # 开发环境配置
 DEV_CONFIG = {
@@ -21,6 +22,9 @@ CURRENT_CONFIG = PROD_CONFIG
 # 构建服务器基础URL
 SERVER_BASE_URL = f"http://{CURRENT_CONFIG['host']}:{CURRENT_CONFIG['port']}"
 
+# 客户端本地数据目录（帖子镜像等），在当前用户的主目录下
+LOCAL_DATA_DIR = os.path.join(os.path.expanduser("~"), ".lostfound")
+
 # API端点
 API_ENDPOINTS = {
     "login": "/api/login",#登录
@@ -28,12 +32,16 @@ API_ENDPOINTS = {
     "logout": "/api/logout",#退出
     "user_info": "/api/user_info",#用户信息
     "post": "/api/post",# 新增发布接口
+    "post_batch": "/api/post_batch",  # 批量发布
     "get_lost_items": "/api/get_lost_items",  # 搜索失物招领信息
     "get_item_detail": "/api/get_item_detail",  # 获取物品详情
+    "my_items": "/api/my_items",  # 当前用户发布的物品
     # 新增接口
     "edit_item": "/api/edit_item",
     "delete_item": "/api/delete_item",
-    "update_status": "/api/update_status"
+    "update_status": "/api/update_status",
+    "batch_items": "/api/batch_items",  # 批量关闭/删除
+    "changes": "/api/changes"  # 帖子变更订阅（增量同步）
 }
 
 def get_api_url(endpoint: str) -> str:
@@ -42,6 +50,16 @@ def get_api_url(endpoint: str) -> str:
         raise ValueError(f"未知的API端点: {endpoint}")#如果API端点不存在，抛出异常
     return f"{SERVER_BASE_URL}{API_ENDPOINTS[endpoint]}"#返回完整的API URL
 
+def get_file_url(path: str) -> str:
+    """服务器返回的图片 URL（以 / 开头的相对路径）转为完整 URL"""
+    if path.startswith("/"):
+        return f"{SERVER_BASE_URL}{path}"
+    return path
+
 def get_timeout() -> int:
     """获取请求超时时间"""
-    return CURRENT_CONFIG.get("timeout", 10) #返回请求超时时间
\ No newline at end of file
+    return CURRENT_CONFIG.get("timeout", 10) #返回请求超时时间
+
+def get_mirror_path() -> str:
+    """当前服务器对应的本地帖子镜像文件，切换服务器时各用各的"""
+    return os.path.join(LOCAL_DATA_DIR, f"mirror-{CURRENT_CONFIG['host']}-{CURRENT_CONFIG['port']}.db")
@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import requests
+
+
+class ConditionalGetCache:
+    """
+    条件请求缓存
+
+    按 URL + 参数记住最后一次响应的 JSON 和 ETag，再次请求时带上 If-None-Match，
+    服务器数据未变化时返回 304，直接复用本地保存的结果，只花一次往返的开销。
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (etag, json)
+        self._lock = threading.Lock()  # 搜索线程和界面线程会同时访问
+
+    @staticmethod
+    def _make_key(url: str, params: Optional[Dict]) -> Tuple:
+        return (url,) + tuple(sorted((params or {}).items()))
+
+    def get_json(self, url: str, params: Optional[Dict] = None, http=None, timeout=None) -> Tuple[int, Dict]:
+        """
+        发送带 If-None-Match 的 GET 请求
+
+        Args:
+            url: 请求地址
+            params: 查询参数
+            http: requests 或 requests.Session（需要登录态时传 session）
+            timeout: 超时时间
+
+        Returns:
+            Tuple[int, Dict]: (状态码, 响应JSON)；304 时返回 200 和缓存的 JSON
+        """
+        http = http or requests
+        key = self._make_key(url, params)
+        with self._lock:
+            entry = self._entries.get(key)
+        headers = {"If-None-Match": entry[0]} if entry else {}
+
+        response = http.get(url, params=params, headers=headers, timeout=timeout)
+        if response.status_code == 304 and entry:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return 200, entry[1]
+
+        result = response.json()
+        etag = response.headers.get("ETag")
+        if response.status_code == 200 and etag:
+            with self._lock:
+                self._entries[key] = (etag, result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return response.status_code, result
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+
+# 客户端共享的条件请求缓存
+shared_cache = ConditionalGetCache()
@@ -1,18 +1,25 @@
-SELECT id, created_at FROM posts ORDER BY created_at;import sqlite3
+import sqlite3
 import os
+import sys
 
-DB_PATH = r"D:\SqliteDatabase\user.db"
+# 结构修订脚本位于 server 目录，与服务器共用
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server"))
+from db_schema import migrate
+from settings import load_config
 
-def init_database():
+# 与服务器相同的配置（环境变量 DB_PATH，默认 <项目根目录>/data/user.db）
+DB_PATH = load_config()["DB_PATH"]
+
+def init_database(db_path=DB_PATH):
     """初始化数据库，创建用户表和失物招领信息表"""
     # 确保数据库目录存在
-    db_dir = os.path.dirname(DB_PATH)
-    if not os.path.exists(db_dir):
+    db_dir = os.path.dirname(db_path)
+    if db_dir and not os.path.exists(db_dir):
         os.makedirs(db_dir)
         print(f"创建数据库目录: {db_dir}")
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
         # 创建用户表
@@ -44,26 +51,22 @@ def init_database():
             )
         ''')
 
-        # 创建索引以提高搜索性能
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_posts_item_name ON posts (item_name)
-        ''')
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_posts_type ON posts (type)
-        ''')
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_posts_category ON posts (item_category)
-        ''')
+        # 创建索引以提高搜索性能（按筛选条件的复合索引见 server/db_schema.py）
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts (created_at)
         ''')
         
         conn.commit()
+
+        # 应用后续的结构修订（全文索引等）
+        applied = migrate(conn)
         conn.close()
         print("数据库初始化成功！")
-        print(f"数据库路径: {DB_PATH}")
+        print(f"数据库路径: {db_path}")
         print("已创建表: users, posts")
-        print("已创建索引: idx_posts_item_name, idx_posts_type, idx_posts_category, idx_posts_created_at")
+        print("已创建索引: idx_posts_created_at")
+        for description in applied:
+            print(f"已应用结构修订: {description}")
         
     except Exception as e:
         print(f"数据库初始化失败: {e}")
@@ -0,0 +1,268 @@
+"""
+本地帖子镜像（离线搜索）
+
+把服务器上的全部帖子保存在用户目录下的 SQLite 文件里（config.get_mirror_path()）：
+第一次使用时沿 get_lost_items 的分页游标整体下载一次，之后由 ChangeFeed 把 /api/changes 的增量写进来。
+镜像就绪后搜索页直接查本地库，不再每次请求服务器，网络断开时也能搜索：
+关键字与服务器一样先切成字二元组走全文索引（text_segment.py），无法走索引时退回 LIKE，
+再按类型、分类筛选，按发布时间倒序。
+
+synced_at 是最后一次成功同步的时间，超过 STALE_AFTER 秒没有同步时界面提示数据可能已过时。
+镜像只是缓存：结构版本不符时重建，服务器清理了中间的变更或数据库被换过时整体重新下载。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import requests
+
+from .config import get_api_url, get_mirror_path, get_timeout
+from .text_segment import build_match_query, segment_text
+
+# 本地库的结构版本，修改下面的表结构后加一，旧镜像会被丢弃重新下载
+SCHEMA_VERSION = 1
+
+# 整体下载时每页的帖子数
+DOWNLOAD_PAGE_SIZE = 1000
+
+# 超过这么多秒没有同步成功，界面提示数据可能已过时
+STALE_AFTER = 30
+
+_SCHEMA = """
+    CREATE TABLE posts (
+        id INTEGER PRIMARY KEY,
+        type TEXT,
+        item_category TEXT,
+        status TEXT,
+        created_at TEXT,
+        item_name TEXT,
+        description TEXT,
+        location TEXT,
+        data TEXT NOT NULL  -- 列表接口返回的完整帖子（JSON）
+    );
+    CREATE INDEX idx_posts_created_at ON posts (created_at, id);
+    CREATE VIRTUAL TABLE posts_fts USING fts5(item_name, description, location, tokenize='unicode61');
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+"""
+
+
+def download_posts(page_size: int = DOWNLOAD_PAGE_SIZE) -> Iterator[List[Dict]]:
+    """
+    沿 get_lost_items 的分页游标逐页下载全部帖子（不统计总数）
+
+    Raises:
+        RuntimeError: 服务器返回错误
+        requests.RequestException: 网络错误
+    """
+    cursor = ""
+    while True:
+        params = {"limit": page_size, "count": "none"}
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(get_api_url("get_lost_items"), params=params, timeout=get_timeout())
+        result = response.json()
+        if response.status_code != 200 or not result.get("success"):
+            raise RuntimeError(result.get("message", f"HTTP错误: {response.status_code}"))
+        yield result["data"]["items"]
+        cursor = result["data"].get("next_cursor")
+        if not cursor:
+            return
+
+
+class LocalMirror:
+    """
+    本地帖子镜像
+
+    ChangeFeed 线程写入，界面线程搜索；每个线程用自己的连接，WAL 模式下写入时照常可读。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.since = None      # 已同步到的变更序号，None 表示还没有完整下载过
+        self.synced_at = None  # 最后一次同步成功的时间（time.time()）
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _open(self):
+        conn = self._connect()
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # 旧版本的镜像直接丢弃（FTS5 的影子表随虚表一起删除）
+            tables = [name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE 'posts_fts_%'")]
+            conn.executescript("".join(f'DROP TABLE IF EXISTS "{name}";' for name in tables)
+                               + _SCHEMA + f"PRAGMA user_version = {SCHEMA_VERSION};")
+        meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        self.since = meta.get("since")
+        self.synced_at = meta.get("synced_at")
+
+    @property
+    def ready(self) -> bool:
+        """是否已完整下载过，可以用来搜索"""
+        return self.since is not None
+
+    @property
+    def stale(self) -> bool:
+        return self.synced_at is None or time.time() - self.synced_at > STALE_AFTER
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---- 写入（ChangeFeed 线程） ----
+
+    def _save_meta(self, conn, since):
+        synced_at = time.time()
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                         [("since", since), ("synced_at", synced_at)])
+        return synced_at
+
+    @staticmethod
+    def _upsert(conn, items: List[Dict]):
+        ids = [item["id"] for item in items]
+        conn.execute("DELETE FROM posts_fts WHERE rowid IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+        conn.executemany(
+            "INSERT OR REPLACE INTO posts (id, type, item_category, status, created_at, item_name, description,"
+            " location, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(item["id"], item.get("type"), item.get("item_category"), item.get("status"), item.get("created_at"),
+              item.get("item_name"), item.get("description"), item.get("location"),
+              json.dumps(item, ensure_ascii=False)) for item in items]
+        )
+        conn.executemany(
+            "INSERT INTO posts_fts (rowid, item_name, description, location) VALUES (?, ?, ?, ?)",
+            [(item["id"], segment_text(item.get("item_name")), segment_text(item.get("description")),
+              segment_text(item.get("location"))) for item in items]
+        )
+
+    @staticmethod
+    def _delete(conn, ids: List[int]):
+        ids = json.dumps(ids)
+        conn.execute("DELETE FROM posts_fts WHERE rowid IN (SELECT value FROM json_each(?))", (ids,))
+        conn.execute("DELETE FROM posts WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+
+    def bootstrap(self, since: int, pages: Iterable[List[Dict]]):
+        """
+        用整体下载的帖子替换镜像内容
+
+        Args:
+            since: 开始下载之前取得的变更序号，之后从这里增量同步（下载期间的变更会再应用一次，结果不变）
+            pages: download_posts() 返回的分页
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM posts")
+            conn.execute("DELETE FROM posts_fts")
+            for items in pages:
+                self._upsert(conn, items)
+            synced_at = self._save_meta(conn, since)
+        self.since, self.synced_at = since, synced_at
+
+    def apply_changes(self, changes: List[Dict], next_since: int):
+        """
+        应用 /api/changes 返回的一批变更并记录同步位置（变更为空时只更新同步时间）
+
+        与 change_feed.apply_changes 相同的规则，只是镜像里有全部帖子：
+        deleted 删除，status 只改状态，created/updated 整条写入。
+        """
+        conn = self._connect()
+        with conn:
+            deleted = [change["id"] for change in changes if change["op"] == "deleted"]
+            if deleted:
+                self._delete(conn, deleted)
+            conn.executemany(
+                "UPDATE posts SET status = ?, data = json_set(data, '$.status', ?) WHERE id = ?",
+                [(change["status"], change["status"], change["id"]) for change in changes if change["op"] == "status"]
+            )
+            items = [change["item"] for change in changes if change["op"] in ("created", "updated") and change.get("item")]
+            if items:
+                self._upsert(conn, items)
+            synced_at = self._save_meta(conn, next_since)
+        self.since, self.synced_at = next_since, synced_at
+
+    def invalidate(self):
+        """服务器已清理中间的变更或数据库被换过：下次同步时整体重新下载，在此之前不用于搜索"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM meta WHERE key = 'since'")
+        self.since = None
+
+    # ---- 搜索（界面线程） ----
+
+    def search(self, keyword: str = "", item_type: str = "", category: str = "",
+               limit: int = 50, offset: int = 0, cursor: str = "") -> Dict:
+        """
+        本地搜索，返回与 get_lost_items 相同结构的结果
+
+        本地分页直接用偏移量，next_cursor 就是下一页的偏移量（字符串），传回 cursor 即可翻页。
+        """
+        if cursor:
+            offset = int(cursor)
+        keyword = keyword.strip()
+        where_conditions = ["1=1"]
+        params = []
+        from_clause = "posts p"
+
+        match_query = build_match_query(keyword) if keyword else None
+        if match_query:
+            from_clause = "posts_fts JOIN posts p ON p.id = posts_fts.rowid"
+            where_conditions.append("posts_fts MATCH ?")
+            params.append(match_query)
+        elif keyword:
+            # 关键字无法走索引时（如单个汉字）退回LIKE模糊搜索，与服务器相同
+            where_conditions.append("(p.item_name LIKE ? OR p.description LIKE ? OR p.location LIKE ?)")
+            keyword_param = f"%{keyword}%"
+            params.extend([keyword_param, keyword_param, keyword_param])
+
+        if item_type:
+            where_conditions.append("p.type = ?")
+            params.append(item_type)
+
+        if category:
+            where_conditions.append("p.item_category = ?")
+            params.append(category)
+
+        where = " AND ".join(where_conditions)
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT p.data FROM {from_clause} WHERE {where} ORDER BY p.created_at DESC, p.id DESC LIMIT ? OFFSET ?",
+            params + [limit + 1, offset]
+        ).fetchall()
+        total = conn.execute(f"SELECT COUNT(*) FROM {from_clause} WHERE {where}", params).fetchone()[0]
+        has_more = len(rows) > limit
+        return {
+            "items": [json.loads(row[0]) for row in rows[:limit]],
+            "total": total,
+            "total_capped": False,
+            "has_more": has_more,
+            "limit": limit,
+            "offset": offset,
+            "sort": "time",
+            "next_cursor": str(offset + limit) if has_more else None,
+        }
+
+
+def open_mirror(path: Optional[str] = None) -> Optional[LocalMirror]:
+    """打开当前服务器对应的本地镜像；打不开（目录不可写、SQLite 不支持 FTS5 等）时返回 None，搜索页继续在线搜索"""
+    try:
+        return LocalMirror(path or get_mirror_path())
+    except (OSError, sqlite3.Error) as e:
+        print(f"打开本地镜像失败: {e}")
+        return None
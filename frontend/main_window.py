@@ -13,6 +13,8 @@ from frontend.search_service import SearchService
 from PySide6.QtWidgets import QListWidgetItem, QMessageBox
 import requests
 from .center import CenterTab
+from .change_feed import ChangeFeed, apply_changes, keyword_matches
+from .local_mirror import open_mirror
 
 
 class ChangePasswordDialog(QDialog):
@@ -83,7 +85,13 @@ class MainWindow(QMainWindow):
         ui_path = os.path.join(project_root, "ui", "main_window.ui")#获取UI文件路径
         self.ui = loader.load(ui_path, self)#加载UI文件
         self.setCentralWidget(self.ui.centralwidget)#设置中央窗口
+        # 先取得变更序号再加载各列表，之后的增删改由 ChangeFeed 推送，各列表就地修改；
+        # 同时写进本地镜像，搜索页在镜像就绪后改为本地搜索
+        self.mirror = open_mirror()
+        self.change_feed = ChangeFeed(self, mirror=self.mirror)
+        self.change_feed.bootstrap()
         self._add_tabs()#添加标签页
+        self._start_change_feed()
 
     def _add_tabs(self):
         self.publish_tab = PublishTab(self.ui.publish_tab, session=self.session)
@@ -97,7 +105,7 @@ class MainWindow(QMainWindow):
         self._load_info_wall_items()
 
         try:
-            self.search_tab = SearchTab()
+            self.search_tab = SearchTab(mirror=self.mirror)
             if hasattr(self.ui, 'tabWidget'):
                 self.ui.tabWidget.addTab(self.search_tab, "搜索")
             if hasattr(self.ui, 'profile_tab') and hasattr(self.ui, 'my_posts_listWidget'):
@@ -121,6 +129,19 @@ class MainWindow(QMainWindow):
             print(f"添加搜索标签页或个人中心失败: {e}")
 
 
+    def _start_change_feed(self):
+        """把变更分发给信息墙、搜索页和个人中心"""
+        self.change_feed.changes_received.connect(self._apply_info_wall_changes)
+        self.change_feed.reset_required.connect(self._handle_info_wall_search)
+        if hasattr(self, 'search_tab'):
+            self.change_feed.changes_received.connect(self.search_tab.on_changes)
+            self.change_feed.reset_required.connect(self.search_tab.perform_search)
+            self.change_feed.mirror_ready.connect(self.search_tab.on_mirror_ready)
+        if hasattr(self, 'center_tab'):
+            self.change_feed.changes_received.connect(self.center_tab.on_changes)
+            self.change_feed.reset_required.connect(self.center_tab.load_my_items)
+        self.change_feed.start()
+
     def _connect_signals(self):
         """连接信号和槽函数"""
         # 用户管理标签页
@@ -193,18 +214,35 @@ class MainWindow(QMainWindow):
         )
         
         if reply == QMessageBox.Yes:
+            self.change_feed.stop()
+            if self.mirror is not None:
+                self.mirror.close()
             event.accept()
         else:
             event.ignore()
 
     def _load_info_wall_items(self, keyword=""):
         """加载信息展示墙数据"""
-        self.info_listWidget.clear()
         search_service = SearchService()
         if keyword:
             items = search_service.search_by_keyword(keyword)
         else:
             items = search_service.get_all_items(limit=100)
+        self.info_wall_keyword = keyword
+        self.info_wall_items = items
+        self._render_info_wall()
+
+    def _apply_info_wall_changes(self, changes):
+        """收到服务器的变更（ChangeFeed），直接修改信息墙上已有的条目"""
+        items, _ = apply_changes(self.info_wall_items, changes,
+                                 accept=lambda item: keyword_matches(item, self.info_wall_keyword))
+        if items != self.info_wall_items:
+            self.info_wall_items = items
+            self._render_info_wall()
+
+    def _render_info_wall(self):
+        self.info_listWidget.clear()
+        items = list(self.info_wall_items)
         if not items:
             self.info_listWidget.addItem("暂无信息")
             return
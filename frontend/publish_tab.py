@@ -1,8 +1,36 @@
 import os
+import csv
+import json
 import requests
-from PySide6.QtWidgets import QMessageBox, QFileDialog, QPushButton, QLineEdit, QTextEdit, QComboBox, QDateTimeEdit
+from PySide6.QtWidgets import QMessageBox, QFileDialog, QPushButton, QLineEdit, QTextEdit, QComboBox, QDateTimeEdit, QFormLayout
 from .config import get_api_url, get_timeout
 
+# CSV 批量导入的列名，image 列为图片路径（相对路径以 CSV 文件所在目录为准），可留空
+CSV_COLUMNS = ("item_name", "item_category", "type", "description", "time", "location", "image")
+
+# 每次请求最多提交的条数（服务器单次上限 500）
+BATCH_SIZE = 200
+
+
+def read_items_csv(csv_path):
+    """读取批量导入的 CSV，返回 [(物品信息, 图片路径或None), ...]"""
+    base_dir = os.path.dirname(os.path.abspath(csv_path))
+    rows = []
+    # utf-8-sig 兼容 Excel 另存为 CSV 时带的 BOM
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = [name for name in ("item_name", "type", "location") if name not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"CSV 缺少列: {', '.join(missing)}")
+        for record in reader:
+            item = {name: (record.get(name) or "").strip() for name in CSV_COLUMNS if name != "image"}
+            image = (record.get("image") or "").strip()
+            if image and not os.path.isabs(image):
+                image = os.path.join(base_dir, image)
+            rows.append((item, image or None))
+    return rows
+
+
 class PublishTab:
     def __init__(self, widget, session=None):
         self.ui = widget  # 直接使用主窗口传入的publish_tab widget
@@ -19,11 +47,18 @@ class PublishTab:
         self.datetime_edit = self.ui.findChild(QDateTimeEdit, "datetime_edit")
         self.location_lineEdit = self.ui.findChild(QLineEdit, "location_lineEdit")
 
+        # 批量导入按钮（界面文件里没有，代码中加到发布表单末尾）
+        self.batch_import_pushButton = QPushButton("批量导入CSV")
+        form_layout = self.ui.findChild(QFormLayout, "publishFormLayout")
+        if form_layout is not None:
+            form_layout.addRow(self.batch_import_pushButton)
+
         self.setup_signals()
 
     def setup_signals(self):
         self.submit_pushButton.clicked.connect(self.handle_submit)
         self.upload_image_pushButton.clicked.connect(self.handle_upload_image)
+        self.batch_import_pushButton.clicked.connect(self.handle_batch_import)
 
     def handle_upload_image(self):
         file_path, _ = QFileDialog.getOpenFileName(self.ui, "选择图片", "", "Images (*.png *.jpg *.jpeg *.bmp)")
@@ -83,5 +118,60 @@ class PublishTab:
         except Exception as e:
             QMessageBox.critical(self.ui, "网络错误", str(e))
 
+    def handle_batch_import(self):
+        csv_path, _ = QFileDialog.getOpenFileName(self.ui, "选择CSV文件", "", "CSV (*.csv)")
+        if not csv_path:
+            return
+        try:
+            rows = read_items_csv(csv_path)
+        except Exception as e:
+            QMessageBox.warning(self.ui, "文件错误", f"CSV 无法读取: {e}")
+            return
+        if not rows:
+            QMessageBox.information(self.ui, "提示", "CSV 中没有数据")
+            return
+
+        inserted = 0
+        errors = []
+        try:
+            for start in range(0, len(rows), BATCH_SIZE):
+                chunk = rows[start:start + BATCH_SIZE]
+                result = self.post_batch(chunk)
+                data = result.get("data")
+                if not data:
+                    raise RuntimeError(result.get("message", "未知错误"))
+                inserted += data.get("inserted", 0)
+                for item_result in data.get("results", []):
+                    if not item_result.get("success"):
+                        # CSV 第 1 行是表头，数据从第 2 行开始
+                        errors.append(f"第 {start + item_result['index'] + 2} 行: {item_result.get('message')}")
+        except Exception as e:
+            errors.append(f"导入中断: {e}")
+
+        message = f"成功导入 {inserted} 条，失败 {len(rows) - inserted} 条"
+        if errors:
+            message += "\n\n" + "\n".join(errors[:20])
+            if len(errors) > 20:
+                message += f"\n... 共 {len(errors)} 条错误"
+            QMessageBox.warning(self.ui, "批量导入", message)
+        else:
+            QMessageBox.information(self.ui, "批量导入", message)
+
+    def post_batch(self, rows):
+        """提交一批物品，rows 为 [(物品信息, 图片路径或None), ...]"""
+        files = {}
+        try:
+            for index, (_, image_path) in enumerate(rows):
+                if image_path:
+                    files[f"image_{index}"] = open(image_path, "rb")
+            data = {"items": json.dumps([item for item, _ in rows], ensure_ascii=False)}
+            http = self.session or requests
+            # 有图片时为 multipart，否则为普通表单，服务器都从表单字段 items 读取
+            response = http.post(get_api_url("post_batch"), data=data, files=files or None, timeout=get_timeout())
+            return response.json()
+        finally:
+            for f in files.values():
+                f.close()
+
     def get_widget(self):
         return self.ui.publish_tab  # 返回信息发布Tab的主控件
\ No newline at end of file
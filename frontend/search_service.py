@@ -1,6 +1,6 @@
-import requests
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator
 from .config import get_api_url, get_timeout
+from .http_cache import shared_cache
 
 
 class SearchService:
@@ -14,7 +14,9 @@ class SearchService:
                      item_type: str = "",
                      category: str = "",
                      limit: int = 50,
-                     offset: int = 0) -> Dict:
+                     offset: int = 0,
+                     cursor: str = "",
+                     count: str = "") -> Dict:
         """
         搜索失物招领信息
 
@@ -23,9 +25,11 @@ class SearchService:
             category: 物品分类
             limit: 返回数量限制
             offset: 分页偏移
+            cursor: 分页游标（上一页结果中的 next_cursor），传入时忽略 offset
+            count: 总数统计方式 exact/estimate/none，默认 exact
 
         Returns:
-            Dict: 包含搜索结果和统计信息
+            Dict: 包含搜索结果和统计信息，next_cursor 为空表示没有下一页
         """
         try:
             params = {
@@ -33,20 +37,21 @@ class SearchService:
                 'type': item_type,
                 'category': category,
                 'limit': limit,
-                'offset': offset
+                'offset': offset,
+                'cursor': cursor,
+                'count': count
             }
 
             # 移除空参数
             params = {k: v for k, v in params.items() if v}
 
-            response = requests.get(
+            status_code, result = shared_cache.get_json(
                 self.base_url,
                 params=params,
                 timeout=get_timeout()
             )
 
-            if response.status_code == 200:
-                result = response.json()
+            if status_code == 200:
                 if result.get("success"):
                     return result["data"]
                 else:
@@ -55,6 +60,7 @@ class SearchService:
                         "total": 0,
                         "limit": limit,
                         "offset": offset,
+                        "next_cursor": None,
                         "error": result.get("message", "搜索失败")
                     }
             else:
@@ -63,7 +69,8 @@ class SearchService:
                     "total": 0,
                     "limit": limit,
                     "offset": offset,
-                    "error": f"HTTP错误: {response.status_code}"
+                    "next_cursor": None,
+                    "error": f"HTTP错误: {status_code}"
                 }
 
         except Exception as e:
@@ -72,9 +79,36 @@ class SearchService:
                 "total": 0,
                 "limit": limit,
                 "offset": offset,
+                "next_cursor": None,
                 "error": f"网络错误: {str(e)}"
             }
 
+    def iter_items(self,
+                   keyword: str = "",
+                   item_type: str = "",
+                   category: str = "",
+                   page_size: int = 50) -> Iterator[Dict]:
+        """
+        沿分页游标逐页遍历全部搜索结果
+
+        Args:
+            keyword: 搜索关键字
+            item_type: 物品类型
+            category: 物品分类
+            page_size: 每页数量
+
+        Yields:
+            Dict: 单条物品信息
+        """
+        cursor = ""
+        while True:
+            result = self.search_items(keyword, item_type, category, limit=page_size,
+                                       cursor=cursor, count="none")
+            yield from result.get("items", [])
+            cursor = result.get("next_cursor")
+            if not cursor:
+                break
+
     def get_item_detail(self, item_id: int) -> Optional[Dict]:
         """
         获取单个物品的详细信息
@@ -86,20 +120,19 @@ class SearchService:
             Dict: 物品详细信息，失败时返回None
         """
         try:
-            response = requests.get(
-                get_api_url("get_item_detail").replace("<int:item_id>", str(item_id)),
+            status_code, result = shared_cache.get_json(
+                f"{get_api_url('get_item_detail')}/{item_id}",
                 timeout=get_timeout()
             )
 
-            if response.status_code == 200:
-                result = response.json()
+            if status_code == 200:
                 if result.get("success"):
                     return result["data"]
                 else:
                     print(f"获取物品详情失败: {result.get('message')}")
                     return None
             else:
-                print(f"HTTP错误: {response.status_code}")
+                print(f"HTTP错误: {status_code}")
                 return None
 
         except Exception as e:
@@ -1,4 +1,6 @@
 import os
+import sqlite3
+import time
 import requests
 from datetime import datetime
 from PySide6.QtWidgets import (
@@ -9,13 +11,32 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt, QTimer, QThread, Signal
 from PySide6.QtGui import QPixmap, QFont
-from frontend.config import get_api_url, get_timeout
+from frontend.config import get_api_url, get_file_url, get_timeout
+from frontend.http_cache import shared_cache
+from frontend.change_feed import apply_changes, keyword_matches
+
+# 每页条数，与服务器 get_lost_items 的默认值相同
+PAGE_SIZE = 50
+
+# 刷新同步状态的间隔（毫秒）
+SYNC_LABEL_INTERVAL_MS = 5000
 
 
 def is_remote_path(path):
     return path.startswith("http://") or path.startswith("https://") or path.startswith("ftp://")
 
 
+def format_age(seconds):
+    """把秒数转为"N 分钟前"之类的文字"""
+    if seconds < 60:
+        return "刚刚"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} 分钟前"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} 小时前"
+    return f"{int(seconds // 86400)} 天前"
+
+
 class ItemDetailDialog(QDialog):
     """失物招领信息详情对话框"""
 
@@ -43,13 +64,14 @@ class ItemDetailDialog(QDialog):
         title_label.setAlignment(Qt.AlignCenter)
         scroll_layout.addWidget(title_label)
 
-        # 图片显示
-        if self.item_data.get('image_path'):
+        # 图片显示：优先下载服务器生成的预览图，只有旧帖子没有预览图时才下载原图
+        image_url = self.item_data.get('preview_url') or self.item_data.get('image_url')
+        if image_url or self.item_data.get('image_path'):
             image_label = QLabel()
             image_label.setAlignment(Qt.AlignCenter)
             image_label.setMaximumHeight(200)
 
-            image_path = self.item_data['image_path']
+            image_path = get_file_url(image_url) if image_url else self.item_data['image_path']
             print(f"图片路径: {image_path}")
 
             if is_remote_path(image_path):
@@ -134,13 +156,14 @@ class SearchWorker(QThread):
     search_finished = Signal(dict)
     search_error = Signal(str)
 
-    def __init__(self, keyword="", item_type="", category="", limit=50, offset=0):
+    def __init__(self, keyword="", item_type="", category="", limit=PAGE_SIZE, offset=0, cursor=""):
         super().__init__()
         self.keyword = keyword
         self.item_type = item_type
         self.category = category
         self.limit = limit
         self.offset = offset
+        self.cursor = cursor  # 分页游标，非空时加载下一页
 
     def run(self):
         try:
@@ -149,38 +172,51 @@ class SearchWorker(QThread):
                 'type': self.item_type,
                 'category': self.category,
                 'limit': self.limit,
-                'offset': self.offset
+                'offset': self.offset,
+                'cursor': self.cursor,
+                # 关键字搜索只需要封顶的估算总数，避免服务器为统计总数再扫一遍
+                'count': 'estimate' if self.keyword else ''
             }
 
             # 移除空参数
             params = {k: v for k, v in params.items() if v}
 
-            response = requests.get(
+            # 带 If-None-Match 请求，数据未变化时服务器返回 304，复用上次的结果
+            status_code, result = shared_cache.get_json(
                 get_api_url("get_lost_items"),
                 params=params,
                 timeout=get_timeout()
             )
 
-            if response.status_code == 200:
-                result = response.json()
+            if status_code == 200:
                 if result.get("success"):
                     self.search_finished.emit(result["data"])
                 else:
                     self.search_error.emit(result.get("message", "搜索失败"))
             else:
-                self.search_error.emit(f"HTTP错误: {response.status_code}")
+                self.search_error.emit(f"HTTP错误: {status_code}")
 
         except Exception as e:
             self.search_error.emit(f"网络错误: {str(e)}")
 
 
 class SearchTab(QWidget):
-    """搜索功能标签页"""
+    """
+    搜索功能标签页
 
-    def __init__(self, parent=None):
+    传入的本地镜像（local_mirror.LocalMirror）就绪后直接在本地搜索，否则请求服务器（SearchWorker）。
+    """
+
+    def __init__(self, parent=None, mirror=None):
         super().__init__(parent)
+        self.mirror = mirror
         self.search_worker = None
         self.current_items = []
+        self.next_cursor = None  # 下一页游标
+        self.appending = False  # 当前搜索是否为"加载更多"
+        self.total = 0
+        self.total_capped = False
+        self.pending_changes = []  # 搜索进行中收到的变更，结果返回后再应用
         self.setup_ui()
         self.setup_signals()
         self.load_initial_data()
@@ -238,6 +274,10 @@ class SearchTab(QWidget):
 
         filter_layout.addStretch()
 
+        # 本地镜像的同步状态
+        self.sync_label = QLabel("")
+        filter_layout.addWidget(self.sync_label)
+
         # 统计信息
         self.status_label = QLabel("共找到 0 条记录")
         filter_layout.addWidget(self.status_label)
@@ -269,6 +309,11 @@ class SearchTab(QWidget):
 
         layout.addWidget(self.result_table)
 
+        # 加载更多（沿游标翻页）
+        self.load_more_btn = QPushButton("加载更多")
+        self.load_more_btn.setEnabled(False)
+        layout.addWidget(self.load_more_btn)
+
         self.setLayout(layout)
 
     def setup_signals(self):
@@ -279,6 +324,7 @@ class SearchTab(QWidget):
         self.type_combo.currentTextChanged.connect(self.on_filter_changed)
         self.category_combo.currentTextChanged.connect(self.on_filter_changed)
         self.result_table.itemDoubleClicked.connect(self.show_item_detail)
+        self.load_more_btn.clicked.connect(self.load_more)
 
         # 设置搜索防抖
         self.search_timer = QTimer()
@@ -286,6 +332,12 @@ class SearchTab(QWidget):
         self.search_timer.timeout.connect(self.perform_search)
         self.search_input.textChanged.connect(self.on_search_text_changed)
 
+        # 定时刷新同步状态，断网后能看出本地数据在变旧
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.update_sync_label)
+        self.sync_timer.start(SYNC_LABEL_INTERVAL_MS)
+        self.update_sync_label()
+
     def on_search_text_changed(self):
         """搜索文本变化时启动防抖定时器"""
         self.search_timer.start(500)  # 500ms防抖
@@ -300,6 +352,15 @@ class SearchTab(QWidget):
 
     def perform_search(self):
         """执行搜索"""
+        self.start_search(cursor="")
+
+    def load_more(self):
+        """沿游标加载下一页并追加到表格"""
+        if self.next_cursor:
+            self.start_search(cursor=self.next_cursor)
+
+    def start_search(self, cursor=""):
+        """启动搜索线程，cursor 非空时为加载下一页"""
         keyword = self.search_input.text().strip()
         item_type = self.type_combo.currentData()
         category = self.category_combo.currentData()
@@ -311,8 +372,17 @@ class SearchTab(QWidget):
             self.search_worker.terminate()
             self.search_worker.wait()
 
+        self.appending = bool(cursor)
+        if self.uses_mirror():
+            try:
+                self.on_search_finished(self.mirror.search(keyword, item_type, category, limit=PAGE_SIZE,
+                                                           cursor=cursor))
+                return
+            except sqlite3.Error as e:
+                print(f"本地搜索失败，改为在线搜索: {e}")
+
         # 创建新的搜索线程
-        self.search_worker = SearchWorker(keyword, item_type, category)
+        self.search_worker = SearchWorker(keyword, item_type, category, cursor=cursor)
         self.search_worker.search_finished.connect(self.on_search_finished)
         self.search_worker.search_error.connect(self.on_search_error)
         self.search_worker.start()
@@ -326,17 +396,112 @@ class SearchTab(QWidget):
         self.search_btn.setText("搜索")
         self.search_btn.setEnabled(True)
 
-        self.current_items = data.get('items', [])
+        if self.appending:
+            self.current_items.extend(data.get('items', []))
+        else:
+            self.current_items = data.get('items', [])
         self.update_table()
 
+        self.next_cursor = data.get('next_cursor')
+        self.load_more_btn.setEnabled(bool(self.next_cursor))
+
         # 更新状态信息
-        total = data.get('total', 0)
-        self.status_label.setText(f"共找到 {total} 条记录")
+        self.total = data.get('total') or 0
+        self.total_capped = bool(data.get('total_capped'))
+        self.update_status_label()
+
+        # 搜索期间到达的变更可能比搜索结果新，补上
+        if self.pending_changes:
+            changes, self.pending_changes = self.pending_changes, []
+            self.on_changes(changes)
+
+    def uses_mirror(self):
+        return self.mirror is not None and self.mirror.ready
+
+    def on_mirror_ready(self):
+        """本地镜像下载完成：之后的搜索都在本地进行"""
+        self.update_sync_label()
+        self.perform_search()
+
+    def update_sync_label(self):
+        """显示本地数据的同步状态，超过 STALE_AFTER 秒没同步上时提示可能已过时"""
+        if self.mirror is None:
+            self.sync_label.setText("")
+        elif not self.mirror.ready:
+            self.sync_label.setText("正在下载本地数据，暂时在线搜索")
+            self.sync_label.setStyleSheet("")
+        elif self.mirror.stale:
+            age = format_age(time.time() - self.mirror.synced_at) if self.mirror.synced_at else "尚未"
+            self.sync_label.setText(f"本地数据{age}同步，可能已过时")
+            self.sync_label.setStyleSheet("color: #c0392b;")
+        else:
+            self.sync_label.setText("本地数据已同步")
+            self.sync_label.setStyleSheet("")
+
+    def update_status_label(self):
+        if self.total_capped:
+            self.status_label.setText(f"找到超过 {self.total} 条记录")
+        else:
+            self.status_label.setText(f"共找到 {self.total} 条记录")
+
+    def accepts_item(self, item):
+        """帖子是否符合当前的搜索条件（关键字只做本地近似判断）"""
+        item_type = self.type_combo.currentData()
+        category = self.category_combo.currentData()
+        return ((not item_type or item.get('type') == item_type)
+                and (not category or item.get('item_category') == category)
+                and keyword_matches(item, self.search_input.text().strip()))
+
+    def on_changes(self, changes):
+        """收到服务器的变更（ChangeFeed），直接修改已加载的结果，不重新搜索"""
+        if self.search_worker and self.search_worker.isRunning():
+            self.pending_changes.extend(changes)
+            return
+        if self.uses_mirror():
+            # 镜像已经写入这些变更，按当前条件重新查本地库，保留已加载的条数
+            self.refresh_from_mirror()
+            return
+        items, delta = apply_changes(self.current_items, changes, self.accepts_item)
+        if items == self.current_items:
+            return
+        self.current_items = items
+        self.total = max(self.total + delta, 0)
+        sorting = self.result_table.isSortingEnabled()
+        self.result_table.setSortingEnabled(False)  # 填充期间关闭排序，避免行在写入时被重排
+        self.update_table()
+        self.result_table.setSortingEnabled(sorting)
+        self.update_status_label()
+
+    def refresh_from_mirror(self):
+        keyword = self.search_input.text().strip()
+        limit = max(len(self.current_items), PAGE_SIZE)
+        try:
+            data = self.mirror.search(keyword, self.type_combo.currentData(), self.category_combo.currentData(),
+                                      limit=limit)
+        except sqlite3.Error as e:
+            print(f"本地搜索失败: {e}")
+            return
+        self.update_sync_label()
+        if data['items'] == self.current_items and data['total'] == self.total:
+            return
+        self.current_items = data['items']
+        self.next_cursor = data['next_cursor']
+        self.load_more_btn.setEnabled(bool(self.next_cursor))
+        self.total = data['total']
+        self.total_capped = False
+        sorting = self.result_table.isSortingEnabled()
+        self.result_table.setSortingEnabled(False)
+        self.update_table()
+        self.result_table.setSortingEnabled(sorting)
+        self.update_status_label()
 
     def on_search_error(self, error_msg):
         """搜索错误处理"""
         self.search_btn.setText("搜索")
         self.search_btn.setEnabled(True)
+        if self.pending_changes:
+            changes, self.pending_changes = self.pending_changes, []
+            self.on_changes(changes)
         QMessageBox.warning(self, "搜索错误", error_msg)
 
     def update_table(self):
@@ -0,0 +1,70 @@
+"""
+本地镜像的全文检索分词（与 server/fulltext.py 相同的规则）
+
+中文按"字二元组"（bigram）切分，英文和数字按单词切分并统一小写，切好的文本用空格连接后交给 FTS5 的 unicode61；
+查询时把中文关键字按同样规则切分并拼成短语查询，含英文或数字的关键字退回 LIKE。本地搜索结果要与服务器一致，
+修改规则时两边必须一起改（tests/test_text_segment.py 检查两者的输出相同）。
+
+前端是独立发布的程序，不导入服务器目录下的模块，这里只保留搜索用到的两个函数。
+"""
+import re
+import unicodedata
+
+# 中文（含扩展 A 区和兼容区）连续片段，或连续的英文/数字
+_RUN_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]+|[0-9a-z]+")
+
+
+def _is_cjk(run: str) -> bool:
+    return not run[0].isascii()
+
+
+def _normalize(text: str) -> str:
+    """全角转半角并小写"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _cjk_bigrams(run: str) -> list:
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def segment_text(text) -> str:
+    """把文本切成空格分隔的索引词（中文二元组 + 英文单词）"""
+    if not text:
+        return ""
+    tokens = []
+    for run in _RUN_RE.findall(_normalize(str(text))):
+        if _is_cjk(run):
+            tokens.extend(_cjk_bigrams(run))
+        else:
+            tokens.append(run)
+    return " ".join(tokens)
+
+
+def build_match_query(keyword: str):
+    """
+    把搜索关键字转换成 FTS5 MATCH 表达式
+
+    Returns:
+        str: MATCH 表达式；关键字无法用索引精确表达时（含英文或数字、以单个汉字开头）返回 None，
+             调用方应退回 LIKE 查询
+    """
+    terms = []
+    for word in _normalize(keyword).split():
+        runs = _RUN_RE.findall(word)
+        if not runs:
+            continue
+        # 英文和数字按整词索引，查不到词中间的子串（"phone" 不能命中 "iphone"）；
+        # 以单个汉字开头时，它可能是文档里某个长片段的最后一个字，二元组索引也查不到
+        if not all(_is_cjk(run) for run in runs) or len(runs[0]) == 1:
+            return None
+        parts = []
+        for run in runs:
+            parts.extend(f'"{token}"' for token in _cjk_bigrams(run))
+        if len(runs[-1]) == 1:
+            parts[-1] += "*"
+        terms.append(" + ".join(parts))
+    if not terms:
+        return None
+    return " AND ".join(f"({term})" for term in terms)
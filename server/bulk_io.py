@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+帖子批量导出/导入
+
+导出：posts 连接 users（只带用户名，不带密码哈希），按 id 顺序从游标每次 fetchmany
+BATCH_SIZE 行，逐批格式化为 NDJSON（每行一个 JSON 对象）或 CSV（首行为列名）后产出，
+内存占用与总行数无关。服务器的 /api/admin/export 和下面的命令行共用这些生成器。
+
+导入：读取导出文件（NDJSON 或 CSV），每 chunk_size 条一个事务写入，每个事务提交后报告进度，
+导入途中服务器可以照常读写。
+- 帖子默认分配新 id；--keep-ids 保留原 id，已存在的 id 跳过（重复导入同一文件不会重复）
+- 只有 username、type、item_name、location 是必需的列；没有 status、created_at 时
+  按表结构的默认值取 active 和导入时间
+- 按用户名关联用户，目标库没有的用户自动创建，但没有可用的密码，无法登录
+- 图片文件不在导出内容中，需另外复制 UPLOAD_DIR；引用的图片路径登记到 images 表，
+  引用计数照常由触发器维护
+- 某条记录格式错误或违反约束（如 --keep-ids 时 id 冲突以外的约束）时，所在的块回滚，导入中止，
+  报告是第几条记录以及之前已提交的条数；修正后用 --keep-ids 重新导入可跳过已导入的部分
+
+用法:
+    python bulk_io.py export --db data/user.db --format csv -o posts.csv [--type 失物信息] [--since 2024-09-01]
+    python bulk_io.py import --db /srv/lostfound/user.db posts.ndjson [--chunk 5000] [--keep-ids]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import fulltext
+from db_pool import ConnectionPool
+
+# 每次从游标取的行数
+BATCH_SIZE = 1000
+
+# 导入时每个事务的条数
+DEFAULT_CHUNK_SIZE = 5000
+
+EXPORT_COLUMNS = (
+    "id", "username", "type", "item_name", "item_category", "description", "time", "location",
+    "status", "created_at", "image_path", "image_width", "image_height",
+    "thumb_path", "thumb_width", "thumb_height", "preview_path", "preview_width", "preview_height",
+)
+INTEGER_COLUMNS = {"id", "image_width", "image_height", "thumb_width", "thumb_height",
+                   "preview_width", "preview_height"}
+IMAGE_COLUMNS = ("image_path", "thumb_path", "preview_path")
+REQUIRED_COLUMNS = ("username", "type", "item_name", "location")
+# 记录里没有这些列（或为空）时按表结构的默认值写入，不能写成 NULL：
+# status 为 NULL 的帖子不会出现在 active 筛选、计数和匹配里，created_at 为 NULL 会打乱分页游标的顺序
+COLUMN_DEFAULTS = {"status": "'active'", "created_at": "datetime('now')"}
+
+FORMATS = {
+    "ndjson": "application/x-ndjson; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# 导入的用户没有可用的密码（任何算法都不会校验通过）
+UNUSABLE_PASSWORD = "!"
+
+
+class ImportAborted(Exception):
+    """某条记录无法导入，所在的块已回滚；counts 为之前已提交的块的计数"""
+
+    def __init__(self, message, counts):
+        super().__init__(message)
+        self.counts = counts
+
+
+def export_query(post_type=None, status=None, since=None, until=None) -> tuple:
+    """导出语句和参数；since/until 按 created_at 筛选（含 since，不含 until）"""
+    conditions = []
+    params = []
+    for clause, value in (("p.type = ?", post_type), ("p.status = ?", status),
+                          ("p.created_at >= ?", since), ("p.created_at < ?", until)):
+        if value:
+            conditions.append(clause)
+            params.append(value)
+    columns = ", ".join("u.username" if c == "username" else f"p.{c}" for c in EXPORT_COLUMNS)
+    sql = f"SELECT {columns} FROM posts p LEFT JOIN users u ON p.user_id = u.id"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql + " ORDER BY p.id", params
+
+
+def iter_batches(conn, sql, params=(), batch_size=BATCH_SIZE):
+    """逐批产出查询结果（每批至多 batch_size 行的元组列表）"""
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+
+def format_ndjson(batches):
+    """每批行格式化为一段 NDJSON 文本"""
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows)
+
+
+def format_csv(batches):
+    """先产出列名行，再把每批行格式化为一段 CSV 文本"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+FORMATTERS = {"ndjson": format_ndjson, "csv": format_csv}
+
+
+def read_records(f, fmt):
+    """从导出文件逐条读出记录 dict（CSV 的空字符串视为 NULL，整数列转为 int）"""
+    if fmt == "ndjson":
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+        return
+    for row in csv.DictReader(f):
+        yield {
+            key: (int(value) if key in INTEGER_COLUMNS else value) if value != "" else None
+            for key, value in row.items()
+        }
+
+
+def import_posts(conn, records, chunk_size=DEFAULT_CHUNK_SIZE, keep_ids=False, progress=None) -> dict:
+    """
+    分块导入帖子
+
+    Args:
+        conn: 可写连接（事务由本函数控制）
+        records: read_records 产出的记录
+        keep_ids: 保留原 id，已存在的 id 跳过
+        progress: 每个事务提交后调用 progress(已处理条数, 已导入条数, 新建用户数)
+
+    Returns:
+        dict: 处理、导入、跳过的条数和新建的用户数
+
+    Raises:
+        ImportAborted: 记录格式错误或违反约束，之前的块已提交
+    """
+    conn.isolation_level = None
+    user_ids = {}
+    counts = {"read": 0, "imported": 0, "skipped": 0, "users_created": 0}
+    columns = [c for c in EXPORT_COLUMNS if c != "username" and (keep_ids or c != "id")]
+    placeholders = [f"COALESCE(?, {COLUMN_DEFAULTS[c]})" if c in COLUMN_DEFAULTS else "?" for c in columns]
+    insert_sql = (
+        f"INSERT {'OR IGNORE ' if keep_ids else ''}INTO posts (user_id, {', '.join(columns)}) "
+        f"VALUES (?, {', '.join(placeholders)})"
+    )
+
+    chunk = []
+    try:
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                _import_chunk(conn, chunk, counts, user_ids, columns, insert_sql)
+                chunk = []
+                if progress is not None:
+                    progress(counts["read"], counts["imported"], counts["users_created"])
+        if chunk:
+            _import_chunk(conn, chunk, counts, user_ids, columns, insert_sql)
+            if progress is not None:
+                progress(counts["read"], counts["imported"], counts["users_created"])
+    except ValueError as e:
+        # read_records 读取时出错（JSON 格式错误、整数列不是整数），出错的是已读入的下一条
+        raise ImportAborted(f"第 {counts['read'] + len(chunk) + 1} 条记录无法解析: {e}", dict(counts)) from e
+    return counts
+
+
+def _import_chunk(conn, chunk, counts, user_ids, columns, insert_sql):
+    conn.execute("BEGIN IMMEDIATE")
+    created = {}  # 本块里查到或新建的用户
+    new_users = 0
+    try:
+        imported = 0
+        for offset, record in enumerate(chunk, counts["read"] + 1):
+            missing = [c for c in REQUIRED_COLUMNS if not record.get(c)]
+            if missing:
+                raise ImportAborted(f"第 {offset} 条记录缺少字段: {', '.join(missing)}", dict(counts))
+            try:
+                user_id = user_ids.get(record["username"]) or created.get(record["username"])
+                if user_id is None:
+                    user_id, is_new = _ensure_user(conn, record["username"])
+                    created[record["username"]] = user_id
+                    new_users += is_new
+                for column in IMAGE_COLUMNS:
+                    if record.get(column):
+                        conn.execute("INSERT OR IGNORE INTO images (path, refcount) VALUES (?, 0)",
+                                     (record[column],))
+                cursor = conn.execute(insert_sql, [user_id] + [record.get(c) for c in columns])
+            except sqlite3.IntegrityError as e:
+                raise ImportAborted(f"第 {offset} 条记录（id={record.get('id')}，用户 {record['username']}）"
+                                    f"违反约束: {e}", dict(counts)) from e
+            imported += cursor.rowcount
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    # 提交成功后才更新计数和用户缓存，失败的块不留下痕迹
+    user_ids.update(created)
+    counts["read"] += len(chunk)
+    counts["imported"] += imported
+    counts["skipped"] += len(chunk) - imported
+    counts["users_created"] += new_users
+
+
+def _ensure_user(conn, username) -> tuple:
+    """返回 (用户 id, 是否新建)"""
+    row = conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    if row is not None:
+        return row[0], False
+    cursor = conn.execute("INSERT INTO users (username, password, salt) VALUES (?, ?, '')",
+                          (username, UNUSABLE_PASSWORD))
+    return cursor.lastrowid, True
+
+
+def open_database(db_path: str, query_only: bool):
+    """与服务器相同 PRAGMA（WAL、busy_timeout）的连接"""
+    pool = ConnectionPool(db_path)
+    pool.add_connect_hook(fulltext.register_functions)  # 全文索引触发器依赖分词函数
+    return pool.connect(query_only=query_only)
+
+
+def detect_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+def run_export(args):
+    conn = open_database(args.db, query_only=True)
+    sql, params = export_query(args.type, args.status, args.since, args.until)
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    rows = 0
+    try:
+        def counted(batches):
+            nonlocal rows
+            for batch in batches:
+                rows += len(batch)
+                yield batch
+        for text in FORMATTERS[args.format](counted(iter_batches(conn, sql, params))):
+            out.write(text)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        conn.close()
+    print(f"已导出 {rows} 条帖子", file=sys.stderr)
+
+
+def run_import(args):
+    fmt = args.format or detect_format(args.path)
+    conn = open_database(args.db, query_only=False)
+    start = time.perf_counter()
+
+    def report(read, imported, users_created):
+        elapsed = time.perf_counter() - start
+        print(f"\r已处理 {read} 条，导入 {imported} 条，新建用户 {users_created} 个，"
+              f"{read / elapsed:.0f} 条/秒", end="", file=sys.stderr, flush=True)
+
+    try:
+        with open(args.path, encoding="utf-8", newline="") as f:
+            counts = import_posts(conn, read_records(f, fmt), args.chunk, args.keep_ids, report)
+    except ImportAborted as e:
+        print(f"\n导入中止: {e}\n之前的批次已提交：处理 {e.counts['read']} 条，导入 {e.counts['imported']} 条，"
+              f"新建用户 {e.counts['users_created']} 个；出错的记录所在批次已回滚", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        conn.close()
+    print(f"\n完成：导入 {counts['imported']} 条，跳过已存在 {counts['skipped']} 条，"
+          f"新建用户 {counts['users_created']} 个，耗时 {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+def main():
+    from settings import load_config
+
+    parser = argparse.ArgumentParser(description="帖子批量导出/导入")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="导出帖子")
+    export_parser.add_argument("--format", choices=list(FORMATS), default="ndjson", help="输出格式")
+    export_parser.add_argument("-o", "--output", help="输出文件，默认标准输出")
+    export_parser.add_argument("--type", help="只导出该类型")
+    export_parser.add_argument("--status", help="只导出该状态")
+    export_parser.add_argument("--since", help="created_at 下限（含），如 2024-09-01")
+    export_parser.add_argument("--until", help="created_at 上限（不含）")
+
+    import_parser = subparsers.add_parser("import", help="导入帖子")
+    import_parser.add_argument("path", help="导出文件")
+    import_parser.add_argument("--format", choices=list(FORMATS), help="文件格式，默认按扩展名判断")
+    import_parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK_SIZE, help="每个事务的条数")
+    import_parser.add_argument("--keep-ids", action="store_true", help="保留原帖子 id，已存在的跳过")
+
+    for sub in (export_parser, import_parser):
+        sub.add_argument("--db", default=load_config()["DB_PATH"], help="数据库文件，默认 DB_PATH")
+    args = parser.parse_args()
+    if args.command == "export":
+        run_export(args)
+    else:
+        if not os.path.exists(args.db):
+            parser.error(f"数据库不存在: {args.db}")
+        run_import(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+帖子变更订阅
+
+post_changes（db_schema v9）由触发器在写帖子的同一事务里追加，seq 单调递增。
+/api/changes?since=<seq> 返回 seq 之后的变更，同一帖子的多次变更合并为一条：
+    deleted  帖子已删除（墓碑），只带删除前的 type、item_category
+    status   只改了状态，带 status 和 type、item_category
+    created / updated  带列表接口同样字段的完整帖子
+客户端记住 next_since，下次从这里继续；reset 为真时中间的变更已被清理，需要整体重新加载。
+
+变更日志只保留 RETENTION_DAYS 天，prune() 由服务器的定期任务调用。
+"""
+import datetime
+import json
+
+# 单次最多返回的变更条数
+MAX_LIMIT = 1000
+DEFAULT_LIMIT = 500
+
+# 变更日志保留天数
+RETENTION_DAYS = 7
+
+# 合并同一帖子的多次变更时，信息量大的操作优先
+_OP_RANK = {"status": 0, "updated": 1, "created": 2}
+
+_PRUNED_KEY = "post_changes_pruned"
+
+
+def latest_seq(conn) -> int:
+    """当前最大的变更序号，没有变更时为 0"""
+    row = conn.execute("SELECT seq FROM post_changes ORDER BY seq DESC LIMIT 1").fetchone()
+    if row is not None:
+        return row[0]
+    # 日志被清空后序号也不能倒退
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'post_changes'").fetchone()
+    return row[0] if row else 0
+
+
+def pruned_seq(conn) -> int:
+    """已清理的最大变更序号"""
+    row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (_PRUNED_KEY,)).fetchone()
+    return row[0] if row else 0
+
+
+def read_changes(conn, since: int, limit=DEFAULT_LIMIT, item_loader=None) -> dict:
+    """
+    读取 since 之后的变更（按帖子合并）
+
+    Args:
+        conn: 只读连接
+        since: 客户端已处理到的序号
+        limit: 最多读取的日志行数（合并后条数可能更少）
+        item_loader: item_loader(conn, ids) 返回 {id: 帖子 dict}，created/updated 时附带
+
+    Returns:
+        dict: changes（按最后一次变更的序号排序）、next_since、latest、has_more、reset
+    """
+    latest = latest_seq(conn)
+    if since < pruned_seq(conn) or since > latest:
+        # 中间的变更已清理，或数据库被换过：客户端从 latest 开始重新加载
+        return {"changes": [], "next_since": latest, "latest": latest, "has_more": False, "reset": True}
+
+    rows = conn.execute(
+        "SELECT seq, post_id, op, type, item_category FROM post_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+        (since, limit + 1)
+    ).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    merged = {}  # post_id -> [最后序号, 操作, 类型, 分类]
+    for seq, post_id, op, post_type, category in rows:
+        entry = merged.pop(post_id, None)  # 重新插入，字典顺序即最后一次变更的顺序
+        if op != "deleted" and entry is not None and entry[1] != "deleted":
+            op = max(op, entry[1], key=_OP_RANK.__getitem__)
+        merged[post_id] = [seq, op, post_type, category]
+
+    current = {}
+    need_items = [post_id for post_id, entry in merged.items() if entry[1] != "deleted"]
+    if need_items:
+        current = dict(conn.execute(
+            "SELECT id, status FROM posts WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(need_items),)
+        ).fetchall())
+    full_ids = [post_id for post_id in need_items
+                if post_id in current and merged[post_id][1] != "status"]
+    items = item_loader(conn, full_ids) if item_loader and full_ids else {}
+
+    changes = []
+    for post_id, (seq, op, post_type, category) in merged.items():
+        if op != "deleted" and post_id not in current:
+            # 读日志之后帖子又被删除：按删除返回，之后那条删除记录再下发一次也无妨
+            op = "deleted"
+        change = {"seq": seq, "id": post_id, "op": op}
+        if op == "status":
+            change["status"] = current[post_id]
+        if op in ("status", "deleted"):
+            change["type"] = post_type
+            change["item_category"] = category
+        else:
+            change["item"] = items.get(post_id)
+        changes.append(change)
+
+    next_since = rows[-1][0] if rows else since
+    return {"changes": changes, "next_since": next_since, "latest": latest, "has_more": has_more, "reset": False}
+
+
+def prune(conn, retention_days=RETENTION_DAYS) -> int:
+    """删除 retention_days 天前的变更并记录清理到的序号（写任务），返回删除的行数"""
+    cutoff = (datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    # seq 与 changed_at 同序：从头找到第一条未过期的即可，不必扫描整张表
+    row = conn.execute(
+        "SELECT seq FROM post_changes WHERE changed_at >= ? ORDER BY seq LIMIT 1", (cutoff,)
+    ).fetchone()
+    boundary = row[0] if row else latest_seq(conn) + 1
+    if boundary <= 1:
+        return 0
+    deleted = conn.execute("DELETE FROM post_changes WHERE seq < ?", (boundary,)).rowcount
+    if deleted:
+        conn.execute(
+            "UPDATE data_versions SET version = MAX(version, ?) WHERE name = ?", (boundary - 1, _PRUNED_KEY)
+        )
+    return deleted
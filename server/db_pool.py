@@ -0,0 +1,297 @@
+"""
+SQLite 连接池
+
+每个线程在一次请求内独占一条连接（同一线程内的嵌套借用会复用同一条连接），
+归还后的连接放回空闲栈供后续请求复用，避免每次请求都重新打开数据库文件、
+解析表结构、冷启动页缓存。
+
+连接创建时只执行一次 PRAGMA 调优（WAL、synchronous=NORMAL、busy_timeout、
+mmap、cache_size），并开启较大的预编译语句缓存，复用连接即可复用预编译语句。
+
+指定 trace_path 时，每条执行的语句（已代入参数）以 JSON 行追加到该文件，
+供 index_advisor.py 回放分析执行计划。写 users 表或涉及密码列的语句（注册、登录时的哈希升级）
+把字符串常量替换为 '?' 再记录，密码哈希和盐不会出现在日志里。
+
+query_only=True 时池中连接只读（PRAGMA query_only），写操作统一交给 db_writer.WriteQueue，
+误写会直接报错而不是去抢写锁。
+
+注册了语句钩子（add_statement_hook）时，连接换成 TimedConnection：每条语句从执行到
+取完结果的耗时累计后交给钩子 hook(sql, parameters, seconds)，用于请求耗时统计和慢查询日志。
+"""
+import json
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+# 每条新连接执行一次的 PRAGMA
+DEFAULT_PRAGMAS = (
+    ("journal_mode", "WAL"),           # 读写并发：读不阻塞写，写不阻塞读
+    ("synchronous", "NORMAL"),         # WAL 模式下安全且显著减少 fsync
+    ("busy_timeout", 5000),            # 遇到锁时最多等待 5 秒而不是立即报错
+    ("mmap_size", 256 * 1024 * 1024),  # 256MB 内存映射读
+    ("cache_size", -64 * 1024),        # 负数表示 KB，即 64MB 页缓存
+    ("temp_store", "MEMORY"),          # 临时表/排序放内存
+)
+
+# 每条连接缓存的预编译语句数量（sqlite3 默认仅 128）
+DEFAULT_CACHED_STATEMENTS = 256
+
+# 查询日志里需要去掉参数值的语句：写 users 表，或读写密码哈希/盐
+_SENSITIVE_SQL_RE = re.compile(
+    r"\b(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?)\s+\"?users\b"
+    r"|\b(?:password|salt)\b",
+    re.IGNORECASE,
+)
+# 字符串和 BLOB 常量（已代入的参数）
+_LITERAL_RE = re.compile(r"[xX]?'(?:[^']|'')*'")
+
+
+def redact_statement(sql: str) -> str:
+    """敏感语句的字符串/BLOB 常量替换为 '?'，语句结构不变，仍可用于分析执行计划"""
+    if _SENSITIVE_SQL_RE.search(sql):
+        return _LITERAL_RE.sub("'?'", sql)
+    return sql
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    累计一条语句的执行耗时（execute 加上之后每次取结果），语句结束时通知连接上的钩子
+
+    语句结束：不返回结果的语句执行完、结果取完、游标重新执行/关闭/被回收。
+    """
+    _sql = None
+
+    def _start(self, sql, parameters):
+        self._finish()
+        self._sql = sql
+        self._parameters = parameters
+        self._elapsed = 0.0
+
+    def _finish(self):
+        sql, self._sql = self._sql, None
+        if sql is not None:
+            for hook in self.connection.statement_hooks:
+                hook(sql, self._parameters, self._elapsed)
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        start = perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except BaseException:
+            self._elapsed += perf_counter() - start
+            self._finish()
+            raise
+        self._elapsed += perf_counter() - start
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None)
+        start = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._elapsed += perf_counter() - start
+            self._finish()
+
+    def fetchone(self):
+        start = perf_counter()
+        row = super().fetchone()
+        self._elapsed += perf_counter() - start
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = perf_counter()
+        rows = super().fetchmany(size)
+        self._elapsed += perf_counter() - start
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = perf_counter()
+        rows = super().fetchall()
+        self._elapsed += perf_counter() - start
+        self._finish()
+        return rows
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._elapsed += perf_counter() - start
+            self._finish()
+            raise
+        self._elapsed += perf_counter() - start
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class TimedConnection(sqlite3.Connection):
+    """游标默认使用 TimedCursor；conn.execute 等快捷方法也经过它"""
+    statement_hooks = ()
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class ConnectionPool:
+    """按线程借还的 SQLite 连接池"""
+
+    def __init__(self, db_path, max_idle=8, pragmas=DEFAULT_PRAGMAS,
+                 cached_statements=DEFAULT_CACHED_STATEMENTS, trace_path=None, query_only=False):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.pragmas = pragmas
+        self.query_only = query_only
+        self.cached_statements = cached_statements
+        self.trace_path = trace_path
+        self._trace_file = None
+        self._trace_lock = threading.Lock()
+        self._idle = []  # 空闲连接栈（后进先出，热连接优先复用）
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connect_hooks = []
+        self._statement_hooks = []
+        self._stats = {
+            "hits": 0,       # 从空闲栈取到连接
+            "misses": 0,     # 没有空闲连接，新建连接
+            "reentrant": 0,  # 同一线程嵌套借用，直接复用
+            "discarded": 0,  # 归还时空闲栈已满，关闭连接
+        }
+
+    def add_connect_hook(self, hook):
+        """注册新连接初始化钩子，hook(conn) 在每条新连接创建时调用一次"""
+        self._connect_hooks.append(hook)
+
+    def add_statement_hook(self, hook):
+        """注册语句耗时钩子，hook(sql, parameters, seconds) 在每条语句结束时调用（对之后新建的连接生效）"""
+        self._statement_hooks.append(hook)
+
+    def connect(self, query_only=None) -> sqlite3.Connection:
+        """
+        新建一条不经过池的连接，PRAGMA、初始化钩子与池中连接相同
+
+        Args:
+            query_only: 覆盖池的只读设置（写线程用 query_only=False 取得可写连接）
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,  # 连接会在不同线程间轮转，但同一时刻只属于一个线程
+            cached_statements=self.cached_statements,
+            factory=TimedConnection if self._statement_hooks else sqlite3.Connection
+        )
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        if self.query_only if query_only is None else query_only:
+            conn.execute("PRAGMA query_only = ON")
+        for hook in self._connect_hooks:
+            hook(conn)
+        if self.trace_path:
+            conn.set_trace_callback(self._trace_statement)
+        if self._statement_hooks:
+            conn.statement_hooks = self._statement_hooks  # 连接初始化的 PRAGMA 不计入
+        return conn
+
+    def _trace_statement(self, sql: str):
+        """查询日志：每条语句一行 JSON"""
+        line = json.dumps({"sql": redact_statement(sql)}, ensure_ascii=False)
+        with self._trace_lock:
+            if self._trace_file is None:
+                self._trace_file = open(self.trace_path, "a", encoding="utf-8", buffering=1)
+            self._trace_file.write(line + "\n")
+
+    def acquire(self) -> sqlite3.Connection:
+        """借出连接，同一线程已持有连接时直接复用"""
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is not None:
+            local.depth += 1
+            with self._lock:
+                self._stats["reentrant"] += 1
+            return conn
+
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats["hits"] += 1
+            else:
+                self._stats["misses"] += 1
+        if conn is None:
+            conn = self.connect()
+
+        local.conn = conn
+        local.depth = 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """归还连接，最外层归还时才真正放回空闲栈"""
+        local = self._local
+        local.depth -= 1
+        if local.depth > 0:
+            return
+        local.conn = None
+
+        try:
+            # 未提交的事务一律回滚，避免把脏状态带给下一个请求
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._stats["discarded"] += 1
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """with pool.connection() as conn: ... 退出时自动归还"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self) -> dict:
+        """连接池命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        with self._trace_lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
@@ -0,0 +1,417 @@
+"""
+数据库结构版本管理
+
+基础表（users、posts）由 frontend/init_database.py 创建；之后的结构修订按版本号
+登记在 MIGRATIONS 中，用 PRAGMA user_version 记录已应用到哪个版本。
+服务器启动和 init_database.py 都会调用 migrate()，只执行尚未应用的修订，
+每个修订在一个事务里完成。
+"""
+import sqlite3
+
+import fulltext
+
+
+def _v1_fulltext(conn):
+    """posts 的全文索引（物品名称、描述、地点），由触发器保持同步"""
+    seg = fulltext.SEGMENT_FUNCTION
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+            item_name, description, location,
+            content='', tokenize='unicode61'
+        )
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, item_name, description, location)
+            VALUES (new.id, {seg}(new.item_name), {seg}(new.description), {seg}(new.location));
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, item_name, description, location)
+            VALUES ('delete', old.id, {seg}(old.item_name), {seg}(old.description), {seg}(old.location));
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF item_name, description, location ON posts BEGIN
+            INSERT INTO posts_fts (posts_fts, rowid, item_name, description, location)
+            VALUES ('delete', old.id, {seg}(old.item_name), {seg}(old.description), {seg}(old.location));
+            INSERT INTO posts_fts (rowid, item_name, description, location)
+            VALUES (new.id, {seg}(new.item_name), {seg}(new.description), {seg}(new.location));
+        END
+    """)
+    # 为已有数据建立索引
+    conn.execute(f"""
+        INSERT INTO posts_fts (rowid, item_name, description, location)
+        SELECT id, {seg}(item_name), {seg}(description), {seg}(location) FROM posts
+    """)
+
+
+def _v2_post_counts(conn):
+    """按 (类型, 分类, 状态) 分组的帖子计数表，由触发器维护，列表接口据此 O(1) 得到总数"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS post_counts (
+            type TEXT NOT NULL,
+            item_category TEXT NOT NULL,  -- 分类为空时记为 ''
+            status TEXT NOT NULL,         -- 状态为空时记为 ''
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (type, item_category, status)
+        ) WITHOUT ROWID
+    """)
+    increment = """
+        INSERT INTO post_counts (type, item_category, status, count)
+        VALUES (new.type, COALESCE(new.item_category, ''), COALESCE(new.status, ''), 1)
+        ON CONFLICT (type, item_category, status) DO UPDATE SET count = count + 1;
+    """
+    decrement = """
+        UPDATE post_counts SET count = count - 1
+        WHERE type = old.type
+          AND item_category = COALESCE(old.item_category, '')
+          AND status = COALESCE(old.status, '');
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS post_counts_ai AFTER INSERT ON posts BEGIN
+            {increment}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS post_counts_ad AFTER DELETE ON posts BEGIN
+            {decrement}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS post_counts_au AFTER UPDATE OF type, item_category, status ON posts
+        WHEN old.type IS NOT new.type
+          OR old.item_category IS NOT new.item_category
+          OR old.status IS NOT new.status
+        BEGIN
+            {decrement}
+            {increment}
+        END
+    """)
+    # 统计已有数据
+    conn.execute("DELETE FROM post_counts")
+    conn.execute("""
+        INSERT INTO post_counts (type, item_category, status, count)
+        SELECT type, COALESCE(item_category, ''), COALESCE(status, ''), COUNT(*)
+        FROM posts
+        GROUP BY 1, 2, 3
+    """)
+
+
+def _v3_data_versions(conn):
+    """posts 数据版本号，任何增删改都使其加一，用作列表/详情响应的 ETag"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    conn.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('posts', 0)")
+    for event, name in (("INSERT", "ai"), ("UPDATE", "au"), ("DELETE", "ad")):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS posts_version_{name} AFTER {event} ON posts BEGIN
+                UPDATE data_versions SET version = version + 1 WHERE name = 'posts';
+            END
+        """)
+
+
+def _v4_user_posts_index(conn):
+    """个人中心"我的发布"按 (user_id, created_at) 索引分页（反向扫描即得到时间倒序，rowid 也随之倒序）"""
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_user_created ON posts (user_id, created_at)
+    """)
+
+
+def _v5_query_shape_indexes(conn):
+    """
+    按实际查询形状重建 posts 索引
+
+    列表接口按 类型/分类 筛选并按 created_at 倒序分页，复合索引让 SQLite 直接按索引顺序
+    取前 N 行，不再"用单列索引筛选后再临时排序"。索引均为升序，反向扫描即得到
+    (created_at, id) 倒序。单列的 type、item_category 索引是复合索引的前缀，
+    item_name 索引对 LIKE '%..%' 无用（关键字已走全文索引），一并删除。
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_type_cat_created ON posts (type, item_category, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_type_created ON posts (type, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_cat_created ON posts (item_category, created_at)")
+    # 只索引未解决的帖子：列表按 status='active' 筛选、失物/招领匹配都只关心这部分
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_active ON posts (type, item_category, created_at)
+        WHERE status = 'active'
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_posts_type")
+    conn.execute("DROP INDEX IF EXISTS idx_posts_category")
+    conn.execute("DROP INDEX IF EXISTS idx_posts_item_name")
+    conn.execute("ANALYZE")
+
+
+def _v6_images(conn):
+    """
+    图片引用计数表 images
+
+    按内容哈希存储的图片每个文件一行，refcount 由 posts 上的触发器维护（与 post_counts 同理），
+    归零的图片由后台清理任务在宽限期后删除。已有帖子的旧格式图片一并登记，size 由清理任务补齐。
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS images (
+            path TEXT PRIMARY KEY,             -- 与 posts.image_path 相同的相对路径
+            hash TEXT,                         -- 内容 SHA-256，旧格式图片为 NULL
+            size INTEGER,                      -- 字节数
+            refcount INTEGER NOT NULL DEFAULT 0,
+            touched_at TEXT NOT NULL DEFAULT (datetime('now'))  -- 最近一次上传或引用变化
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_unreferenced ON images (touched_at) WHERE refcount <= 0")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_images_ai AFTER INSERT ON posts
+        WHEN new.image_path IS NOT NULL BEGIN
+            UPDATE images SET refcount = refcount + 1 WHERE path = new.image_path;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_images_ad AFTER DELETE ON posts
+        WHEN old.image_path IS NOT NULL BEGIN
+            UPDATE images SET refcount = refcount - 1, touched_at = datetime('now') WHERE path = old.image_path;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_images_au AFTER UPDATE OF image_path ON posts
+        WHEN old.image_path IS NOT new.image_path BEGIN
+            UPDATE images SET refcount = refcount - 1, touched_at = datetime('now') WHERE path = old.image_path;
+            UPDATE images SET refcount = refcount + 1 WHERE path = new.image_path;
+        END
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO images (path, refcount)
+        SELECT image_path, COUNT(*) FROM posts
+        WHERE image_path IS NOT NULL AND image_path != ''
+        GROUP BY image_path
+    """)
+
+
+def _v7_image_renditions(conn):
+    """
+    缩略图/预览图路径与尺寸
+
+    缩略图和预览图同样登记在 images 表中，引用计数触发器改为同时统计三列。
+    每列单独加减，原图很小时缩略图与预览图内容相同（同一路径）也能正确计数。
+    """
+    for column, column_type in (
+        ("image_width", "INTEGER"), ("image_height", "INTEGER"),
+        ("thumb_path", "TEXT"), ("thumb_width", "INTEGER"), ("thumb_height", "INTEGER"),
+        ("preview_path", "TEXT"), ("preview_width", "INTEGER"), ("preview_height", "INTEGER"),
+    ):
+        conn.execute(f"ALTER TABLE posts ADD COLUMN {column} {column_type}")
+
+    conn.execute("DROP TRIGGER IF EXISTS posts_images_ai")
+    conn.execute("DROP TRIGGER IF EXISTS posts_images_ad")
+    conn.execute("DROP TRIGGER IF EXISTS posts_images_au")
+    columns = ("image_path", "thumb_path", "preview_path")
+    increments = "\n".join(
+        f"UPDATE images SET refcount = refcount + 1 WHERE path = new.{c};" for c in columns
+    )
+    decrements = "\n".join(
+        f"UPDATE images SET refcount = refcount - 1, touched_at = datetime('now') WHERE path = old.{c};"
+        for c in columns
+    )
+    changes = "\n".join(
+        f"""UPDATE images SET refcount = refcount - 1, touched_at = datetime('now')
+            WHERE path = old.{c} AND old.{c} IS NOT new.{c};
+            UPDATE images SET refcount = refcount + 1 WHERE path = new.{c} AND old.{c} IS NOT new.{c};"""
+        for c in columns
+    )
+    conn.execute(f"CREATE TRIGGER posts_images_ai AFTER INSERT ON posts BEGIN {increments} END")
+    conn.execute(f"CREATE TRIGGER posts_images_ad AFTER DELETE ON posts BEGIN {decrements} END")
+    conn.execute(f"""
+        CREATE TRIGGER posts_images_au AFTER UPDATE OF {', '.join(columns)} ON posts BEGIN
+            {changes}
+        END
+    """)
+
+
+def _v8_matching(conn):
+    """
+    失物/招领自动匹配（见 matching.py）
+
+    match_terms 是 active 帖子的倒排索引：每个 (索引词, 帖子) 一行，主键按
+    (索引词, 类型, 类别, 发布时间) 排列，按类型/类别/时间窗缩小候选范围可以直接在索引上完成。
+    与 posts_fts 一样由触发器维护，删除时用相同的分词结果定位，因此 match_terms 函数必须是确定性的。
+    matches 保存计算好的匹配结果，两个方向各一行。
+    """
+    fn = fulltext.MATCH_TERMS_FUNCTION
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS match_terms (
+            term TEXT NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,            -- 未填类别为 ''
+            created_at TEXT NOT NULL,
+            post_id INTEGER NOT NULL,
+            weight INTEGER NOT NULL,           -- 名称 > 地点 > 描述
+            PRIMARY KEY (term, type, category, created_at, post_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS matches (
+            post_id INTEGER NOT NULL,
+            match_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            matched_at TEXT NOT NULL DEFAULT (datetime('now')),
+            PRIMARY KEY (post_id, match_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_match_id ON matches (match_id)")
+
+    def insert_terms(row):
+        return f"""
+            INSERT OR IGNORE INTO match_terms (term, type, category, created_at, post_id, weight)
+            SELECT key, {row}.type, COALESCE({row}.item_category, ''), COALESCE({row}.created_at, ''), {row}.id, value
+            FROM json_each({fn}({row}.item_name, {row}.description, {row}.location))
+        """
+
+    delete_old_terms = f"""
+        DELETE FROM match_terms
+        WHERE old.status = 'active'
+          AND term IN (SELECT key FROM json_each({fn}(old.item_name, old.description, old.location)))
+          AND type = old.type AND category = COALESCE(old.item_category, '')
+          AND created_at = COALESCE(old.created_at, '') AND post_id = old.id
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_match_ai AFTER INSERT ON posts WHEN new.status = 'active' BEGIN
+            {insert_terms('new')};
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_match_ad AFTER DELETE ON posts BEGIN
+            {delete_old_terms};
+            DELETE FROM matches WHERE post_id = old.id;
+            DELETE FROM matches WHERE match_id = old.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_match_au
+        AFTER UPDATE OF type, item_category, item_name, description, location, status, created_at ON posts BEGIN
+            {delete_old_terms};
+            {insert_terms('new')} WHERE new.status = 'active';
+        END
+    """)
+    # 为已有的 active 帖子建立索引；匹配结果用 python server/matching.py rebuild 补算
+    conn.execute(f"""
+        INSERT OR IGNORE INTO match_terms (term, type, category, created_at, post_id, weight)
+        SELECT t.key, p.type, COALESCE(p.item_category, ''), COALESCE(p.created_at, ''), p.id, t.value
+        FROM posts p, json_each({fn}(p.item_name, p.description, p.location)) t
+        WHERE p.status = 'active'
+    """)
+
+
+def _v9_post_changes(conn):
+    """
+    帖子变更日志（见 change_feed.py）
+
+    posts 的每次增删改由触发器在同一事务里追加一行，seq 用 AUTOINCREMENT，删除旧记录后也不会复用，
+    客户端记住读到的最大 seq 即可增量同步。删除的帖子留下 op='deleted' 的墓碑，
+    type/item_category 记下变更后（删除时为删除前）的值，按类型/分类订阅时不必再查 posts。
+    只改状态的 UPDATE 记为 'status'，其余 UPDATE 记为 'updated'。
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS post_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id INTEGER NOT NULL,
+            op TEXT NOT NULL,                  -- created / updated / status / deleted
+            type TEXT,
+            item_category TEXT,
+            changed_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+    # 已清理的最大 seq：客户端的 since 比它小说明中间的变更已经丢失，需要整体重新加载
+    conn.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('post_changes_pruned', 0)")
+    unchanged = " AND ".join(f"old.{column} IS new.{column}" for column in (
+        "user_id", "type", "item_name", "item_category", "description", "time", "location", "created_at",
+        "image_path", "thumb_path", "preview_path",
+    ))
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_changes_ai AFTER INSERT ON posts BEGIN
+            INSERT INTO post_changes (post_id, op, type, item_category)
+            VALUES (new.id, 'created', new.type, new.item_category);
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_changes_au AFTER UPDATE ON posts BEGIN
+            INSERT INTO post_changes (post_id, op, type, item_category)
+            VALUES (new.id, CASE WHEN {unchanged} THEN 'status' ELSE 'updated' END, new.type, new.item_category);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_changes_ad AFTER DELETE ON posts BEGIN
+            INSERT INTO post_changes (post_id, op, type, item_category)
+            VALUES (old.id, 'deleted', old.type, old.item_category);
+        END
+    """)
+
+
+def _v10_inactive_matches(conn):
+    """
+    帖子不再是 active（找到或关闭）时删除它的匹配结果
+
+    与删除帖子时一样由触发器在同一事务里完成，改状态的写任务不必另外清理；
+    重新变为 active 时由服务器重新计算。已有的过期结果在这里一并清掉。
+    """
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_match_inactive
+        AFTER UPDATE OF status ON posts WHEN old.status = 'active' AND new.status != 'active' BEGIN
+            DELETE FROM matches WHERE post_id = old.id;
+            DELETE FROM matches WHERE match_id = old.id;
+        END
+    """)
+    conn.execute("""
+        DELETE FROM matches
+        WHERE post_id NOT IN (SELECT id FROM posts WHERE status = 'active')
+           OR match_id NOT IN (SELECT id FROM posts WHERE status = 'active')
+    """)
+
+
+# (版本号, 说明, 执行函数)，版本号必须递增
+MIGRATIONS = [
+    (1, "全文索引 posts_fts", _v1_fulltext),
+    (2, "帖子计数表 post_counts", _v2_post_counts),
+    (3, "数据版本号 data_versions", _v3_data_versions),
+    (4, "我的发布索引 idx_posts_user_created", _v4_user_posts_index),
+    (5, "按查询形状的复合索引与 active 部分索引", _v5_query_shape_indexes),
+    (6, "图片引用计数表 images", _v6_images),
+    (7, "缩略图与预览图 posts.thumb_path/preview_path", _v7_image_renditions),
+    (8, "失物/招领匹配 match_terms/matches", _v8_matching),
+    (9, "帖子变更日志 post_changes", _v9_post_changes),
+    (10, "非 active 帖子的匹配结果随状态清理", _v10_inactive_matches),
+]
+
+
+def get_schema_version(conn) -> int:
+    """当前数据库已应用的结构版本"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn) -> list:
+    """
+    执行所有未应用的结构修订
+
+    Returns:
+        list: 本次应用的修订说明
+    """
+    fulltext.register_functions(conn)
+    applied = []
+    current = get_schema_version(conn)
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(f"v{version}: {description}")
+    return applied
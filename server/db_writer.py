@@ -0,0 +1,216 @@
+"""
+单写线程 + 组提交
+
+SQLite 同一时刻只允许一个写事务，多个请求线程各自写库时会互相等锁，超过 busy_timeout
+就报 "database is locked"。这里改为所有写操作排队交给一个专用写线程：
+
+- 写线程一次取出队列中已有的若干个任务，在同一个事务里依次执行，最后只提交一次
+  （组提交：一次 fsync/WAL 提交分摊给一组请求）；
+- 每个任务包在自己的 SAVEPOINT 里，任务抛异常只回滚它自己，不影响同组其他任务；
+- 提交成功后才把各任务的返回值交给调用方的 Future，调用方看到结果时数据已经落盘。
+
+任务函数签名为 func(conn, *args)，不要自行 commit/rollback；带 RETURNING 的语句要 fetchall()
+取完结果，未执行完的语句会让提交失败。
+需要自己控制事务的维护操作（结构迁移、PRAGMA optimize、图片清理）用 exclusive=True 提交，
+在写线程上单独执行，不包进组事务。
+"""
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from time import perf_counter
+
+# 一个组事务最多包含的任务数
+DEFAULT_MAX_BATCH = 64
+
+# 队列上限，超过时 submit 等待，等待超时抛出 queue.Full
+DEFAULT_MAX_QUEUE = 10000
+
+_STOP = object()
+
+
+class WriteQueue:
+    """写任务队列，由单独的写线程执行"""
+
+    def __init__(self, connect, max_batch=DEFAULT_MAX_BATCH, max_queue=DEFAULT_MAX_QUEUE):
+        """
+        Args:
+            connect: 返回写连接的函数，写线程启动时调用一次
+            max_batch: 一个组事务最多包含的任务数
+            max_queue: 排队任务上限
+        """
+        self._connect = connect
+        self.max_batch = max_batch
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._wait_hooks = []
+        self._capture_context = None
+        self._activate_context = None
+        self._stats = {
+            "jobs": 0,        # 执行的任务数
+            "failed": 0,      # 抛异常的任务数
+            "batches": 0,     # 提交的组事务数
+            "max_batch": 0,   # 单个组事务最多包含的任务数
+        }
+
+    def start(self):
+        """启动写线程，重复调用无副作用；submit 时也会自动启动"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """处理完已排队的任务后停止写线程"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def submit(self, func, *args, exclusive=False, timeout=5) -> Future:
+        """排队一个写任务，返回 Future"""
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        future = Future()
+        if self._capture_context is not None:
+            func = self._with_context(func, self._capture_context())
+        self._queue.put((future, func, args, exclusive), timeout=timeout)
+        return future
+
+    def set_job_context(self, capture, activate):
+        """
+        把提交线程的上下文带到写线程：capture() 在 submit 时由提交线程调用，
+        写线程执行任务时包在 activate(返回值) 这个上下文管理器里
+        """
+        self._capture_context = capture
+        self._activate_context = activate
+
+    def _with_context(self, func, value):
+        activate = self._activate_context
+
+        def run(conn, *args):
+            with activate(value):
+                return func(conn, *args)
+        return run
+
+    def add_wait_hook(self, hook):
+        """注册等待钩子，hook(seconds) 在每次 execute 等到结果（或异常）后由调用线程调用"""
+        self._wait_hooks.append(hook)
+
+    def execute(self, func, *args, exclusive=False, timeout=None):
+        """排队并等待写任务完成，返回任务的返回值（任务抛出的异常原样抛出）"""
+        start = perf_counter()
+        try:
+            return self.submit(func, *args, exclusive=exclusive).result(timeout)
+        finally:
+            for hook in self._wait_hooks:
+                hook(perf_counter() - start)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["avg_batch"] = round(stats["jobs"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+    def _run(self):
+        conn = self._connect()
+        conn.isolation_level = None  # 事务完全由写线程显式控制
+        try:
+            while True:
+                job = self._queue.get()
+                if job is _STOP:
+                    return
+                if job[3]:
+                    self._run_exclusive(conn, job)
+                    continue
+
+                batch = [job]
+                stop = False
+                pending_exclusive = None
+                # 把已经在排队的任务一起带上，不额外等待
+                while len(batch) < self.max_batch:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is _STOP:
+                        stop = True
+                        break
+                    if job[3]:
+                        pending_exclusive = job
+                        break
+                    batch.append(job)
+
+                self._run_batch(conn, batch)
+                if pending_exclusive is not None:
+                    self._run_exclusive(conn, pending_exclusive)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _run_exclusive(self, conn, job):
+        future, func, args, _ = job
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(conn, *args)
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            self._count(1, 1, 0)
+            future.set_exception(e)
+            return
+        self._count(1, 0, 0)
+        future.set_result(result)
+
+    def _run_batch(self, conn, batch):
+        jobs = [job for job in batch if job[0].set_running_or_notify_cancel()]
+        if not jobs:
+            return
+        outcomes = []  # (future, 是否成功, 返回值或异常)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            for future, *_ in jobs:
+                future.set_exception(e)
+            self._count(len(jobs), len(jobs), 0)
+            return
+
+        for future, func, args, _ in jobs:
+            conn.execute("SAVEPOINT job")
+            try:
+                result = func(conn, *args)
+            except BaseException as e:
+                conn.execute("ROLLBACK TO job")
+                conn.execute("RELEASE job")
+                outcomes.append((future, False, e))
+            else:
+                conn.execute("RELEASE job")
+                outcomes.append((future, True, result))
+
+        try:
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            conn.rollback()
+            # 整组提交失败：原本成功的任务也一起失败
+            outcomes = [(future, False, e if ok else value) for future, ok, value in outcomes]
+
+        failed = 0
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                failed += 1
+                future.set_exception(value)
+        self._count(len(jobs), failed, 1, len(jobs))
+
+    def _count(self, jobs, failed, batches, batch_size=0):
+        with self._stats_lock:
+            self._stats["jobs"] += jobs
+            self._stats["failed"] += failed
+            self._stats["batches"] += batches
+            self._stats["max_batch"] = max(self._stats["max_batch"], batch_size)
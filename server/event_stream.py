@@ -0,0 +1,250 @@
+"""
+帖子变更推送（Server-Sent Events）
+
+每个工作进程一个 Broadcaster：后台线程每 POLL_INTERVAL 秒用 change_feed.read_changes 读一次变更日志，
+把每条变更格式化为一段 SSE 文本（只格式化一次），放进最近 BUFFER_SIZE 条的环形缓冲，再唤醒所有订阅者。
+订阅者（/api/stream 的响应生成器）阻塞在同一个 Condition 上，醒来后从缓冲里取比自己位置新的事件，
+按类型/分类筛选后发送；订阅者再多，数据库也只被轮询一次。
+
+事件：
+    id: <seq>            变更序号，断线重连时浏览器/客户端以 Last-Event-ID 带回
+    event: created | updated | status | deleted | reset
+    data: <JSON>         与 /api/changes 的一条 change 相同；reset 表示中间的变更已丢失，客户端需要重新加载
+空闲时每 HEARTBEAT_INTERVAL 秒发一行注释保持连接，也借此发现已断开的客户端。
+
+Last-Event-ID 比缓冲里最早的事件还旧时（断线较久），该订阅者自己从变更日志补读，再回到缓冲。
+"""
+import json
+import threading
+import traceback
+from collections import deque
+
+import change_feed
+
+# 轮询变更日志的间隔（秒）
+POLL_INTERVAL = 1.0
+
+# 空闲连接的心跳间隔（秒）
+HEARTBEAT_INTERVAL = 15.0
+
+# 内存里保留的最近事件数，Last-Event-ID 在这个范围内的重连不查数据库
+BUFFER_SIZE = 2000
+
+# 客户端断线后的重连等待（毫秒）
+RETRY_MS = 3000
+
+
+# reset 事件的类型占位，任何筛选条件都放行
+_RESET = object()
+
+
+class StreamFull(Exception):
+    """订阅者已达上限"""
+
+
+def format_event(seq, event, data) -> str:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {seq}\nevent: {event}\ndata: {payload}\n\n"
+
+
+def _event_tuple(change) -> tuple:
+    """(序号, 类型, 分类, SSE 文本)"""
+    source = change.get("item") or change
+    return change["seq"], source.get("type"), source.get("item_category"), \
+        format_event(change["seq"], change["op"], change)
+
+
+class Broadcaster:
+    """从变更日志读一次、推给所有订阅者"""
+
+    def __init__(self, connect, item_loader=None, max_subscribers=1000,
+                 poll_interval=POLL_INTERVAL, buffer_size=BUFFER_SIZE):
+        """
+        Args:
+            connect: 返回只读连接上下文管理器的函数（get_database_connection）
+            item_loader: 传给 change_feed.read_changes，给 created/updated 附带完整帖子
+            max_subscribers: 本进程同时保持的订阅上限
+        """
+        self.connect = connect
+        self.item_loader = item_loader
+        self.max_subscribers = max_subscribers
+        self.poll_interval = poll_interval
+        self._events = deque(maxlen=buffer_size)
+        self._floor = None    # 缓冲覆盖 (floor, position] 范围内的全部事件
+        self._position = None  # 已读到的变更序号
+        self._epoch = 0        # 每次 reset 加一，订阅者据此得知需要重新加载
+        self._cond = threading.Condition()
+        self._subscribers = 0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = {"polls": 0, "events": 0, "resets": 0, "rejected": 0, "catch_up": 0}
+
+    def start(self):
+        """第一次有订阅者时启动轮询线程"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._position is None:
+                with self.connect() as conn:
+                    self._position = self._floor = change_feed.latest_seq(conn)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="event-stream", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """本进程刚写过帖子：立即轮询，不等下一个间隔（其他进程的写入仍在 POLL_INTERVAL 内送达）"""
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.poll()
+            except Exception:
+                print("变更推送轮询失败:")
+                traceback.print_exc()
+
+    def poll(self):
+        """读取新变更并唤醒订阅者，一次读完积压的变更"""
+        while True:
+            with self.connect() as conn:
+                data = change_feed.read_changes(conn, self._position, change_feed.MAX_LIMIT, self.item_loader)
+            self._stats["polls"] += 1
+            with self._cond:
+                if data["reset"]:
+                    # 日志被清理或数据库被替换：清空缓冲，所有订阅者收到 reset
+                    self._events.clear()
+                    self._position = self._floor = data["latest"]
+                    self._epoch += 1
+                    self._stats["resets"] += 1
+                else:
+                    for change in data["changes"]:
+                        self._events.append(_event_tuple(change))
+                    self._stats["events"] += len(data["changes"])
+                    if len(self._events) == self._events.maxlen and self._events:
+                        self._floor = self._events[0][0] - 1
+                    self._position = data["next_since"]
+                if data["reset"] or data["changes"]:
+                    self._cond.notify_all()
+            if not data["has_more"]:
+                return
+
+    def subscribe(self, last_event_id=None, item_type="", category="") -> "Subscription":
+        """
+        新订阅，超过上限时抛出 StreamFull
+
+        Args:
+            last_event_id: 断线前收到的最后一个事件序号；为 None 时从当前位置开始
+            item_type, category: 只推送该类型/分类的帖子，空表示不限
+        """
+        self.start()
+        with self._cond:
+            if self._subscribers >= self.max_subscribers:
+                self._stats["rejected"] += 1
+                raise StreamFull()
+            self._subscribers += 1
+            position = self._position if last_event_id is None else last_event_id
+            ahead = position > self._position
+            subscription = Subscription(self, position, item_type, category)
+        if ahead:
+            # 多进程部署时客户端可能刚从轮询更快的进程收到事件；比数据库里的最新序号还大才是数据库被换过
+            try:
+                with self.connect() as conn:
+                    latest = change_feed.latest_seq(conn)
+            except BaseException:
+                subscription.close()
+                raise
+            if position > latest:
+                subscription.pending = subscription._reset(latest)
+        return subscription
+
+    def _unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {**self._stats, "subscribers": self._subscribers, "buffered": len(self._events),
+                    "position": self._position or 0}
+
+
+class Subscription:
+    """一个订阅者：记住自己发送到哪个序号"""
+
+    def __init__(self, broadcaster: Broadcaster, position: int, item_type="", category=""):
+        self.broadcaster = broadcaster
+        self.position = position
+        self.item_type = item_type
+        self.category = category
+        self.pending = []  # 下次优先返回的事件
+        self.epoch = broadcaster._epoch
+        self.closed = False
+
+    def next_chunk(self, timeout=HEARTBEAT_INTERVAL) -> str:
+        """
+        等待新事件，返回符合筛选条件的 SSE 文本；超时或没有符合条件的事件时返回空字符串
+
+        reset 事件不受筛选条件限制。
+        """
+        return "".join(text for _, post_type, category, text in self.next_events(timeout)
+                       if post_type is _RESET or ((not self.item_type or post_type == self.item_type)
+                                                  and (not self.category or category == self.category)))
+
+    def next_events(self, timeout=HEARTBEAT_INTERVAL) -> list:
+        """
+        等待并返回新事件 [(序号, 类型, 分类, SSE 文本)]；超时返回空列表
+
+        位置比缓冲还旧时从变更日志补读；补读发现中间的变更已被清理时返回一个 reset 事件。
+        """
+        if self.pending:
+            events, self.pending = self.pending, []
+            return events
+        b = self.broadcaster
+        with b._cond:
+            if self.position >= b._position and self.epoch == b._epoch and not b.stopped:
+                b._cond.wait(timeout)
+            if self.epoch != b._epoch:
+                self.epoch = b._epoch
+                return self._reset(b._position)
+            if self.position >= b._position:
+                return []
+            if self.position >= b._floor:
+                events = [event for event in b._events if event[0] > self.position]
+                self.position = b._position
+                return events
+        return self._catch_up()
+
+    def _catch_up(self) -> list:
+        b = self.broadcaster
+        b._stats["catch_up"] += 1
+        with b.connect() as conn:
+            data = change_feed.read_changes(conn, self.position, change_feed.MAX_LIMIT, b.item_loader)
+        if data["reset"]:
+            return self._reset(data["latest"])
+        self.position = data["next_since"]
+        return [_event_tuple(change) for change in data["changes"]]
+
+    def _reset(self, latest) -> list:
+        self.position = latest
+        return [(latest, _RESET, None, format_event(latest, "reset", {"latest": latest}))]
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broadcaster._unsubscribe()
@@ -1,25 +1,422 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, send_file
 import sqlite3
-import hashlib
-import secrets
-from werkzeug.utils import secure_filename
-import time as pytime
 import os
+import base64
+import json
+import hmac
+import time as pytime
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from db_pool import ConnectionPool
+from db_writer import WriteQueue
+from query_cache import QueryCache
+from maintenance import PeriodicTask, optimize_database
+from db_schema import migrate
+from image_store import ImageStore
+from renditions import create_renditions, discard_renditions, publish_renditions
+from static_files import UploadServer
+from slow_query_log import SlowQueryLog, FLUSH_INTERVAL as SLOW_QUERY_FLUSH_INTERVAL
+from passwords import PasswordHasher, KdfPool, KdfBusy
+import fulltext
+import metrics
+from profiling import RequestProfiler, ProfilingMiddleware
+from matching import find_matches, store_many
+import change_feed
+from event_stream import Broadcaster, StreamFull, RETRY_MS as STREAM_RETRY_MS
+from bulk_io import FORMATS as EXPORT_FORMATS, FORMATTERS as EXPORT_FORMATTERS, export_query, iter_batches
+from settings import load_config, ensure_secret_key
 
 app = Flask(__name__)
-app.secret_key = 'your_secret_key'  # 用于 session 加密，实际项目请用更复杂的密钥
 
-DB_PATH = r"D:\SqliteDatabase\user.db"  # 改成你的真实路径
+# 以下资源由 create_app() 按配置创建；多进程部署时每个工作进程在 fork 之后各自创建一份
+config = None
+pool = None          # 只读连接池：复用连接与预编译语句，避免每个请求重新打开数据库
+write_queue = None   # 所有写操作交给单独的写线程排队执行，组提交，请求线程之间不再争抢写锁
+result_cache = None  # 列表/详情查询结果缓存，写操作后整体失效
+kdf_pool = None      # 密码哈希（PBKDF2/scrypt，参数见 passwords.py）在有界线程池中计算，登录高峰不会占满 CPU
+image_store = None   # 上传图片按内容哈希分片存储，同一张图片只存一份
+upload_server = None  # 图片下载：描述符缓存、Range、条件请求、内容寻址文件长期缓存
+matcher = None        # 失物/招领匹配在单独的线程里用只读连接计算，结果交给写线程写入
+slow_query_log = None  # 超过 SLOW_QUERY_MS 的语句按指纹聚合，连同执行计划和发起接口写入 SLOW_QUERY_LOG
+broadcaster = None    # /api/stream：本进程只轮询一次变更日志，推给所有订阅者
+
+# bm25 列权重：物品名称 > 地点 > 描述
+BM25_WEIGHTS = "10.0, 2.0, 5.0"
+
+# count=estimate 时最多统计到的条数，超过则只返回下限
+COUNT_ESTIMATE_CAP = 1000
+
+# 列表接口（get_lost_items、my_items）单页条数的上限；客户端整体下载镜像时按这个大小翻页
+MAX_PAGE_SIZE = 1000
+
+password_hasher = PasswordHasher()
+KDF_TIMEOUT = 10
+
+# 定期 PRAGMA optimize（按需 ANALYZE），让查询规划器的统计信息跟上数据变化
+OPTIMIZE_INTERVAL = 6 * 3600
+# 请求计数、耗时直方图与阶段耗时，/api/metrics 以 Prometheus 文本格式输出
+app_metrics = metrics.Metrics()
+app_metrics.add_collector('db_pool', lambda: pool.stats())
+app_metrics.add_collector('query_cache', lambda: result_cache.stats())
+app_metrics.add_collector('db_writer', lambda: write_queue.stats())
+app_metrics.add_collector('fd_cache', lambda: upload_server.fd_cache.stats() if upload_server.fd_cache else {})
+app_metrics.add_collector('images', lambda: image_gc_task.last_result)
+app_metrics.add_collector('event_stream', lambda: broadcaster.stats())
+# 按需剖析（见 profiling.py），装在指标中间件里面，剖析的请求照常计入指标
+request_profiler = RequestProfiler(endpoint_of=metrics.current_endpoint)
+app.wsgi_app = ProfilingMiddleware(app.wsgi_app, request_profiler)
+metrics.install(app, app_metrics)
+# 多进程部署时定期把本进程的指标写到 METRICS_DIR，供其他进程的 /api/metrics 合并
+metrics_task = PeriodicTask('metrics-snapshot', metrics.SNAPSHOT_INTERVAL, lambda: app_metrics.dump(),
+                            run_immediately=True)
+
+slow_query_task = PeriodicTask('slow-query-flush', SLOW_QUERY_FLUSH_INTERVAL,
+                               lambda: slow_query_log.flush() if slow_query_log else 0)
+
+optimize_task = PeriodicTask('db-optimize', OPTIMIZE_INTERVAL,
+                             lambda: write_queue.execute(optimize_database, exclusive=True))
+
+# 定期清理不再被任何帖子引用的图片，并统计每个用户的存储占用
+IMAGE_GC_INTERVAL = 3600
+image_gc_task = PeriodicTask('image-gc', IMAGE_GC_INTERVAL,
+                             lambda: write_queue.execute(image_store.sweep, exclusive=True), run_immediately=True)
+
+# 定期删除超过 CHANGE_RETENTION_DAYS 天的帖子变更记录
+CHANGE_PRUNE_INTERVAL = 3600
+change_prune_task = PeriodicTask('change-prune', CHANGE_PRUNE_INTERVAL,
+                                 lambda: write_queue.execute(change_feed.prune, config['CHANGE_RETENTION_DAYS']))
+
+
+def create_app(overrides=None):
+    """
+    应用工厂：按配置（见 settings.py）创建连接池、写队列、缓存和图片存储，返回 app
+
+    只创建对象，不打开连接也不启动线程（都在第一次使用时才发生），因此可以在 fork 之前
+    或之后调用；serve.py 在每个工作进程里重新调用一次，各进程拥有自己的连接和线程。
+    """
+    global config, pool, write_queue, result_cache, kdf_pool, image_store, upload_server, slow_query_log, matcher
+    global broadcaster
+    config = load_config(overrides)
+    app.secret_key = ensure_secret_key(config)
+    # 部署在 nginx/Apache 之后时设置 USE_X_SENDFILE=1，由前端服务器零拷贝发送文件
+    app.config['USE_X_SENDFILE'] = config['USE_X_SENDFILE']
+
+    pool = ConnectionPool(config['DB_PATH'], trace_path=config['QUERY_LOG_PATH'], query_only=True)
+    pool.add_connect_hook(fulltext.register_functions)  # 全文索引触发器依赖分词函数
+    pool.add_statement_hook(metrics.sql_statement_hook)
+    slow_query_log = None
+    if config['SLOW_QUERY_MS'] > 0:
+        slow_query_log = SlowQueryLog(config['SLOW_QUERY_LOG'], config['DB_PATH'],
+                                      threshold_ms=config['SLOW_QUERY_MS'], endpoint_of=metrics.current_endpoint)
+        pool.add_statement_hook(slow_query_log.record)
+    write_queue = WriteQueue(lambda: pool.connect(query_only=False))
+    write_queue.add_wait_hook(metrics.write_wait_hook)
+    # 写线程代请求执行的语句也记在发起请求的路由名下
+    write_queue.set_job_context(metrics.current_endpoint, metrics.endpoint_context)
+    result_cache = QueryCache(max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=60)
+    kdf_pool = KdfPool(password_hasher, max_workers=config['KDF_WORKERS'],
+                       max_pending=config['KDF_MAX_PENDING'])
+    image_store = ImageStore(config['UPLOAD_DIR'])
+    matcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='matcher')
+    upload_server = UploadServer(config['UPLOAD_DIR'])
+    # 两个函数定义在模块后部，用 lambda 推迟到调用时查找
+    broadcaster = Broadcaster(lambda: get_database_connection(),
+                              item_loader=lambda conn, ids: load_list_items(conn, ids),
+                              max_subscribers=config['STREAM_MAX_SUBSCRIBERS'])
+    app_metrics.snapshot_dir = config['METRICS_DIR']
+    request_profiler.configure(config['PROFILE_DIR'], token=config['PROFILE_TOKEN'],
+                               sample_rate=config['PROFILE_SAMPLE_RATE'], keep=config['PROFILE_KEEP'])
+    return app
+
+
+def migrate_database() -> list:
+    """应用未执行的数据库结构修订，返回本次应用的修订说明"""
+    return write_queue.execute(migrate, exclusive=True)
+
+
+def start_background_tasks(maintenance=True):
+    """
+    启动后台任务
+
+    Args:
+        maintenance: 是否启动定期优化和图片清理（多进程部署时只在一个工作进程中启动）
+    """
+    if app_metrics.snapshot_dir:
+        metrics_task.start()
+    if slow_query_log is not None:
+        slow_query_task.start()
+    if maintenance:
+        optimize_task.start()
+        image_gc_task.start()
+        change_prune_task.start()
+
+
+def close_streams(timeout=10):
+    """结束所有 /api/stream 连接（停止接收新连接之后、等待进行中的请求之前调用）"""
+    broadcaster.stop(timeout)
+
+
+def shutdown_app(timeout=10):
+    """停止后台任务，写完已排队的写操作，关闭连接和文件描述符"""
+    close_streams(timeout)
+    optimize_task.stop(timeout)
+    image_gc_task.stop(timeout)
+    change_prune_task.stop(timeout)
+    metrics_task.stop(timeout)
+    slow_query_task.stop(timeout)
+    matcher.shutdown(wait=True)
+    write_queue.stop(timeout)
+    kdf_pool.shutdown()
+    if upload_server.fd_cache is not None:
+        upload_server.fd_cache.close_all()
+    pool.close_all()
+    if slow_query_log is not None:
+        slow_query_log.close()
+    app_metrics.dump()
+
+
+create_app()
+
+# 帖子类型取值
+POST_TYPES = ('失物信息', '招领信息')
+
+# 批量发布单次最多条数
+BATCH_MAX_ITEMS = 500
 
+# 发帖/批量发帖的字段，顺序与 INSERT 语句一致
+POST_FIELDS = ('type', 'item_name', 'item_category', 'description', 'time', 'location')
 
-def hash_password(pwd: str, salt: str) -> str:
-    """将密码和盐组合后哈希"""
-    return hashlib.sha256((pwd + salt).encode()).hexdigest()
+# 上传图片写入 posts 的列，顺序与 commit_upload() 返回值一致
+UPLOAD_COLUMNS = (
+    'image_path', 'image_width', 'image_height',
+    'thumb_path', 'thumb_width', 'thumb_height',
+    'preview_path', 'preview_width', 'preview_height',
+)
+
+# 查询时附带的图片列，顺序与 image_fields() 一致
+IMAGE_COLUMNS = ', '.join(f'p.{column}' for column in UPLOAD_COLUMNS[1:])
+
+INSERT_POST_SQL = (
+    "INSERT INTO posts (user_id, type, item_name, item_category, description, time, location, status, created_at, "
+    f"{', '.join(UPLOAD_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, 'active', datetime('now'), "
+    f"{', '.join('?' * len(UPLOAD_COLUMNS))})"
+)
+
+
+def posts_changed():
+    """帖子写入提交之后调用：列表/详情缓存失效，推送线程立即读取新的变更"""
+    result_cache.invalidate()
+    broadcaster.wake()
 
 
 def get_database_connection():
-    """获取数据库连接"""
-    return sqlite3.connect(DB_PATH)
+    """从连接池借出只读数据库连接，需配合 with 使用，退出时自动归还；写操作用 write_queue"""
+    return pool.connection()
+
+
+def encode_cursor(created_at: str, item_id: int) -> str:
+    """把 (created_at, id) 编码成不透明的分页游标"""
+    raw = json.dumps([created_at, item_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, item_id = json.loads(raw)
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if not isinstance(created_at, str) or not isinstance(item_id, int):
+        raise ValueError("无效的分页游标")
+    return created_at, item_id
+
+
+def get_posts_etag(conn) -> str:
+    """由触发器维护的 posts 数据版本号生成 ETag，无需对响应体做哈希"""
+    row = conn.execute("SELECT version FROM data_versions WHERE name = 'posts'").fetchone()
+    return f"posts-v{row[0] if row else 0}"
+
+
+def lookup_cached_response(cache_key: tuple, etag_scope: str = ""):
+    """
+    条件请求 + 查询结果缓存
+
+    先读数据版本生成 ETag，客户端的 If-None-Match 与之相同时直接返回 304；
+    否则查缓存，只有以同一 ETag 写入的条目才算命中（其他进程写过数据库时旧条目自然失效）。
+
+    Args:
+        cache_key: 缓存键
+        etag_scope: 响应随登录用户不同时附加到 ETag 上的区分标记
+
+    Returns:
+        tuple: (可直接返回的响应 或 None, 当前缓存代数, ETag)，
+               未命中时查询结果应以该代数和 ETag 写回缓存，响应也带上该 ETag
+    """
+    with get_database_connection() as conn:
+        etag = get_posts_etag(conn) + etag_scope
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response, None, etag
+    generation = result_cache.generation
+    body = result_cache.get(cache_key, etag)
+    if body is None:
+        return None, generation, etag
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response, generation, etag
+
+
+def count_posts_by_filters(cursor, item_type: str, category: str, status: str = "") -> int:
+    """从触发器维护的 post_counts 计数表读取筛选条件下的帖子总数"""
+    conditions = ["1=1"]
+    params = []
+    if item_type:
+        conditions.append("type = ?")
+        params.append(item_type)
+    if category:
+        conditions.append("item_category = ?")
+        params.append(category)
+    if status:
+        conditions.append("status = ?")
+        params.append(status)
+    cursor.execute(
+        f"SELECT COALESCE(SUM(count), 0) FROM post_counts WHERE {' AND '.join(conditions)}",
+        params
+    )
+    return cursor.fetchone()[0]
+
+
+def stage_upload(image):
+    """
+    在事务外暂存上传的图片并生成缩略图/预览图
+
+    Returns:
+        tuple: (原图 StagedImage, 缩略图信息) 或 None（没有上传图片）
+
+    写临时文件或生成缩略图出错时已暂存的文件都会删除，异常原样抛出。
+    """
+    if not image:
+        return None
+    with metrics.timer('file'):
+        staged = image_store.stage(image.stream, image.filename)
+        try:
+            renditions = create_renditions(image_store, staged)
+        except BaseException:
+            image_store.discard(staged)
+            raise
+    app_metrics.inc('upload_files_total')
+    app_metrics.inc('upload_bytes_total', staged.size)
+    return staged, renditions
+
+
+def commit_upload(conn, upload) -> tuple:
+    """在写事务中登记暂存的图片，返回按 UPLOAD_COLUMNS 顺序的列值"""
+    if upload is None:
+        return (None,) * len(UPLOAD_COLUMNS)
+    staged, renditions = upload
+    values = [image_store.commit(conn, staged), renditions.get('width'), renditions.get('height')]
+    for name in ('thumb', 'preview'):
+        if name in renditions:
+            rendition, width, height = renditions[name]
+            values.extend([image_store.commit(conn, rendition), width, height])
+        else:
+            values.extend([None, None, None])
+    return tuple(values)
+
+
+def schedule_matching(post_ids):
+    """在后台重新计算这些帖子的失物/招领匹配结果（见 matching.py），不等待完成"""
+    matcher.submit(run_matching, list(post_ids), metrics.current_endpoint())
+
+
+def run_matching(post_ids, endpoint):
+    # 慢查询等记录归到发起匹配的路由名下
+    try:
+        with metrics.endpoint_context(endpoint):
+            with get_database_connection() as conn:
+                results = [(post_id, find_matches(conn, post_id)) for post_id in post_ids]
+            write_queue.execute(store_many, results)
+    except Exception:
+        traceback.print_exc()  # 匹配失败不影响发帖，下次编辑时重新计算
+
+
+def publish_upload(upload):
+    """写库成功后把暂存的图片移到正式位置"""
+    if upload is not None:
+        staged, renditions = upload
+        try:
+            image_store.publish(staged)
+            publish_renditions(image_store, renditions)
+        except OSError:
+            traceback.print_exc()  # 帖子已提交，不因文件移动失败而报发布失败
+
+
+def discard_upload(upload):
+    """丢弃暂存的图片（写库失败时）"""
+    if upload is not None:
+        staged, renditions = upload
+        image_store.discard(staged)
+        discard_renditions(image_store, renditions)
+
+
+def image_url(path):
+    """数据库中的图片路径 -> 相对服务器根的 URL"""
+    return f"/{path}" if path else None
+
+
+def image_fields(image_path, columns) -> dict:
+    """原图/缩略图/预览图的 URL 和尺寸，columns 为 IMAGE_COLUMNS 查出的各列"""
+    image_width, image_height, thumb_path, thumb_width, thumb_height, preview_path, preview_width, preview_height = columns
+    return {
+        'image_url': image_url(image_path),
+        'image_width': image_width,
+        'image_height': image_height,
+        'thumbnail_url': image_url(thumb_path),
+        'thumbnail_width': thumb_width,
+        'thumbnail_height': thumb_height,
+        'preview_url': image_url(preview_path),
+        'preview_width': preview_width,
+        'preview_height': preview_height,
+    }
+
+
+# 列表接口（get_lost_items、/api/changes）每个帖子返回的字段
+LIST_ITEM_KEYS = ('id', 'item_name', 'item_category', 'type', 'description', 'image_path', 'time', 'location',
+                  'status', 'created_at', 'publisher')
+
+
+def load_list_items(conn, ids) -> dict:
+    """按 id 读取帖子，字段与列表接口相同，返回 {id: 帖子}"""
+    rows = conn.execute(f"""
+        SELECT p.id, p.item_name, p.item_category, p.type, p.description, p.image_path, p.time, p.location,
+               p.status, p.created_at, u.username AS publisher, {IMAGE_COLUMNS}
+        FROM posts p
+        LEFT JOIN users u ON p.user_id = u.id
+        WHERE p.id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(list(ids)),)).fetchall()
+    items = {}
+    for row in rows:
+        item = dict(zip(LIST_ITEM_KEYS, row))
+        item.update(image_fields(row[5], row[11:]))
+        items[row[0]] = item
+    return items
+
+
+def validate_post_item(item) -> tuple[bool, str]:
+    """校验批量发布中的一条物品信息"""
+    if not isinstance(item, dict):
+        return False, "每条物品信息必须是对象"
+    for field in POST_FIELDS:
+        value = item.get(field)
+        if value is not None and not isinstance(value, str):
+            return False, f"{field} 必须是字符串"
+    if not (item.get('item_name') or '').strip() or not (item.get('location') or '').strip():
+        return False, "缺少必填项"
+    if item.get('type') not in POST_TYPES:
+        return False, f"type 只能是 {' 或 '.join(POST_TYPES)}"
+    return True, ""
 
 
 def validate_request_data(data: dict) -> tuple[bool, str, str]:
@@ -36,91 +433,61 @@ def validate_request_data(data: dict) -> tuple[bool, str, str]:
     return True, username, password
 
 
-def get_user_from_database(username: str) -> tuple[bool, str, tuple]:
-    """从数据库获取用户信息"""
-    try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT salt, password FROM users WHERE username = ?", (username,))
-        result = cursor.fetchone()
-        conn.close()
-        return True, "", result
-    except Exception as e:
-        return False, f"数据库错误: {e}", None
+def authenticate_user(username: str, password: str) -> tuple[bool, str, int]:
+    """
+    验证用户凭据
 
+    一次查询取出 id、盐和哈希；密码正确且存储格式或参数过期时顺便重新哈希。
 
-def verify_user_credentials(username: str, password: str) -> tuple[bool, str]:
-    """验证用户凭据"""
-    # 1. 从数据库获取用户信息
-    success, error_msg, result = get_user_from_database(username)
-    if not success:
-        return False, error_msg
-    
-    # 2. 检查用户是否存在
+    Returns:
+        tuple: (是否成功, 提示信息, 用户ID)
+    """
+    with get_database_connection() as conn:
+        result = conn.execute(
+            "SELECT id, salt, password FROM users WHERE username = ?", (username,)
+        ).fetchone()
     if not result:
-        return False, "用户不存在"
-    
-    # 3. 验证密码
-    salt, correct_hash = result
-    if hash_password(password, salt) == correct_hash:
-        return True, "登录成功"
-    else:
-        return False, "密码错误"
+        return False, "用户不存在", None
 
+    user_id, salt, stored_hash = result
+    with metrics.timer('kdf'):
+        verified, rehashed = kdf_pool.verify(password, salt, stored_hash, timeout=KDF_TIMEOUT)
+    if not verified:
+        return False, "密码错误", None
 
-def check_user_exists(username: str) -> tuple[bool, str]:
-    """检查用户是否已存在"""
-    try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return True, "用户已存在"
-        else:
-            return False, ""
-    except Exception as e:
-        return False, f"数据库错误: {e}"
-
-
-def create_user(username: str, password: str) -> tuple[bool, str]:
-    """创建新用户"""
-    try:
-        # 生成盐值
-        salt = secrets.token_hex(16)
-        # 哈希密码
-        password_hash = hash_password(password, salt)
-        
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO users (username, password, salt) VALUES (?, ?, ?)",
-            (username, password_hash, salt)
+    if rehashed:
+        new_hash, new_salt = rehashed
+        # 只在密码未被并发修改时更新；不影响本次登录结果，不必等待写入完成
+        write_queue.submit(
+            lambda conn: conn.execute(
+                "UPDATE users SET password = ?, salt = ? WHERE id = ? AND password = ?",
+                (new_hash, new_salt, user_id, stored_hash)
+            )
         )
-        conn.commit()
-        conn.close()
-        
-        return True, "用户创建成功"
-    except Exception as e:
-        return False, f"创建用户失败: {e}"
+    return True, "登录成功", user_id
 
 
-def get_user_id_by_username(username: str) -> int:
-    """通过用户名查找用户ID"""
+def create_user(username: str, password: str) -> tuple[bool, str, int]:
+    """
+    创建新用户，用户名重复由 UNIQUE 约束判断，不再先查询再插入
+
+    Returns:
+        tuple: (是否成功, 提示信息, HTTP 状态码)
+    """
+    with metrics.timer('kdf'):
+        password_hash, salt = kdf_pool.hash(password, timeout=KDF_TIMEOUT)
     try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-        result = cursor.fetchone()
-        conn.close()
-        if result:
-            return result[0]
-        else:
-            return None
+        write_queue.execute(
+            lambda conn: conn.execute(
+                "INSERT INTO users (username, password, salt) VALUES (?, ?, ?)",
+                (username, password_hash, salt)
+            )
+        )
+    except sqlite3.IntegrityError:
+        return False, "用户已存在", 409
     except Exception as e:
-        return None
+        return False, f"创建用户失败: {e}", 500
+    return True, "用户创建成功", 200
 
 
 @app.route('/api/login', methods=['POST'])
@@ -136,12 +503,16 @@ def login():
         return jsonify({"success": False, "message": username}), 400
     
     # 2. 验证用户凭据
-    success, message = verify_user_credentials(username, password)
+    try:
+        success, message, user_id = authenticate_user(username, password)
+    except KdfBusy:
+        return jsonify({"success": False, "message": "服务器繁忙，请稍后重试"}), 503
+    except Exception as e:
+        return jsonify({"success": False, "message": f"数据库错误: {e}"}), 500
     
     # 3. 返回结果
     if success:
         # 登录成功，写入 session
-        user_id = get_user_id_by_username(username)
         session['user_id'] = user_id
         session['username'] = username
         return jsonify({"success": True, "message": message})
@@ -169,19 +540,17 @@ def register():
     if len(password) < 6:
         return jsonify({"success": False, "message": "密码长度至少6个字符"}), 400
     
-    # 4. 检查用户是否已存在
-    exists, error_msg = check_user_exists(username)
-    if exists:
-        return jsonify({"success": False, "message": error_msg}), 409
-    
-    # 5. 创建新用户
-    success, message = create_user(username, password)
+    # 4. 创建新用户（用户名已存在时返回 409）
+    try:
+        success, message, status_code = create_user(username, password)
+    except KdfBusy:
+        return jsonify({"success": False, "message": "服务器繁忙，请稍后重试"}), 503
     
-    # 6. 返回结果
+    # 5. 返回结果
     if success:
         return jsonify({"success": True, "message": message})
     else:
-        return jsonify({"success": False, "message": message}), 500
+        return jsonify({"success": False, "message": message}), status_code
 
 
 @app.route('/api/post', methods=['POST'])
@@ -196,44 +565,115 @@ def post_info():
     time_ = request.form.get('time')
     location = request.form.get('location')
     image = request.files.get('image')
-    image_path = None
 
     if not item_name or not location:
         return jsonify({"success": False, "message": "缺少必填项"})
 
-    if image:
-        filename = secure_filename(image.filename)
-        unique_filename = f"{int(pytime.time())}_{filename}"
-        save_dir = os.path.join(os.path.dirname(__file__), "../data/uploads")
-        os.makedirs(save_dir, exist_ok=True)
-        save_path = os.path.join(save_dir, unique_filename)
-        image.save(save_path)
-        image_path = f"data/uploads/{unique_filename}"
+    upload = None
 
-    try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO posts (user_id, type, item_name, item_category, description, image_path, time, location, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))",
+    def insert_post(conn):
+        return conn.execute(
+            INSERT_POST_SQL,
             (
                 user_id,  # 从 session 获取 user_id
                 item_type,
                 item_name,
                 item_category,
                 description,
-                image_path,
                 time_,
                 location,
-                'active'
+                *commit_upload(conn, upload)
             )
-        )
-        conn.commit()
-        conn.close()
-        return jsonify({"success": True, "message": "发布成功"})
+        ).lastrowid
+
+    try:
+        # 先在事务外写入临时文件、计算哈希并生成缩略图，事务内只登记，提交后再移动文件
+        upload = stage_upload(image)
+        post_id = write_queue.execute(insert_post)
+        publish_upload(upload)
+        posts_changed()
+        schedule_matching([post_id])
+        return jsonify({"success": True, "message": "发布成功", "data": {"id": post_id}})
     except Exception as e:
+        discard_upload(upload)
         return jsonify({"success": False, "message": str(e)})
 
 
+@app.route('/api/post_batch', methods=['POST'])
+def post_batch():
+    """
+    批量发布接口
+
+    请求体二选一：
+      - JSON：{"items": [物品, ...]} 或直接是物品数组
+      - multipart：表单字段 items 为物品数组的 JSON 字符串，第 i 条物品的图片放在文件字段 image_<i>
+    物品字段与 /api/post 相同。逐条校验，合法的物品在一个事务里用 executemany 一次插入；
+    返回每条物品的结果（成功给出 id，失败给出原因），results 与请求中的物品一一对应。
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"success": False, "message": "未登录，无法发帖"})
+
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        items = payload.get('items') if isinstance(payload, dict) else payload
+    else:
+        try:
+            items = json.loads(request.form.get('items', ''))
+        except ValueError:
+            items = None
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "items 必须是非空数组"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"success": False, "message": f"单次最多发布 {BATCH_MAX_ITEMS} 条"}), 400
+
+    results = []
+    pending = []  # 校验通过的 (物品下标, 物品, 暂存图片)
+    try:
+        for index, item in enumerate(items):
+            ok, message = validate_post_item(item)
+            if not ok:
+                results.append({"index": index, "success": False, "message": message})
+                continue
+            upload = stage_upload(request.files.get(f'image_{index}'))
+            results.append({"index": index, "success": True, "id": None})
+            pending.append((index, item, upload))
+
+        def insert_posts(conn):
+            rows = [
+                (
+                    user_id, item['type'], item['item_name'].strip(), item.get('item_category'),
+                    item.get('description'), item.get('time'), item['location'].strip(),
+                    *commit_upload(conn, upload)
+                )
+                for _, item, upload in pending
+            ]
+            conn.executemany(INSERT_POST_SQL, rows)
+            return conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+        if pending:
+            # 写线程独占写锁，期间没有其他写入者，AUTOINCREMENT 分配的 id 是连续的
+            last_id = write_queue.execute(insert_posts)
+            for _, _, upload in pending:
+                publish_upload(upload)
+            posts_changed()
+            first_id = last_id - len(pending) + 1
+            for offset, (index, _, _) in enumerate(pending):
+                results[index]["id"] = first_id + offset
+            schedule_matching(range(first_id, last_id + 1))
+    except Exception as e:
+        for _, _, upload in pending:
+            discard_upload(upload)
+        return jsonify({"success": False, "message": str(e)}), 500
+
+    failed = len(items) - len(pending)
+    return jsonify({
+        "success": bool(pending),
+        "message": f"成功发布 {len(pending)} 条，失败 {failed} 条",
+        "data": {"inserted": len(pending), "failed": failed, "results": results}
+    })
+
+
 @app.route('/api/get_lost_items', methods=['GET'])
 def get_lost_items():
     """获取失物招领信息列表，支持关键字搜索"""
@@ -242,32 +682,76 @@ def get_lost_items():
         keyword = request.args.get('keyword', '').strip()
         item_type = request.args.get('type', '')  # 可选：按类型筛选
         category = request.args.get('category', '')  # 可选：按分类筛选
+        status = request.args.get('status', '')  # 可选：按状态筛选
         limit = request.args.get('limit', 50, type=int)  # 限制返回数量
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({"success": False, "message": f"limit 必须在 1 到 {MAX_PAGE_SIZE} 之间"}), 400
         offset = request.args.get('offset', 0, type=int)  # 分页偏移
+        sort = request.args.get('sort', 'time')  # 排序：time 按发布时间，relevance 按相关度
+        page_cursor = request.args.get('cursor', '')  # 可选：上一页返回的 next_cursor
+        count_mode = request.args.get('count', 'exact')  # 总数：exact 精确，estimate 封顶估算，none 不统计
+        if count_mode not in ('exact', 'estimate', 'none'):
+            return jsonify({"success": False, "message": "count 参数只能是 exact、estimate 或 none"}), 400
 
-        conn = get_database_connection()
-        cursor = conn.cursor()
+        cache_key = QueryCache.make_key('list', {
+            'keyword': keyword, 'type': item_type, 'category': category, 'status': status,
+            'limit': limit, 'offset': offset, 'sort': sort, 'cursor': page_cursor, 'count': count_mode
+        })
+        cached, generation, etag = lookup_cached_response(cache_key)
+        if cached is not None:
+            return cached
 
         # 构建查询条件
         where_conditions = ["1=1"]  # 始终为真的条件，便于动态拼接
         params = []
+        from_clause = "posts p"
+        order_by = "p.created_at DESC, p.id DESC"
 
-        if keyword:
-            # 使用LIKE进行模糊搜索，支持物品名称、描述、地点
+        match_query = fulltext.build_match_query(keyword) if keyword else None
+        if match_query:
+            # 使用全文索引搜索物品名称、描述、地点
+            from_clause = "posts_fts JOIN posts p ON p.id = posts_fts.rowid"
+            where_conditions.append("posts_fts MATCH ?")
+            params.append(match_query)
+            if sort == 'relevance':
+                order_by = f"bm25(posts_fts, {BM25_WEIGHTS}), p.created_at DESC, p.id DESC"
+        elif keyword:
+            # 关键字无法走索引时（如单个汉字）退回LIKE模糊搜索
             where_conditions.append("""
-                (item_name LIKE ? OR description LIKE ? OR location LIKE ?)
+                (p.item_name LIKE ? OR p.description LIKE ? OR p.location LIKE ?)
             """)
             keyword_param = f"%{keyword}%"
             params.extend([keyword_param, keyword_param, keyword_param])
 
         if item_type:
-            where_conditions.append("type = ?")
+            where_conditions.append("p.type = ?")
             params.append(item_type)
 
         if category:
-            where_conditions.append("item_category = ?")
+            where_conditions.append("p.item_category = ?")
             params.append(category)
 
+        if status == 'active':
+            # 写成字面量，查询规划器才能使用 status='active' 的部分索引
+            where_conditions.append("p.status = 'active'")
+        elif status:
+            where_conditions.append("p.status = ?")
+            params.append(status)
+
+        # 游标分页：按时间排序时从上一页最后一行之后继续。
+        # id 是 rowid，idx_posts_created_at 的索引项本身就是 (created_at, id)，每页都是一次索引定位
+        use_keyset = not (match_query and sort == 'relevance')
+        page_conditions = list(where_conditions)
+        page_params = list(params)
+        if page_cursor and use_keyset:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(page_cursor)
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+            page_conditions.append("(p.created_at, p.id) < (?, ?)")
+            page_params.extend([cursor_created_at, cursor_id])
+            offset = 0
+
         # 构建完整的SQL查询
         sql = f"""
             SELECT 
@@ -281,19 +765,56 @@ def get_lost_items():
                 p.location,
                 p.status,
                 p.created_at,
-                u.username as publisher
-            FROM posts p
+                u.username as publisher,
+                {IMAGE_COLUMNS}
+            FROM {from_clause}
             LEFT JOIN users u ON p.user_id = u.id
-            WHERE {' AND '.join(where_conditions)}
-            ORDER BY p.created_at DESC
+            WHERE {' AND '.join(page_conditions)}
+            ORDER BY {order_by}
             LIMIT ? OFFSET ?
         """
 
-        params.extend([limit, offset])
+        page_params.extend([limit + 1, offset])  # 多取一行用于判断是否还有下一页
+
+        with get_database_connection() as conn:
+            cursor = conn.cursor()
 
-        # 执行查询
-        cursor.execute(sql, params)
-        results = cursor.fetchall()
+            # 执行查询
+            cursor.execute(sql, page_params)
+            results = cursor.fetchall()
+            has_more = len(results) > limit
+            results = results[:limit]
+
+            # 获取总数（只受筛选条件影响，与分页无关）
+            total_count = None
+            total_capped = False
+            if count_mode == 'none':
+                pass
+            elif not keyword:
+                # 只有类型/分类筛选时直接读计数表，O(1)且精确
+                total_count = count_posts_by_filters(cursor, item_type, category, status)
+            elif count_mode == 'estimate':
+                # 关键字搜索最多数到 COUNT_ESTIMATE_CAP 条，超过只返回下限
+                count_sql = f"""
+                    SELECT COUNT(*) FROM (
+                        SELECT 1 FROM {from_clause}
+                        WHERE {' AND '.join(where_conditions)}
+                        LIMIT ?
+                    )
+                """
+                cursor.execute(count_sql, params + [COUNT_ESTIMATE_CAP + 1])
+                total_count = cursor.fetchone()[0]
+                if total_count > COUNT_ESTIMATE_CAP:
+                    total_count = COUNT_ESTIMATE_CAP
+                    total_capped = True
+            else:
+                count_sql = f"""
+                    SELECT COUNT(*) 
+                    FROM {from_clause}
+                    WHERE {' AND '.join(where_conditions)}
+                """
+                cursor.execute(count_sql, params)
+                total_count = cursor.fetchone()[0]
 
         # 转换为字典列表
         items = []
@@ -311,28 +832,30 @@ def get_lost_items():
                 'created_at': row[9],
                 'publisher': row[10]
             }
+            item.update(image_fields(row[5], row[11:]))
             items.append(item)
 
-        # 获取总数（用于分页）
-        count_sql = f"""
-            SELECT COUNT(*) 
-            FROM posts p
-            WHERE {' AND '.join(where_conditions)}
-        """
-        cursor.execute(count_sql, params[:-2])  # 去掉LIMIT和OFFSET参数
-        total_count = cursor.fetchone()[0]
-
-        conn.close()
+        # 还有下一页时返回游标
+        next_cursor = None
+        if use_keyset and items and has_more:
+            next_cursor = encode_cursor(items[-1]['created_at'], items[-1]['id'])
 
-        return jsonify({
+        response = jsonify({
             "success": True,
             "data": {
                 "items": items,
                 "total": total_count,
+                "total_capped": total_capped,  # True 表示 total 只是下限
+                "has_more": has_more,
                 "limit": limit,
-                "offset": offset
+                "offset": offset,
+                "sort": sort if match_query else "time",
+                "next_cursor": next_cursor
             }
         })
+        result_cache.put(cache_key, response.get_data(), generation, etag)
+        response.set_etag(etag)
+        return response
 
     except Exception as e:
         return jsonify({"success": False, "message": f"查询失败: {str(e)}"}), 500
@@ -342,10 +865,12 @@ def get_lost_items():
 def get_item_detail(item_id):
     """获取单个失物招领信息的详细信息"""
     try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
+        cache_key = QueryCache.make_key('detail', {'id': item_id})
+        cached, generation, etag = lookup_cached_response(cache_key)
+        if cached is not None:
+            return cached
 
-        sql = """
+        sql = f"""
             SELECT 
                 p.id,
                 p.item_name,
@@ -358,15 +883,17 @@ def get_item_detail(item_id):
                 p.status,
                 p.created_at,
                 u.username as publisher,
-                u.id as publisher_id
+                u.id as publisher_id,
+                {IMAGE_COLUMNS}
             FROM posts p
             LEFT JOIN users u ON p.user_id = u.id
             WHERE p.id = ?
         """
 
-        cursor.execute(sql, (item_id,))
-        result = cursor.fetchone()
-        conn.close()
+        with get_database_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, (item_id,))
+            result = cursor.fetchone()
 
         if not result:
             return jsonify({"success": False, "message": "信息不存在"}), 404
@@ -385,19 +912,141 @@ def get_item_detail(item_id):
             'publisher': result[10],
             'publisher_id': result[11]
         }
+        item.update(image_fields(result[5], result[12:]))
 
-        return jsonify({
+        response = jsonify({
             "success": True,
             "data": item
         })
+        result_cache.put(cache_key, response.get_data(), generation, etag)
+        response.set_etag(etag)
+        return response
+
+    except Exception as e:
+        return jsonify({"success": False, "message": f"查询失败: {str(e)}"}), 500
+
+@app.route('/api/my_items', methods=['GET'])
+def my_items():
+    """
+    获取当前登录用户发布的物品。
+    支持按状态筛选和游标分页，走 (user_id, created_at) 索引，与帖子总量无关。
+    可选参数：status, limit, cursor。
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"success": False, "message": "未登录，无法查看"}), 401
+    status = request.args.get('status', '')  # 可选：按状态筛选
+    limit = request.args.get('limit', 50, type=int)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"success": False, "message": f"limit 必须在 1 到 {MAX_PAGE_SIZE} 之间"}), 400
+    page_cursor = request.args.get('cursor', '')
+    try:
+        cache_key = QueryCache.make_key('my_items', {
+            'user_id': user_id, 'status': status, 'limit': limit, 'cursor': page_cursor
+        })
+        cached, generation, etag = lookup_cached_response(cache_key, etag_scope=f"-u{user_id}")
+        if cached is not None:
+            return cached
+
+        where_conditions = ["p.user_id = ?"]
+        params = [user_id]
+        if status:
+            where_conditions.append("p.status = ?")
+            params.append(status)
+
+        page_conditions = list(where_conditions)
+        page_params = list(params)
+        if page_cursor:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(page_cursor)
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+            page_conditions.append("(p.created_at, p.id) < (?, ?)")
+            page_params.extend([cursor_created_at, cursor_id])
+
+        sql = f"""
+            SELECT 
+                p.id,
+                p.item_name,
+                p.item_category,
+                p.type,
+                p.description,
+                p.image_path,
+                p.time,
+                p.location,
+                p.status,
+                p.created_at,
+                {IMAGE_COLUMNS}
+            FROM posts p
+            WHERE {' AND '.join(page_conditions)}
+            ORDER BY p.created_at DESC, p.id DESC
+            LIMIT ?
+        """
+        page_params.append(limit + 1)  # 多取一行用于判断是否还有下一页
+
+        with get_database_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, page_params)
+            results = cursor.fetchall()
+            cursor.execute(f"SELECT COUNT(*) FROM posts p WHERE {' AND '.join(where_conditions)}", params)
+            total_count = cursor.fetchone()[0]
+
+        has_more = len(results) > limit
+        items = []
+        for row in results[:limit]:
+            item = {
+                'id': row[0],
+                'item_name': row[1],
+                'item_category': row[2],
+                'type': row[3],
+                'description': row[4],
+                'image_path': row[5],
+                'time': row[6],
+                'location': row[7],
+                'status': row[8],
+                'created_at': row[9],
+                'publisher': session.get('username')
+            }
+            item.update(image_fields(row[5], row[10:]))
+            items.append(item)
+
+        next_cursor = None
+        if items and has_more:
+            next_cursor = encode_cursor(items[-1]['created_at'], items[-1]['id'])
+
+        response = jsonify({
+            "success": True,
+            "data": {
+                "items": items,
+                "total": total_count,
+                "has_more": has_more,
+                "limit": limit,
+                "next_cursor": next_cursor
+            }
+        })
+        result_cache.put(cache_key, response.get_data(), generation, etag)
+        response.set_etag(etag)
+        return response
 
     except Exception as e:
         return jsonify({"success": False, "message": f"查询失败: {str(e)}"}), 500
 
-@app.route('/data/uploads/<filename>')
+
+@app.route('/data/uploads/<path:filename>')
 def uploaded_file(filename):
     # 允许通过HTTP访问图片
-    return send_from_directory(os.path.join(os.path.dirname(__file__), '../data/uploads'), filename)
+    metrics.set_body_phase('file')
+    with metrics.timer('file'):
+        return upload_server.send(app, request, filename)
+
+
+def ownership_error(item_id, action: str):
+    """条件语句没有命中时区分"物品不存在"和"不是本人发布"（只在失败时多查一次）"""
+    with get_database_connection() as conn:
+        exists = conn.execute("SELECT 1 FROM posts WHERE id = ?", (item_id,)).fetchone()
+    if not exists:
+        return jsonify({"success": False, "message": "物品不存在"}), 404
+    return jsonify({"success": False, "message": f"无权{action}他人发布的物品"}), 403
 
 
 @app.route('/api/edit_item', methods=['POST'])
@@ -405,8 +1054,11 @@ def edit_item():
     """
     编辑物品信息接口。
     仅允许物品发布者本人编辑。
-    可修改字段：type, item_name, item_category, description, image_path, time, location。
+    可修改字段：type, item_name, item_category, description, time, location。
+    图片不能编辑：image_path 与缩略图、预览图、尺寸以及 images 引用计数是一起登记的，
+    单独改路径会让各字段指向不同的图片；请求里的 image_path 忽略，换图片需要重新发布。
     前端需传递：id, 以及要修改的字段。
+    权限检查和修改在同一条 UPDATE ... WHERE id = ? AND user_id = ? 中完成，返回修改后的字段。
     """
     user_id = session.get('user_id')
     if not user_id:
@@ -417,30 +1069,22 @@ def edit_item():
     if not item_id:
         return jsonify({"success": False, "message": "缺少物品ID"}), 400
     # 只允许修改这些字段
-    fields = ['type', 'item_name', 'item_category', 'description', 'image_path', 'time', 'location']
+    fields = ['type', 'item_name', 'item_category', 'description', 'time', 'location']
     updates = {k: data[k] for k in fields if k in data}
     if not updates:
         return jsonify({"success": False, "message": "没有可修改的字段"}), 400
     try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        # 检查权限：只能编辑自己的物品
-        cursor.execute("SELECT user_id FROM posts WHERE id = ?", (item_id,))
-        row = cursor.fetchone()
-        if not row:
-            conn.close()
-            return jsonify({"success": False, "message": "物品不存在"}), 404
-        if row[0] != user_id:
-            conn.close()
-            return jsonify({"success": False, "message": "无权编辑他人发布的物品"}), 403
         # 构造SQL
         set_clause = ', '.join([f"{k} = ?" for k in updates.keys()])
-        values = list(updates.values()) + [item_id]
-        sql = f"UPDATE posts SET {set_clause} WHERE id = ?"
-        cursor.execute(sql, values)
-        conn.commit()
-        conn.close()
-        return jsonify({"success": True, "message": "编辑成功"})
+        values = list(updates.values()) + [item_id, user_id]
+        sql = f"UPDATE posts SET {set_clause} WHERE id = ? AND user_id = ? RETURNING id, {', '.join(fields)}, image_path, status"
+        rows = write_queue.execute(lambda conn: conn.execute(sql, values).fetchall())
+        if not rows:
+            return ownership_error(item_id, "编辑")
+        posts_changed()
+        schedule_matching([rows[0][0]])
+        item = dict(zip(['id'] + fields + ['image_path', 'status'], rows[0]))
+        return jsonify({"success": True, "message": "编辑成功", "data": item})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
@@ -460,22 +1104,14 @@ def delete_item():
     if not item_id:
         return jsonify({"success": False, "message": "缺少物品ID"}), 400
     try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        # 检查权限：只能删除自己的物品
-        cursor.execute("SELECT user_id FROM posts WHERE id = ?", (item_id,))
-        row = cursor.fetchone()
-        if not row:
-            conn.close()
-            return jsonify({"success": False, "message": "物品不存在"}), 404
-        if row[0] != user_id:
-            conn.close()
-            return jsonify({"success": False, "message": "无权删除他人发布的物品"}), 403
-        # 删除数据
-        cursor.execute("DELETE FROM posts WHERE id = ?", (item_id,))
-        conn.commit()
-        conn.close()
-        return jsonify({"success": True, "message": "删除成功"})
+        # 只能删除自己的物品：权限条件直接写在 DELETE 里
+        rows = write_queue.execute(lambda conn: conn.execute(
+            "DELETE FROM posts WHERE id = ? AND user_id = ? RETURNING id", (item_id, user_id)
+        ).fetchall())
+        if not rows:
+            return ownership_error(item_id, "删除")
+        posts_changed()
+        return jsonify({"success": True, "message": "删除成功", "data": {"id": rows[0][0]}})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
@@ -486,7 +1122,7 @@ def update_status():
     修改物品状态接口。
     仅允许物品发布者本人修改。
     前端需传递：id。
-    功能：active <-> 招领信息 状态切换。
+    功能：active <-> found 状态切换，切换在 SQL 中原子完成。
     """
     user_id = session.get('user_id')
     if not user_id:
@@ -496,27 +1132,261 @@ def update_status():
     if not item_id:
         return jsonify({"success": False, "message": "缺少物品ID"}), 400
     try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        # 检查权限：只能操作自己的物品
-        cursor.execute("SELECT user_id, status FROM posts WHERE id = ?", (item_id,))
-        row = cursor.fetchone()
-        if not row:
-            conn.close()
-            return jsonify({"success": False, "message": "物品不存在"}), 404
-        if row[0] != user_id:
-            conn.close()
-            return jsonify({"success": False, "message": "无权操作他人发布的物品"}), 403
-        # 状态切换
-        current_status = row[1]
-        new_status = 'found' if current_status == 'active' else 'active'
-        cursor.execute("UPDATE posts SET status = ? WHERE id = ?", (new_status, item_id))
-        conn.commit()
-        conn.close()
-        return jsonify({"success": True, "message": f"状态已变更为{new_status}"})
+        rows = write_queue.execute(lambda conn: conn.execute(
+            """
+            UPDATE posts SET status = CASE status WHEN 'active' THEN 'found' ELSE 'active' END
+            WHERE id = ? AND user_id = ?
+            RETURNING id, status
+            """,
+            (item_id, user_id)
+        ).fetchall())
+        if not rows:
+            return ownership_error(item_id, "操作")
+        posts_changed()
+        new_status = rows[0][1]
+        if new_status == 'active':
+            schedule_matching([rows[0][0]])
+        return jsonify({
+            "success": True,
+            "message": f"状态已变更为{new_status}",
+            "data": {"id": rows[0][0], "status": new_status}
+        })
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
+# 批量操作：action -> 只作用于本人帖子的 SQL（ids 以 JSON 数组传入，语句形状固定，可复用预编译语句）
+BATCH_ACTIONS = {
+    'close': "UPDATE posts SET status = 'found' WHERE user_id = ? AND id IN (SELECT value FROM json_each(?)) RETURNING id",
+    'delete': "DELETE FROM posts WHERE user_id = ? AND id IN (SELECT value FROM json_each(?)) RETURNING id",
+}
+
+
+@app.route('/api/batch_items', methods=['POST'])
+def batch_items():
+    """
+    批量关闭（标记为 found）或删除本人发布的物品。
+    前端需传递：ids（物品ID数组）, action（close 或 delete）。
+    一条语句完成，返回实际处理的 ID；不存在或不属于本人的 ID 在 skipped 中返回。
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({"success": False, "message": "未登录，无法操作"}), 401
+    data = request.json or {}
+    ids = data.get('ids')
+    action = data.get('action')
+    if action not in BATCH_ACTIONS:
+        return jsonify({"success": False, "message": "action 只能是 close 或 delete"}), 400
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+        return jsonify({"success": False, "message": "ids 必须是非空的整数数组"}), 400
+    if len(ids) > BATCH_MAX_ITEMS:
+        return jsonify({"success": False, "message": f"单次最多处理 {BATCH_MAX_ITEMS} 条"}), 400
+    try:
+        rows = write_queue.execute(
+            lambda conn: conn.execute(BATCH_ACTIONS[action], (user_id, json.dumps(ids))).fetchall()
+        )
+        done = sorted(row[0] for row in rows)
+        if done:
+            posts_changed()
+        done_set = set(done)
+        skipped = [i for i in ids if i not in done_set]
+        return jsonify({
+            "success": bool(done),
+            "message": f"已处理 {len(done)} 条，跳过 {len(skipped)} 条",
+            "data": {"ids": done, "skipped": skipped}
+        })
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+@app.route('/api/matches/<int:item_id>', methods=['GET'])
+def get_matches(item_id):
+    """
+    物品的自动匹配结果：对方类型（失物信息 <-> 招领信息）中可能是同一件物品的帖子，
+    按匹配度从高到低。发布或编辑后由写线程计算，可选参数 limit。
+    """
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    sql = f"""
+        SELECT p.id, p.item_name, p.item_category, p.type, p.location, p.time, p.status, p.created_at,
+               u.username AS publisher, m.score, m.matched_at, p.image_path, {IMAGE_COLUMNS}
+        FROM matches m
+        JOIN posts p ON p.id = m.match_id
+        LEFT JOIN users u ON p.user_id = u.id
+        WHERE m.post_id = ?
+        ORDER BY m.score DESC
+        LIMIT ?
+    """
+    try:
+        with get_database_connection() as conn:
+            if conn.execute("SELECT 1 FROM posts WHERE id = ?", (item_id,)).fetchone() is None:
+                return jsonify({"success": False, "message": "信息不存在"}), 404
+            rows = conn.execute(sql, (item_id, limit)).fetchall()
+    except Exception as e:
+        return jsonify({"success": False, "message": f"查询失败: {str(e)}"}), 500
+
+    keys = ['id', 'item_name', 'item_category', 'type', 'location', 'time', 'status', 'created_at',
+            'publisher', 'score', 'matched_at']
+    matches = []
+    for row in rows:
+        item = dict(zip(keys, row))
+        item.update(image_fields(row[11], row[12:]))
+        matches.append(item)
+    return jsonify({"success": True, "message": "获取成功", "data": {"item_id": item_id, "matches": matches}})
+
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """
+    帖子变更订阅：since 之后的增删改，同一帖子合并为一条（见 change_feed.py）。
+    可选参数：since（上次返回的 next_since），limit（默认 500，最多 1000）。
+    不带 since 时只返回当前的 latest，客户端先取 latest 再加载列表，之后从 latest 开始增量同步。
+    """
+    since = request.args.get('since', type=int)
+    limit = min(max(request.args.get('limit', change_feed.DEFAULT_LIMIT, type=int), 1), change_feed.MAX_LIMIT)
+    try:
+        with get_database_connection() as conn:
+            if since is None:
+                latest = change_feed.latest_seq(conn)
+                data = {"changes": [], "next_since": latest, "latest": latest, "has_more": False, "reset": False}
+            else:
+                data = change_feed.read_changes(conn, since, limit, item_loader=load_list_items)
+    except Exception as e:
+        return jsonify({"success": False, "message": f"查询失败: {str(e)}"}), 500
+    return jsonify({"success": True, "message": "获取成功", "data": data})
+
+
+@app.route('/api/stream', methods=['GET'])
+def stream_posts():
+    """
+    Server-Sent Events 推送帖子的新增、编辑、状态变更和删除（见 event_stream.py）。
+    可选参数：type, category 只接收该类型/分类。
+    断线重连时请求头 Last-Event-ID（或参数 last_event_id）为收到的最后一个事件 id，从它之后继续。
+    """
+    item_type = request.args.get('type', '')
+    category = request.args.get('category', '')
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return jsonify({"success": False, "message": "Last-Event-ID 必须是整数"}), 400
+    try:
+        subscription = broadcaster.subscribe(last_event_id, item_type, category)
+    except StreamFull:
+        response = jsonify({"success": False, "message": "订阅连接已满，请稍后重试"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STREAM_RETRY_MS // 1000)
+        return response
+    # serve.py 提供：长连接开始后不再占用请求线程池的名额
+    detach = request.environ.get('lostfound.detach')
+    metrics.set_body_phase('stream')
+
+    def generate():
+        try:
+            if detach is not None:
+                detach()
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            while not broadcaster.stopped:
+                # 空闲时发注释行作为心跳，客户端已断开时写入失败，生成器随之关闭
+                yield subscription.next_chunk() or ": ping\n\n"
+        finally:
+            subscription.close()
+
+    return app.response_class(generate(), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """运行状态统计（连接池命中率等），供监控使用"""
+    return jsonify({
+        "success": True,
+        "data": {
+            "pool": pool.stats(),
+            "cache": result_cache.stats(),
+            "images": image_gc_task.last_result,
+            "fd_cache": upload_server.fd_cache.stats() if upload_server.fd_cache else None,
+            "writer": write_queue.stats()
+        }
+    })
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式的请求指标和组件统计（多进程部署时合并所有工作进程）"""
+    return app.response_class(app_metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def admin_denied():
+    """管理接口要求请求头 X-Admin-Token 等于 ADMIN_TOKEN；未配置口令时管理接口不存在"""
+    if not config['ADMIN_TOKEN']:
+        return jsonify({"success": False, "message": "接口不存在"}), 404
+    token = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(token.encode(), config['ADMIN_TOKEN'].encode()):
+        return jsonify({"success": False, "message": "无权访问"}), 403
+    return None
+
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """
+    最近的请求剖析结果（新的在前），可选参数 limit。
+    下载：/api/admin/profiles/<name>.prof（pstats）或 .tracemalloc / .json
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    return jsonify({"success": True, "message": "获取成功", "data": {
+        "sample_rate": request_profiler.sample_rate,
+        "profiles": request_profiler.recent(limit),
+    }})
+
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    """下载一个剖析结果文件"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    base, ext = os.path.splitext(name)
+    path = request_profiler.file_path(base, ext)
+    if path is None:
+        return jsonify({"success": False, "message": "剖析结果不存在"}), 404
+    return send_file(path, as_attachment=ext != '.json', download_name=name)
+
+
+@app.route('/api/admin/export', methods=['GET'])
+def export_posts():
+    """
+    流式导出帖子（连同发布者用户名），format=ndjson（默认）或 csv。
+    可选参数：type, status, since, until（按 created_at）。
+    逐批从游标读取、逐批发送，内存占用与导出条数无关；导入用 bulk_io.py import。
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"success": False, "message": f"不支持的格式: {fmt}"}), 400
+    sql, params = export_query(request.args.get('type'), request.args.get('status'),
+                               request.args.get('since'), request.args.get('until'))
+
+    metrics.set_body_phase('stream')
+
+    def generate():
+        # 连接在响应体发送完（或客户端断开、生成器关闭）时归还
+        with get_database_connection() as conn:
+            yield from EXPORT_FORMATTERS[fmt](iter_batches(conn, sql, params))
+
+    filename = f"posts-{pytime.strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return app.response_class(generate(), content_type=EXPORT_FORMATS[fmt],
+                              headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # 开发模式：单进程 + 调试器；生产环境用 serve.py 启动多个工作进程
+    for description in migrate_database():
+        print(f"已应用结构修订: {description}")
+    start_background_tasks()
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+全文检索（FTS5）分词工具
+
+中文没有空格分词，FTS5 自带的 unicode61 分词器会把整段中文当成一个词。
+这里在写入索引前先在 Python 里把文本切成"字二元组"（bigram）：
+    "黑色手机" -> "黑色 色手 手机"
+英文和数字按单词切分并统一小写。切好的文本用空格连接后交给 unicode61，
+查询时把关键字按同样规则切分并拼成短语查询，中文关键字即可用倒排索引完成子串匹配。
+英文和数字是按整词索引的，查不到词中间的子串（"phone" 不能命中 "iPhone"），
+含英文或数字的关键字由调用方退回 LIKE，结果与 LIKE 一致。
+
+注意：posts_fts 是无内容表（content=''），删除时必须提供与写入时完全一致的
+分词结果，因此 segment_text 必须是确定性的；修改分词规则后需要重建索引。
+前端的本地镜像用 frontend/text_segment.py 里的同一套规则，修改时两边一起改。
+"""
+import json
+import re
+import unicodedata
+
+# SQL 中使用的分词函数名，触发器里会调用它
+SEGMENT_FUNCTION = "fts_segment"
+MATCH_TERMS_FUNCTION = "match_terms"
+
+# 匹配索引词的权重与每个字段最多取的词数
+NAME_WEIGHT = 3
+LOCATION_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+MAX_TERMS_PER_FIELD = 48
+
+# 发帖套话里的二元组，几乎每条帖子都有，对匹配没有区分度
+MATCH_STOP_TERMS = frozenset([
+    "丢失", "捡到", "失主", "认领", "联系", "系我", "请联", "酬谢", "有酬", "私信", "拾到", "到者",
+    "者请", "附近", "一个", "今天", "昨天", "上午", "下午", "中午", "重要", "对我", "我很", "很重",
+    "尽快", "快认", "请尽", "主请",
+])
+# 含这些虚词的二元组（"色的"、"在图"）跨了词边界，不作为匹配索引词
+MATCH_STOP_CHARS = frozenset("的了在是我有和与及个请到把被就都也很着过")
+
+# 中文（含扩展 A 区和兼容区）连续片段，或连续的英文/数字
+_RUN_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]+|[0-9a-z]+")
+
+
+def _is_cjk(run: str) -> bool:
+    return not run[0].isascii()
+
+
+def _normalize(text: str) -> str:
+    """全角转半角并小写"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _cjk_bigrams(run: str) -> list:
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def segment_text(text) -> str:
+    """把文本切成空格分隔的索引词（中文二元组 + 英文单词）"""
+    if not text:
+        return ""
+    tokens = []
+    for run in _RUN_RE.findall(_normalize(str(text))):
+        if _is_cjk(run):
+            tokens.extend(_cjk_bigrams(run))
+        else:
+            tokens.append(run)
+    return " ".join(tokens)
+
+
+def build_match_query(keyword: str):
+    """
+    把搜索关键字转换成 FTS5 MATCH 表达式
+
+    关键字按空白拆成多个词，词与词之间是 AND 关系；每个词内部的索引词
+    必须连续出现（短语查询），最后一个片段是单个汉字时按前缀匹配。
+
+    Returns:
+        str: MATCH 表达式；关键字无法用索引精确表达时（含英文或数字、以单个汉字开头）返回 None，
+             调用方应退回 LIKE 查询
+    """
+    terms = []
+    for word in _normalize(keyword).split():
+        runs = _RUN_RE.findall(word)
+        if not runs:
+            continue
+        # 英文和数字按整词索引，查不到词中间的子串（"phone" 不能命中 "iphone"）；
+        # 以单个汉字开头时，它可能是文档里某个长片段的最后一个字，二元组索引也查不到
+        if not all(_is_cjk(run) for run in runs) or len(runs[0]) == 1:
+            return None
+        parts = []
+        for run in runs:
+            parts.extend(f'"{token}"' for token in _cjk_bigrams(run))
+        if len(runs[-1]) == 1:
+            parts[-1] += "*"
+        terms.append(" + ".join(parts))
+    if not terms:
+        return None
+    return " AND ".join(f"({term})" for term in terms)
+
+
+def match_terms(item_name, description, location) -> dict:
+    """
+    失物/招领匹配用的索引词及权重（见 matching.py）
+
+    物品名称的词权重最高，其次是地点（加 @ 前缀，与名称/描述的词分开），描述最低；
+    帖子模板里到处都有的套话和跨虚词的二元组不作为索引词。与 segment_text 一样必须是确定性的。
+    """
+    terms = {}
+    for text, weight, prefix in ((description, DESCRIPTION_WEIGHT, ""), (location, LOCATION_WEIGHT, "@"),
+                                 (item_name, NAME_WEIGHT, "")):
+        for token in segment_text(text).split()[:MAX_TERMS_PER_FIELD]:
+            if token not in MATCH_STOP_TERMS and not MATCH_STOP_CHARS.intersection(token):
+                terms[prefix + token] = max(weight, terms.get(prefix + token, 0))
+    return terms
+
+
+def match_terms_json(item_name, description, location) -> str:
+    """match_terms 的 SQL 版本，返回 JSON 对象供 json_each 展开"""
+    return json.dumps(match_terms(item_name, description, location), ensure_ascii=False)
+
+
+def register_functions(conn):
+    """在连接上注册分词函数（触发器和迁移脚本依赖它）"""
+    conn.create_function(SEGMENT_FUNCTION, 1, segment_text, deterministic=True)
+    conn.create_function(MATCH_TERMS_FUNCTION, 3, match_terms_json, deterministic=True)
@@ -0,0 +1,201 @@
+"""
+按内容寻址的图片存储
+
+上传的图片边写入临时文件边计算 SHA-256，最终保存为 <根目录>/<哈希前2位>/<哈希3-4位>/<哈希><扩展名>：
+同一张图片无论上传多少次只存一份，也不会出现同名文件互相覆盖。
+
+引用计数保存在数据库 images 表中，由 posts 上的触发器维护；后台清理任务 sweep() 删除
+引用计数归零且超过宽限期的文件，并统计每个用户占用的存储空间。
+
+并发约定：commit() 只在调用方的写事务里登记 images 行，事务提交后再由 publish() 把临时文件移到正式位置，
+事务回滚时调用方 discard() 临时文件，不会留下数据库里没有记录、清理任务也找不到的文件。
+sweep() 在持有 SQLite 写锁期间删除文件，只删引用计数为零的图片；publish() 时帖子已提交、引用计数至少为一，
+所以不会出现"清理任务刚删掉文件，上传请求又把它当作已存在"的竞争。
+"""
+import hashlib
+import os
+import tempfile
+from typing import NamedTuple
+
+# 图片在数据库中的路径前缀，与 /data/uploads/ 路由对应
+URL_PREFIX = "data/uploads"
+
+# 统一扩展名，避免同一内容因 .jpeg/.JPG 存成两份
+_EXTENSION_ALIASES = {".jpeg": ".jpg", ".jpe": ".jpg", ".tif": ".tiff"}
+
+_CHUNK_SIZE = 64 * 1024
+
+# 每轮清理最多删除的文件数，避免长时间占用写锁
+SWEEP_BATCH = 500
+
+
+class StagedImage(NamedTuple):
+    """已写入临时文件、尚未登记到数据库的图片"""
+    digest: str
+    size: int
+    ext: str
+    temp_path: str
+
+    @property
+    def relative_path(self) -> str:
+        """相对存储根目录的分片路径"""
+        return f"{self.digest[:2]}/{self.digest[2:4]}/{self.digest}{self.ext}"
+
+    @property
+    def image_path(self) -> str:
+        """写入 posts.image_path 的路径"""
+        return f"{URL_PREFIX}/{self.relative_path}"
+
+
+def normalize_extension(filename: str) -> str:
+    """从原始文件名取规范化的扩展名"""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not ext[1:].isalnum():
+        return ""
+    return _EXTENSION_ALIASES.get(ext, ext)
+
+
+class ImageStore:
+    """内容寻址图片存储"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.temp_dir = os.path.join(root, ".tmp")  # 与正式文件同一文件系统，os.replace 才是原子的
+
+    def stage(self, stream, filename: str) -> StagedImage:
+        """把上传流写入临时文件并计算哈希"""
+        os.makedirs(self.temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = stream.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return StagedImage(digest.hexdigest(), size, normalize_extension(filename), temp_path)
+
+    def commit(self, conn, staged: StagedImage) -> str:
+        """
+        在调用方的写事务中登记图片
+
+        帖子 INSERT 后触发器会把 refcount 加一，调用方负责提交事务；
+        提交成功后调用 publish() 移动文件，失败时调用 discard()。
+
+        Returns:
+            str: 写入 posts.image_path 的路径
+        """
+        conn.execute(
+            """
+            INSERT INTO images (path, hash, size, refcount, touched_at)
+            VALUES (?, ?, ?, 0, datetime('now'))
+            ON CONFLICT(path) DO UPDATE SET touched_at = excluded.touched_at
+            """,
+            (staged.image_path, staged.digest, staged.size)
+        )
+        return staged.image_path
+
+    def publish(self, staged: StagedImage):
+        """登记的事务提交后，把临时文件移到正式位置；已存在相同内容时直接丢弃临时文件"""
+        final_path = self.file_path(staged.image_path)
+        if os.path.exists(final_path):
+            self.discard(staged)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(staged.temp_path, final_path)
+
+    def discard(self, staged: StagedImage):
+        """丢弃未登记的临时文件"""
+        try:
+            os.remove(staged.temp_path)
+        except OSError:
+            pass
+
+    def file_path(self, image_path: str) -> str:
+        """posts.image_path -> 磁盘路径"""
+        relative = image_path[len(URL_PREFIX) + 1:] if image_path.startswith(URL_PREFIX + "/") else image_path
+        return os.path.join(self.root, *relative.split("/"))
+
+    def sweep(self, conn, grace_seconds: int = 3600) -> dict:
+        """
+        删除引用计数归零且超过宽限期的图片，补齐旧图片的大小，并统计存储占用
+
+        宽限期用来覆盖"图片已登记、帖子还没插入"以及刚删帖又撤销之类的短暂窗口。
+        conn 为可写连接且不在事务中（服务器中由写线程以 exclusive 任务执行）。
+
+        Returns:
+            dict: 本轮删除数量/释放字节数、总占用和按用户的占用
+        """
+        deleted = 0
+        freed = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """
+                SELECT path, size FROM images
+                WHERE refcount <= 0 AND touched_at < datetime('now', ?)
+                LIMIT ?
+                """,
+                (f"-{int(grace_seconds)} seconds", SWEEP_BATCH)
+            ).fetchall()
+            conn.executemany("DELETE FROM images WHERE path = ?", [(path,) for path, _ in rows])
+            for path, size in rows:
+                try:
+                    os.remove(self.file_path(path))
+                except FileNotFoundError:
+                    pass
+                deleted += 1
+                freed += size or 0
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        self._fill_missing_sizes(conn)
+        usage = self.usage(conn)
+        usage["deleted"] = deleted
+        usage["freed_bytes"] = freed
+        return usage
+
+    def _fill_missing_sizes(self, conn):
+        """迁移登记的旧图片没有 size，从磁盘读取补上"""
+        rows = conn.execute("SELECT path FROM images WHERE size IS NULL LIMIT ?", (SWEEP_BATCH,)).fetchall()
+        if not rows:
+            return
+        sizes = []
+        for (path,) in rows:
+            try:
+                sizes.append((os.path.getsize(self.file_path(path)), path))
+            except OSError:
+                sizes.append((0, path))
+        conn.executemany("UPDATE images SET size = ? WHERE path = ?", sizes)
+        conn.commit()
+
+    @staticmethod
+    def usage(conn) -> dict:
+        """总占用和每个用户引用的图片占用（同一用户多次引用同一图片只算一次）"""
+        blobs, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images"
+        ).fetchone()
+        per_user = conn.execute(
+            """
+            SELECT user_id, COUNT(*), COALESCE(SUM(size), 0) FROM (
+                SELECT DISTINCT p.user_id, i.path, i.size
+                FROM posts p JOIN images i ON i.path = p.image_path
+            )
+            GROUP BY user_id
+            ORDER BY 3 DESC
+            """
+        ).fetchall()
+        return {
+            "blobs": blobs,
+            "bytes": total_bytes,
+            "users": [{"user_id": user_id, "images": images, "bytes": size} for user_id, images, size in per_user],
+        }
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引顾问
+
+把服务器记录的查询日志（设置环境变量 QUERY_LOG_PATH 后由连接池写入，每行一条 JSON）
+按查询形状去重后逐条执行 EXPLAIN QUERY PLAN，标出需要临时 B 树排序或全表扫描的查询，
+按出现次数从多到少输出。
+
+用法:
+    python index_advisor.py <数据库路径> <查询日志路径> [--all]
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from collections import Counter
+
+import fulltext
+from query_plan import fingerprint_sql, explain_query_plan, find_plan_issues
+
+# 只分析这些语句（BEGIN/COMMIT/PRAGMA 等没有执行计划可看）
+_ANALYZED_PREFIXES = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+def load_query_log(log_path: str) -> tuple:
+    """
+    读取查询日志
+
+    Returns:
+        tuple: (指纹出现次数 Counter, 指纹 -> 一条带字面量的样例 SQL)
+    """
+    counts = Counter()
+    samples = {}
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                sql = json.loads(line)["sql"]
+            except (ValueError, KeyError):
+                continue
+            # 触发器内部的语句以 "-- TRIGGER" 注释开头，跟随触发它的语句，不单独分析
+            if sql.lstrip().startswith("--"):
+                continue
+            if not sql.lstrip().upper().startswith(_ANALYZED_PREFIXES):
+                continue
+            fp = fingerprint_sql(sql)
+            counts[fp] += 1
+            samples.setdefault(fp, sql)
+    return counts, samples
+
+
+def advise(db_path: str, log_path: str, show_all=False) -> int:
+    """
+    分析查询日志并打印报告
+
+    Returns:
+        int: 有问题的查询形状数量
+    """
+    counts, samples = load_query_log(log_path)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    fulltext.register_functions(conn)
+
+    flagged = 0
+    print(f"共 {sum(counts.values())} 条语句，{len(counts)} 种查询形状\n")
+    for fp, count in counts.most_common():
+        try:
+            plan = explain_query_plan(conn, samples[fp])
+        except sqlite3.Error as e:
+            print(f"[无法分析] x{count} {fp}\n    {e}\n")
+            continue
+        issues = find_plan_issues(plan)
+        if issues:
+            flagged += 1
+        if issues or show_all:
+            print(f"[{'需优化' if issues else '正常'}] x{count} {fp}")
+            for issue in issues:
+                print(f"    ! {issue}")
+            for detail in plan:
+                print(f"      {detail}")
+            print()
+    conn.close()
+    print(f"发现 {flagged} 种需要优化的查询形状")
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="根据查询日志检查执行计划，找出临时排序和全表扫描")
+    parser.add_argument("db_path", help="数据库路径")
+    parser.add_argument("log_path", help="查询日志路径（QUERY_LOG_PATH 指定的文件）")
+    parser.add_argument("--all", action="store_true", help="同时列出没有问题的查询")
+    args = parser.parse_args()
+    flagged = advise(args.db_path, args.log_path, show_all=args.all)
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+后台定时任务
+
+PeriodicTask 在守护线程里按固定间隔执行一个函数，异常只打印不退出。
+服务器用它定期执行 PRAGMA optimize（按需 ANALYZE，更新查询规划器的统计信息）。
+"""
+import threading
+import traceback
+
+
+class PeriodicTask:
+    """按固定间隔在后台线程执行的任务"""
+
+    def __init__(self, name: str, interval: float, func, run_immediately=False):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.run_immediately = run_immediately
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台线程，重复调用无副作用"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """通知线程退出并等待"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        """立即执行一次（也供命令行/测试调用）"""
+        try:
+            self.last_result = self.func()
+        except Exception:
+            print(f"后台任务 {self.name} 执行失败:")
+            traceback.print_exc()
+        return self.last_result
+
+    def _run(self):
+        if self.run_immediately:
+            self.run_once()
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+
+def optimize_database(conn):
+    """执行 PRAGMA optimize：SQLite 自行判断哪些表的统计信息过期并重新 ANALYZE（需要可写连接）"""
+    conn.execute("PRAGMA analysis_limit = 1000")  # 抽样分析，大表也只需毫秒级
+    conn.execute("PRAGMA optimize")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+失物/招领自动匹配
+
+帖子发布或编辑后，为它在对方类型（失物信息 <-> 招领信息）的 active 帖子里找可能的配对：
+
+1. 缩小候选：从倒排索引 match_terms（db_schema v8，触发器维护）按帖子的每个索引词查找，
+   索引主键为 (索引词, 类型, 类别, 发布时间)，对方类型、同类别（或未分类/其他）、
+   前后 WINDOW_DAYS 天这几个条件都在索引上完成；地点的词也在索引里（@ 前缀），
+   按共同索引词的权重和排序，只取前 CANDIDATE_LIMIT 个候选。
+2. 打分：对候选逐个计算名称、名称+描述、地点的词重合度和发布时间接近程度，加权得到 0~1 的匹配度，
+   类别不同（一方未分类或为"其他"）时打折。
+3. 匹配度不低于 MIN_SCORE 的前 MAX_MATCHES 个写入 matches 表（两个方向各一行），
+   由 /api/matches/<id> 读取。帖子删除、找到或关闭后，触发器在同一事务里删除它的匹配记录（db_schema v8/v10）。
+
+服务器在后台线程里用只读连接计算（find_matches），只把结果交给写线程写入（store_matches），
+几毫秒到几十毫秒的候选查找和打分不占用写线程；发帖请求不等待匹配完成。
+
+已有数据或批量导入后补算匹配结果：
+    python matching.py rebuild [--db data/user.db]
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+
+import fulltext
+
+OPPOSITE_TYPES = {"失物信息": "招领信息", "招领信息": "失物信息"}
+
+# 只在发布时间前后这么多天内找配对
+WINDOW_DAYS = 30
+
+# 进入打分阶段的候选上限
+CANDIDATE_LIMIT = 200
+
+# 每条帖子保存的匹配数和最低匹配度
+MAX_MATCHES = 20
+MIN_SCORE = 0.25
+
+# 这些类别的帖子可能与任何类别配对
+GENERIC_CATEGORIES = ("", "其他")
+
+# 匹配度各部分的权重
+SCORE_WEIGHTS = {"name": 0.45, "text": 0.2, "location": 0.2, "time": 0.15}
+CATEGORY_MISMATCH_FACTOR = 0.8
+
+_POST_COLUMNS = "id, type, item_category, item_name, description, location, created_at, status"
+
+_CANDIDATES_SQL = """
+    SELECT m.post_id, SUM(MIN(m.weight, q.value)) AS overlap
+    FROM json_each(?) q CROSS JOIN match_terms m
+    WHERE m.term = q.key AND m.type = ? {category_filter} AND m.created_at BETWEEN ? AND ?
+    GROUP BY m.post_id
+    ORDER BY overlap DESC
+    LIMIT ?
+"""
+
+
+class _Post:
+    """打分用的帖子信息"""
+    __slots__ = ("id", "type", "category", "created_at", "name_terms", "text_terms", "location_terms")
+
+    def __init__(self, row):
+        self.id, self.type, category, item_name, description, location, self.created_at, _ = row
+        self.category = category or ""
+        terms = fulltext.match_terms(item_name, description, location)
+        self.name_terms = {t for t, w in terms.items() if w == fulltext.NAME_WEIGHT and t[0] != "@"}
+        self.text_terms = {t for t in terms if t[0] != "@"}
+        self.location_terms = {t for t in terms if t[0] == "@"}
+
+
+def _parse_time(value):
+    try:
+        return datetime.datetime.strptime((value or "")[:19], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def time_window(created_at) -> tuple:
+    """发布时间前后 WINDOW_DAYS 天（字符串比较），时间无法解析时不限"""
+    moment = _parse_time(created_at)
+    if moment is None:
+        return "", "9999-12-31 23:59:59"
+    delta = datetime.timedelta(days=WINDOW_DAYS)
+    return (moment - delta).strftime("%Y-%m-%d %H:%M:%S"), (moment + delta).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _coverage(part: set, whole: set) -> float:
+    return len(part & whole) / len(part) if part else 0.0
+
+
+def score_pair(a: _Post, b: _Post) -> float:
+    """两条帖子的匹配度（0~1）"""
+    name = (_coverage(a.name_terms, b.text_terms) + _coverage(b.name_terms, a.text_terms)) / 2
+    text = _jaccard(a.text_terms, b.text_terms)
+    location = _jaccard(a.location_terms, b.location_terms)
+    moment_a, moment_b = _parse_time(a.created_at), _parse_time(b.created_at)
+    closeness = 0.0
+    if moment_a and moment_b:
+        closeness = max(0.0, 1 - abs((moment_a - moment_b).total_seconds()) / (WINDOW_DAYS * 86400))
+    score = (SCORE_WEIGHTS["name"] * name + SCORE_WEIGHTS["text"] * text
+             + SCORE_WEIGHTS["location"] * location + SCORE_WEIGHTS["time"] * closeness)
+    if a.category != b.category:
+        score *= CATEGORY_MISMATCH_FACTOR
+    return round(score, 4)
+
+
+def find_candidates(conn, post: _Post, terms: dict) -> list:
+    """在倒排索引上按类型、类别、时间窗缩小范围，返回共同索引词最多的候选 id"""
+    params = [json.dumps(terms, ensure_ascii=False), OPPOSITE_TYPES[post.type]]
+    category_filter = ""
+    if post.category not in GENERIC_CATEGORIES:
+        category_filter = "AND m.category IN (?, ?, ?)"
+        params.extend((post.category,) + GENERIC_CATEGORIES)
+    params.extend(time_window(post.created_at))
+    params.append(CANDIDATE_LIMIT)
+    rows = conn.execute(_CANDIDATES_SQL.format(category_filter=category_filter), params).fetchall()
+    return [row[0] for row in rows]
+
+
+def find_matches(conn, post_id: int, limit=MAX_MATCHES) -> list:
+    """
+    计算一条帖子的匹配结果（只读）
+
+    Returns:
+        list: [(对方帖子 id, 匹配度), ...]，按匹配度从高到低；帖子不存在或不是 active 时为空
+    """
+    row = conn.execute(f"SELECT {_POST_COLUMNS} FROM posts WHERE id = ?", (post_id,)).fetchone()
+    if row is None or row[7] != "active" or row[1] not in OPPOSITE_TYPES:
+        return []
+    post = _Post(row)
+    terms = fulltext.match_terms(row[3], row[4], row[5])
+    if not terms:
+        return []
+    candidate_ids = find_candidates(conn, post, terms)
+    if not candidate_ids:
+        return []
+    rows = conn.execute(
+        f"SELECT {_POST_COLUMNS} FROM posts WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(candidate_ids),)
+    ).fetchall()
+    scored = [(candidate.id, score_pair(post, candidate)) for candidate in map(_Post, rows)]
+    scored = [item for item in scored if item[1] >= MIN_SCORE]
+    scored.sort(key=lambda item: (-item[1], -item[0]))
+    return scored[:limit]
+
+
+def store_matches(conn, post_id: int, matches: list):
+    """
+    用 find_matches 的结果替换一条帖子的匹配记录（写任务）
+
+    计算是在只读连接上做的，写入前其中的帖子可能已被找到、关闭或删除，
+    这里在写事务里重新确认，只保存双方都还是 active 的配对。
+    """
+    conn.execute("DELETE FROM matches WHERE post_id = ?", (post_id,))
+    conn.execute("DELETE FROM matches WHERE match_id = ?", (post_id,))
+    active = {row[0] for row in conn.execute(
+        "SELECT id FROM posts WHERE status = 'active' AND id IN (SELECT value FROM json_each(?))",
+        (json.dumps([post_id] + [match_id for match_id, _ in matches]),)
+    )}
+    if post_id not in active:
+        return
+    matches = [(match_id, score) for match_id, score in matches if match_id in active]
+    rows = [(post_id, match_id, score) for match_id, score in matches]
+    rows += [(match_id, post_id, score) for match_id, score in matches]
+    conn.executemany("INSERT OR REPLACE INTO matches (post_id, match_id, score) VALUES (?, ?, ?)", rows)
+
+
+def store_many(conn, results):
+    """写入多条帖子的匹配结果，results 为 [(帖子 id, find_matches 结果), ...]（写任务）"""
+    for post_id, matches in results:
+        store_matches(conn, post_id, matches)
+
+
+def refresh_matches(conn, post_id: int) -> int:
+    """在同一连接上重新计算并写入一条帖子的匹配结果，返回匹配数"""
+    matches = find_matches(conn, post_id)
+    store_matches(conn, post_id, matches)
+    return len(matches)
+
+
+def rebuild(conn, chunk_size=500, progress=None) -> dict:
+    """为所有 active 帖子重新计算匹配结果，每 chunk_size 条一个事务"""
+    conn.isolation_level = None
+    post_ids = [row[0] for row in conn.execute("SELECT id FROM posts WHERE status = 'active' ORDER BY id")]
+    done = 0
+    pairs = 0
+    for start in range(0, len(post_ids), chunk_size):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            pairs += sum(refresh_matches(conn, post_id) for post_id in post_ids[start:start + chunk_size])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        done = min(start + chunk_size, len(post_ids))
+        if progress is not None:
+            progress(done, len(post_ids))
+    return {"posts": done, "pairs": pairs}
+
+
+def main():
+    from bulk_io import open_database
+    from settings import load_config
+
+    parser = argparse.ArgumentParser(description="失物/招领自动匹配")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="为所有 active 帖子重新计算匹配结果")
+    rebuild_parser.add_argument("--db", default=load_config()["DB_PATH"], help="数据库文件，默认 DB_PATH")
+    rebuild_parser.add_argument("--chunk", type=int, default=500, help="每个事务处理的帖子数")
+    args = parser.parse_args()
+
+    conn = open_database(args.db, query_only=False)
+    start = time.perf_counter()
+
+    def report(done, total):
+        print(f"\r已处理 {done}/{total} 条，{done / (time.perf_counter() - start):.0f} 条/秒",
+              end="", file=sys.stderr, flush=True)
+
+    try:
+        result = rebuild(conn, args.chunk, report)
+    finally:
+        conn.close()
+    print(f"\n完成：{result['posts']} 条帖子，{result['pairs']} 个匹配，耗时 {time.perf_counter() - start:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""
+请求指标与 Prometheus 文本格式输出
+
+MetricsMiddleware 包在 WSGI 应用外层，按 (路由, 方法, 状态码) 统计请求数和耗时直方图
+（耗时算到响应体发送完为止），并把每个请求的耗时拆成几个阶段：
+    sql       请求线程上执行 SQL（含取结果），由连接池的语句钩子累计
+    db_write  等待写线程完成写操作（含组提交）
+    json      JSON 序列化/解析
+    file      上传图片暂存、缩略图生成、图片文件打开，以及发送图片时读取响应体
+    kdf       密码哈希
+    stream    流式响应（/api/stream 推送、/api/admin/export 导出）发送响应体的时间，其中的 SQL 也计入 sql
+
+响应体的读取默认不计入任何阶段，路由用 set_body_phase() 标记：发送文件时为 file；
+流式响应为 stream，这类响应可能持续几分钟，耗时直方图只算到开始发送响应体为止。
+另外统计 SQL 语句数、响应字节数、上传字节数，连接池/缓存等组件的统计通过 add_collector 注册，
+抓取时读取。
+
+热路径上每个请求只有一次加锁和几个字典操作，可以常开。
+
+多进程部署（serve.py）时每个工作进程各自统计；设置了 snapshot_dir 时各进程每隔
+SNAPSHOT_INTERVAL 秒（后台任务）把自己的计数写到 <snapshot_dir>/<pid>.json，/api/metrics 合并所有进程的计数，
+已退出进程的计数继续保留（计数器不回退），组件统计只取仍在运行的进程。
+"""
+import json
+import os
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+PREFIX = "lostfound"
+
+# 请求耗时直方图的桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 路由匹配失败的请求统一记为这个标签，避免任意 URL 撑大标签集合
+UNMATCHED = "<unmatched>"
+
+# 写快照的间隔（秒）
+SNAPSHOT_INTERVAL = 10
+
+# 简单计数器：名称 -> 说明
+COUNTERS = {
+    "upload_bytes_total": "上传图片的字节数",
+    "upload_files_total": "上传图片的文件数",
+}
+
+_local = threading.local()
+
+
+class RequestRecord:
+    """一个请求的阶段耗时"""
+    __slots__ = ("endpoint", "status", "phases", "statements", "bytes_sent", "body_phase")
+
+    def __init__(self):
+        self.endpoint = UNMATCHED
+        self.status = "500"
+        self.phases = {}
+        self.statements = 0
+        self.bytes_sent = 0
+        self.body_phase = None  # 读取响应体的耗时计入的阶段，None 表示不计时
+
+
+def current_record():
+    """当前线程正在处理的请求，不在请求中时为 None"""
+    return getattr(_local, "record", None)
+
+
+def current_endpoint():
+    """当前请求的路由；写线程执行任务时为提交该任务的请求的路由"""
+    record = getattr(_local, "record", None)
+    if record is not None:
+        return record.endpoint
+    return getattr(_local, "endpoint", None)
+
+
+@contextmanager
+def endpoint_context(endpoint):
+    """在不处理请求的线程（写线程）里临时标记代为执行的路由"""
+    previous = getattr(_local, "endpoint", None)
+    _local.endpoint = endpoint
+    try:
+        yield
+    finally:
+        _local.endpoint = previous
+
+
+def set_body_phase(phase: str):
+    """标记当前请求的响应体读取耗时计入哪个阶段（file 或 stream，见模块说明）"""
+    record = getattr(_local, "record", None)
+    if record is not None:
+        record.body_phase = phase
+
+
+def add_time(phase: str, seconds: float):
+    record = getattr(_local, "record", None)
+    if record is not None:
+        record.phases[phase] = record.phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timer(phase: str):
+    """with timer("file"): ... 把耗时计入当前请求的某个阶段"""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        add_time(phase, perf_counter() - start)
+
+
+def sql_statement_hook(sql, parameters, seconds):
+    """ConnectionPool 语句钩子：累计当前请求的 SQL 耗时和语句数"""
+    record = getattr(_local, "record", None)
+    if record is not None:
+        record.phases["sql"] = record.phases.get("sql", 0.0) + seconds
+        record.statements += 1
+
+
+def write_wait_hook(seconds):
+    """WriteQueue 等待钩子"""
+    add_time("db_write", seconds)
+
+
+class Metrics:
+    """进程内指标"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, snapshot_dir=None):
+        self.buckets = buckets
+        self.snapshot_dir = snapshot_dir
+        self._lock = threading.Lock()
+        self._requests = {}    # (路由, 方法, 状态码) -> [各桶计数..., +Inf 桶计数, 总耗时, 次数]
+        self._phases = {}      # (路由, 阶段) -> 累计秒数
+        self._route_totals = {}  # (路由, 项) -> 累计值，项为 statements / bytes
+        self._counters = dict.fromkeys(COUNTERS, 0)
+        self._collectors = []  # (名称, 函数)
+
+    def add_collector(self, name: str, func):
+        """注册组件统计，func() 返回 {指标名: 数值}，非数值的项忽略"""
+        self._collectors.append((name, func))
+
+    def inc(self, name: str, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, record: RequestRecord, method: str, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        key = (record.endpoint, method, record.status)
+        with self._lock:
+            row = self._requests.get(key)
+            if row is None:
+                row = self._requests[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            row[index] += 1
+            row[-2] += seconds
+            row[-1] += 1
+            for phase, value in record.phases.items():
+                phase_key = (record.endpoint, phase)
+                self._phases[phase_key] = self._phases.get(phase_key, 0.0) + value
+            for item, value in (("statements", record.statements), ("bytes", record.bytes_sent)):
+                total_key = (record.endpoint, item)
+                self._route_totals[total_key] = self._route_totals.get(total_key, 0) + value
+
+    def collect(self) -> dict:
+        """调用所有组件统计，返回 {名称_指标: 数值}"""
+        gauges = {}
+        for name, func in self._collectors:
+            try:
+                values = func() or {}
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f"{name}_{key}"] = value
+        return gauges
+
+    def snapshot(self) -> dict:
+        """可 JSON 序列化的当前计数"""
+        gauges = self.collect()
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "buckets": list(self.buckets),
+                "requests": [[*key, list(row)] for key, row in self._requests.items()],
+                "phases": [[*key, value] for key, value in self._phases.items()],
+                "route_totals": [[*key, value] for key, value in self._route_totals.items()],
+                "counters": dict(self._counters),
+                "gauges": gauges,
+            }
+
+    def dump(self):
+        """把本进程的快照写到 snapshot_dir（工作进程每 SNAPSHOT_INTERVAL 秒和退出时调用）"""
+        if not self.snapshot_dir:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = os.path.join(self.snapshot_dir, f"{os.getpid()}.json")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temp_path, path)
+
+    def _load_snapshots(self) -> list:
+        """本进程的实时快照 + 其他进程写下的快照"""
+        snapshots = [self.snapshot()]
+        if not self.snapshot_dir or not os.path.isdir(self.snapshot_dir):
+            return snapshots
+        for name in os.listdir(self.snapshot_dir):
+            if not name.endswith(".json") or name == f"{os.getpid()}.json":
+                continue
+            try:
+                with open(os.path.join(self.snapshot_dir, name), encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if snapshot.get("buckets") != list(self.buckets):
+                continue
+            if not _process_alive(snapshot["pid"]):
+                snapshot["gauges"] = {}
+            snapshots.append(snapshot)
+        return snapshots
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        requests, phases, route_totals, counters = {}, {}, {}, dict.fromkeys(COUNTERS, 0)
+        gauges = []
+        for snapshot in self._load_snapshots():
+            for endpoint, method, status, row in snapshot["requests"]:
+                merged = requests.setdefault((endpoint, method, status), [0] * len(row))
+                for i, value in enumerate(row):
+                    merged[i] += value
+            for endpoint, phase, value in snapshot["phases"]:
+                phases[(endpoint, phase)] = phases.get((endpoint, phase), 0.0) + value
+            for endpoint, item, value in snapshot["route_totals"]:
+                route_totals[(endpoint, item)] = route_totals.get((endpoint, item), 0) + value
+            for name, value in snapshot["counters"].items():
+                counters[name] = counters.get(name, 0) + value
+            for name, value in snapshot["gauges"].items():
+                gauges.append((name, snapshot["pid"], value))
+
+        lines = []
+        name = f"{PREFIX}_http_requests_total"
+        _header(lines, name, "counter", "请求数")
+        for (endpoint, method, status), row in sorted(requests.items()):
+            lines.append(f"{name}{_labels(endpoint=endpoint, method=method, status=status)} {row[-1]}")
+
+        name = f"{PREFIX}_http_request_duration_seconds"
+        _header(lines, name, "histogram", "请求耗时（到响应体发送完）")
+        for (endpoint, method, status), row in sorted(requests.items()):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], row[:-2]):
+                cumulative += count
+                labels = _labels(endpoint=endpoint, method=method, status=status, le=bound)
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _labels(endpoint=endpoint, method=method, status=status)
+            lines.append(f"{name}_sum{labels} {row[-2]:.6f}")
+            lines.append(f"{name}_count{labels} {row[-1]}")
+
+        name = f"{PREFIX}_http_request_phase_seconds_total"
+        _header(lines, name, "counter", "请求耗时中各阶段（sql/db_write/json/file/kdf/stream）的累计秒数")
+        for (endpoint, phase), value in sorted(phases.items()):
+            lines.append(f"{name}{_labels(endpoint=endpoint, phase=phase)} {value:.6f}")
+
+        for item, metric, help_text in (("statements", "http_request_sql_statements_total", "请求线程上执行的 SQL 语句数"),
+                                        ("bytes", "http_response_bytes_total", "响应体字节数")):
+            name = f"{PREFIX}_{metric}"
+            _header(lines, name, "counter", help_text)
+            for (endpoint, key), value in sorted(route_totals.items()):
+                if key == item:
+                    lines.append(f"{name}{_labels(endpoint=endpoint)} {value}")
+
+        for counter, help_text in COUNTERS.items():
+            name = f"{PREFIX}_{counter}"
+            _header(lines, name, "counter", help_text)
+            lines.append(f"{name} {counters.get(counter, 0)}")
+
+        last = None
+        for gauge, pid, value in sorted(gauges):
+            name = f"{PREFIX}_{gauge}"
+            if name != last:
+                _header(lines, name, "gauge", None)
+                last = name
+            lines.append(f"{name}{_labels(pid=pid)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _process_alive(pid) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _header(lines, name, metric_type, help_text):
+    if help_text:
+        lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+
+
+def _labels(**labels) -> str:
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _TimedBody:
+    """包装响应体：统计字节数，读取耗时计入路由标记的阶段，关闭时结束统计"""
+
+    def __init__(self, body, middleware, environ, record, start):
+        self._body = body
+        self._middleware = middleware
+        self._environ = environ
+        self._record = record
+        self._start = start
+        self._body_start = perf_counter()
+
+    def __iter__(self):
+        record = self._record
+        phase = record.body_phase
+        if phase is None:
+            for chunk in self._body:
+                record.bytes_sent += len(chunk)
+                yield chunk
+            return
+        iterator = iter(self._body)
+        while True:
+            start = perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                record.phases[phase] = record.phases.get(phase, 0.0) + perf_counter() - start
+            record.bytes_sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            close = getattr(self._body, "close", None)
+            if close is not None:
+                close()
+        finally:
+            # 流式响应的请求耗时只算到开始发送响应体为止
+            end = self._body_start if self._record.body_phase == "stream" else None
+            self._middleware.finish(self._environ, self._record, self._start, end)
+
+
+class MetricsMiddleware:
+    """WSGI 中间件：为每个请求建立 RequestRecord 并在响应结束时提交"""
+
+    def __init__(self, wsgi_app, metrics: Metrics):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        record = RequestRecord()
+        _local.record = record
+        start = perf_counter()
+
+        def _start_response(status, headers, exc_info=None):
+            record.status = status[:3]
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self.wsgi_app(environ, _start_response)
+        except BaseException:
+            self.finish(environ, record, start)
+            raise
+        return _TimedBody(body, self, environ, record, start)
+
+    def finish(self, environ, record, start, end=None):
+        if getattr(_local, "record", None) is record:
+            _local.record = None
+        self.metrics.observe(record, environ.get("REQUEST_METHOD", ""), (end or perf_counter()) - start)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON 序列化/解析耗时计入 json 阶段"""
+
+    def dumps(self, obj, **kwargs):
+        start = perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            add_time("json", perf_counter() - start)
+
+    def loads(self, s, **kwargs):
+        start = perf_counter()
+        try:
+            return super().loads(s, **kwargs)
+        finally:
+            add_time("json", perf_counter() - start)
+
+
+def _record_endpoint():
+    record = getattr(_local, "record", None)
+    if record is not None and request.url_rule is not None:
+        record.endpoint = request.url_rule.rule
+
+
+def install(app, metrics: Metrics):
+    """给 Flask 应用装上中间件、路由标签和计时 JSON 序列化"""
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, metrics)
+    app.before_request(_record_endpoint)
+    app.json = TimedJSONProvider(app)
@@ -0,0 +1,168 @@
+"""
+密码哈希
+
+users.password 保存 "算法$参数...$哈希"，盐仍保存在 users.salt 列：
+    pbkdf2_sha256$<迭代次数>$<哈希>
+    scrypt$<n>$<r>$<p>$<哈希>
+不含 $ 的旧数据是 sha256(密码 + 盐)，登录成功时按当前默认算法和参数重新哈希（参数调高后同理）。
+
+默认算法和参数由环境变量配置：
+    PASSWORD_HASHER=pbkdf2|scrypt，PBKDF2_ITERATIONS，SCRYPT_N/SCRYPT_R/SCRYPT_P
+
+KDF 是刻意设计的 CPU 密集计算，放在固定大小的 KdfPool 中执行（hashlib 计算期间释放 GIL）：
+同时计算的数量不超过工作线程数，排队超过上限直接拒绝，开学登录高峰不会占满 CPU 拖慢搜索。
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class KdfBusy(Exception):
+    """排队的哈希计算过多，或排队等待超过了调用方给的超时"""
+
+
+class LegacySHA256Hasher:
+    """旧版 sha256(密码 + 盐)，只用于校验"""
+    algorithm = "sha256"
+
+    def verify(self, password: str, salt: str, encoded: str) -> bool:
+        digest = hashlib.sha256((password + salt).encode()).hexdigest()
+        return hmac.compare_digest(digest, encoded)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return True
+
+
+class PBKDF2Hasher:
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations: int = 600_000):
+        self.iterations = iterations
+
+    def _derive(self, password: str, salt: str, iterations: int) -> str:
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations).hex()
+
+    def encode(self, password: str, salt: str) -> str:
+        return f"{self.algorithm}${self.iterations}${self._derive(password, salt, self.iterations)}"
+
+    def verify(self, password: str, salt: str, encoded: str) -> bool:
+        _, iterations, digest = encoded.split("$")
+        return hmac.compare_digest(self._derive(password, salt, int(iterations)), digest)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return int(encoded.split("$")[1]) != self.iterations
+
+
+class ScryptHasher:
+    algorithm = "scrypt"
+
+    def __init__(self, n: int = 2 ** 14, r: int = 8, p: int = 1):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    @staticmethod
+    def _derive(password: str, salt: str, n: int, r: int, p: int) -> str:
+        return hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=32).hex()
+
+    def encode(self, password: str, salt: str) -> str:
+        digest = self._derive(password, salt, self.n, self.r, self.p)
+        return f"{self.algorithm}${self.n}${self.r}${self.p}${digest}"
+
+    def verify(self, password: str, salt: str, encoded: str) -> bool:
+        _, n, r, p, digest = encoded.split("$")
+        return hmac.compare_digest(self._derive(password, salt, int(n), int(r), int(p)), digest)
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return encoded.split("$")[1:4] != [str(self.n), str(self.r), str(self.p)]
+
+
+def default_hasher():
+    """按环境变量创建默认哈希算法"""
+    if os.environ.get("PASSWORD_HASHER", "pbkdf2") == "scrypt":
+        return ScryptHasher(
+            n=int(os.environ.get("SCRYPT_N", 2 ** 14)),
+            r=int(os.environ.get("SCRYPT_R", 8)),
+            p=int(os.environ.get("SCRYPT_P", 1)),
+        )
+    return PBKDF2Hasher(iterations=int(os.environ.get("PBKDF2_ITERATIONS", 600_000)))
+
+
+class PasswordHasher:
+    """按存储格式选择算法校验，新密码和重新哈希使用默认算法"""
+
+    def __init__(self, default=None):
+        self.default = default or default_hasher()
+        self._hashers = {h.algorithm: h for h in (LegacySHA256Hasher(), PBKDF2Hasher(), ScryptHasher())}
+        self._hashers[self.default.algorithm] = self.default
+
+    @staticmethod
+    def new_salt() -> str:
+        return secrets.token_hex(16)
+
+    def hash(self, password: str) -> tuple:
+        """哈希新密码，返回 (存储的哈希, 盐)"""
+        salt = self.new_salt()
+        return self.default.encode(password, salt), salt
+
+    def _hasher_for(self, encoded: str):
+        algorithm = encoded.split("$", 1)[0] if "$" in encoded else LegacySHA256Hasher.algorithm
+        return self._hashers.get(algorithm)
+
+    def verify(self, password: str, salt: str, encoded: str) -> tuple:
+        """
+        校验密码
+
+        Returns:
+            tuple: (是否正确, 需要更新时为新的 (哈希, 盐)，否则为 None)
+        """
+        hasher = self._hasher_for(encoded)
+        if hasher is None:
+            return False, None
+        try:
+            if not hasher.verify(password, salt, encoded):
+                return False, None
+        except ValueError:  # 格式损坏
+            return False, None
+        if hasher is not self.default or self.default.needs_rehash(encoded):
+            return True, self.hash(password)
+        return True, None
+
+
+class KdfPool:
+    """有界的哈希计算线程池"""
+
+    def __init__(self, hasher: PasswordHasher, max_workers: int = 2, max_pending: int = 64):
+        self.hasher = hasher
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kdf")
+        self._slots = threading.BoundedSemaphore(max_pending)  # 执行中 + 排队中的上限
+
+    def _submit(self, func, *args, timeout=None):
+        if not self._slots.acquire(blocking=False):
+            raise KdfBusy()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # 还没开始算的直接取消，不再占用线程；与排队已满一样按"服务器繁忙"处理
+            future.cancel()
+            raise KdfBusy() from None
+
+    def hash(self, password: str, timeout=None) -> tuple:
+        return self._submit(self.hasher.hash, password, timeout=timeout)
+
+    def verify(self, password: str, salt: str, encoded: str, timeout=None) -> tuple:
+        return self._submit(self.hasher.verify, password, salt, encoded, timeout=timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,243 @@
+"""
+按需请求剖析
+
+平时不开启；满足以下任一条件的请求在 cProfile 和 tracemalloc 下执行：
+- 请求头 X-Profile-Token 等于配置的 PROFILE_TOKEN（在线上复现某个慢请求）；
+- 按 PROFILE_SAMPLE_RATE 随机抽样（0~1，管理员通过配置开启）。
+
+每个被剖析的请求在 PROFILE_DIR 下留下三个文件（文件名 <时间>-<pid>-<序号>）：
+    .prof        pstats 格式，可用 python -m pstats、snakeviz、gprof2dot 等查看
+    .tracemalloc 内存分配快照，tracemalloc.Snapshot.load() 读取
+    .json        元数据：路由、状态码、耗时、内存峰值和分配最多的代码行
+只保留最新的 PROFILE_KEEP 个，/api/admin/profiles 列出最近的剖析结果。
+
+cProfile 的耗时统计和 tracemalloc 都是进程级的开关，同一进程同一时刻只剖析一个请求，
+其余请求照常执行；带请求头却没能剖析时响应头 X-Profile-Id 为 busy。
+"""
+import cProfile
+import hmac
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+from time import perf_counter, thread_time
+
+TOKEN_HEADER = "HTTP_X_PROFILE_TOKEN"
+
+# 管理接口自身不剖析
+EXCLUDED_PREFIX = "/api/admin/"
+
+# tracemalloc 每个分配记录的栈深度
+TRACE_FRAMES = 10
+
+# 元数据中列出的分配最多的代码行数
+TOP_ALLOCATIONS = 20
+
+PROFILE_NAME = re.compile(r"^\d{8}-\d{6}-\d+-\d+$")
+
+
+class RequestProfiler:
+    """决定哪些请求需要剖析，并保存剖析结果"""
+
+    def __init__(self, endpoint_of=None):
+        self.directory = None
+        self.token = None
+        self.sample_rate = 0.0
+        self.keep = 200
+        self.endpoint_of = endpoint_of or (lambda: None)
+        self._busy = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    def configure(self, directory, token=None, sample_rate=0.0, keep=200):
+        self.directory = directory
+        self.token = token or None
+        self.sample_rate = sample_rate
+        self.keep = keep
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and (self.token is not None or self.sample_rate > 0)
+
+    def check_token(self, value) -> bool:
+        return self.token is not None and value is not None and hmac.compare_digest(value, self.token)
+
+    def wanted(self, environ) -> tuple:
+        """返回 (是否剖析, 是否由请求头触发)"""
+        if not self.enabled or environ.get("PATH_INFO", "").startswith(EXCLUDED_PREFIX):
+            return False, False
+        if self.check_token(environ.get(TOKEN_HEADER)):
+            return True, True
+        return self.sample_rate > 0 and random.random() < self.sample_rate, False
+
+    def acquire(self) -> bool:
+        return self._busy.acquire(blocking=False)
+
+    def new_name(self) -> str:
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._sequence)}"
+
+    def save(self, name, profile, snapshot, info):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, name)
+        profile.dump_stats(base + ".prof")
+        snapshot.dump(base + ".tracemalloc")
+        info["allocations"] = [
+            {"where": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        ]
+        with open(base + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=1)
+        os.replace(base + ".json.tmp", base + ".json")  # 元数据最后写，列表里出现时文件已完整
+        self.prune()
+
+    def prune(self):
+        """只保留最新的 keep 个剖析结果"""
+        for name in self._sorted_names()[self.keep:]:
+            for ext in (".json", ".prof", ".tracemalloc"):
+                try:
+                    os.remove(os.path.join(self.directory, name + ext))
+                except FileNotFoundError:
+                    pass
+
+    def _sorted_names(self) -> list:
+        """已保存的剖析结果名称，新的在前"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        names = []
+        for entry in os.listdir(self.directory):
+            if entry.endswith(".json"):
+                try:
+                    names.append((os.path.getmtime(os.path.join(self.directory, entry)), entry[:-5]))
+                except FileNotFoundError:
+                    pass
+        return [name for _, name in sorted(names, reverse=True)]
+
+    def recent(self, limit=50) -> list:
+        """最近的剖析结果元数据，新的在前"""
+        items = []
+        for name in self._sorted_names()[:limit]:
+            try:
+                with open(os.path.join(self.directory, name + ".json"), encoding="utf-8") as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                continue
+            info.pop("allocations", None)
+            items.append(info)
+        return items
+
+    def file_path(self, name, ext):
+        """剖析结果文件路径，名称不合法或不存在时返回 None"""
+        if not self.directory or not PROFILE_NAME.match(name) or ext not in (".prof", ".tracemalloc", ".json"):
+            return None
+        path = os.path.join(self.directory, name + ext)
+        return path if os.path.exists(path) else None
+
+
+class _ProfiledBody:
+    """响应体迭代也在剖析范围内，close 时保存结果"""
+
+    def __init__(self, body, run):
+        self._body = body
+        self._run = run
+
+    def __iter__(self):
+        iterator = iter(self._body)
+        while True:
+            self._run.profile.enable()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._run.profile.disable()
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            self._run.finish()
+
+
+class _ProfileRun:
+    def __init__(self, profiler: RequestProfiler, environ, name, by_header):
+        self.profiler = profiler
+        self.environ = environ
+        self.name = name
+        self.by_header = by_header
+        self.status = None
+        self.profile = cProfile.Profile()
+        self.started_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.start = perf_counter()
+        self.cpu_start = thread_time()
+        tracemalloc.start(TRACE_FRAMES)
+        self.finished = False
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        try:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            info = {
+                "name": self.name,
+                "pid": os.getpid(),
+                "method": self.environ.get("REQUEST_METHOD", ""),
+                "path": self.environ.get("PATH_INFO", ""),
+                "query": self.environ.get("QUERY_STRING", ""),
+                "endpoint": self.profiler.endpoint_of(),
+                "status": self.status,
+                "trigger": "header" if self.by_header else "sample",
+                "started_at": self.started_at,
+                "wall_ms": round((perf_counter() - self.start) * 1000, 3),
+                "cpu_ms": round((thread_time() - self.cpu_start) * 1000, 3),
+                "memory_peak_kb": round(peak / 1024, 1),
+                "memory_retained_kb": round(current / 1024, 1),
+            }
+            self.profiler.save(self.name, self.profile, snapshot, info)
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self.profiler._busy.release()
+
+
+class ProfilingMiddleware:
+    """WSGI 中间件：按 RequestProfiler 的判断剖析请求"""
+
+    def __init__(self, wsgi_app, profiler: RequestProfiler):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+
+    def __call__(self, environ, start_response):
+        wanted, by_header = self.profiler.wanted(environ)
+        if not wanted:
+            return self.wsgi_app(environ, start_response)
+        if not self.profiler.acquire():
+            if not by_header:
+                return self.wsgi_app(environ, start_response)
+
+            def _busy_response(status, headers, exc_info=None):
+                return start_response(status, headers + [("X-Profile-Id", "busy")], exc_info)
+            return self.wsgi_app(environ, _busy_response)
+
+        run = _ProfileRun(self.profiler, environ, self.profiler.new_name(), by_header)
+
+        def _start_response(status, headers, exc_info=None):
+            run.status = status[:3]
+            return start_response(status, headers + [("X-Profile-Id", run.name)], exc_info)
+
+        run.profile.enable()
+        try:
+            body = self.wsgi_app(environ, _start_response)
+        except BaseException:
+            run.profile.disable()
+            run.finish()
+            raise
+        run.profile.disable()
+        return _ProfiledBody(body, run)
@@ -0,0 +1,108 @@
+"""
+进程内查询结果缓存
+
+信息墙、搜索页首次加载、个人中心都会反复请求同一页列表，缓存序列化好的 JSON
+响应体可以跳过整条 JOIN 查询和计数。
+
+- LRU 淘汰，同时受条目数、总字节数和 TTL 限制
+- 每个条目带着生成它时的数据版本（posts 的 ETag，由触发器维护、存在数据库里），
+  读取时版本与数据库当前的不同即视为未命中：其他进程写入后，本进程不会再返回旧版本的响应体
+- 本进程内的写操作另外调用 invalidate() 使代数加一并清空缓存，及早释放内存；
+  查询开始前记下代数，写入缓存时代数已变化则丢弃结果，避免把写之前的旧数据放进缓存
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """带条目数、内存、TTL 上限的 LRU 结果缓存"""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (过期时间, 数据版本, 数据)
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,      # 超出容量被淘汰
+            "expirations": 0,    # TTL 到期
+            "stale": 0,          # 数据版本已变化（通常是其他进程写入）
+            "invalidations": 0,  # 因写入整体失效
+        }
+
+    @staticmethod
+    def make_key(namespace: str, params: dict) -> tuple:
+        """规范化查询参数作为缓存键：去掉空值、统一转字符串、按参数名排序"""
+        items = tuple(sorted((k, str(v)) for k, v in params.items() if v not in (None, "")))
+        return (namespace,) + items
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidate(self):
+        """数据发生变化：代数加一并清空缓存"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._stats["invalidations"] += 1
+
+    def get(self, key, version):
+        """命中且数据版本与 version 相同时返回缓存的数据，否则返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, entry_version, value = entry
+            if expires_at <= now or entry_version != version:
+                del self._entries[key]
+                self._bytes -= len(value)
+                self._stats["expirations" if expires_at <= now else "stale"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key, value: bytes, generation: int, version):
+        """
+        写入缓存
+
+        Args:
+            generation: 查询开始时的代数，期间本进程写过数据则不缓存
+            version: 查询开始前读到的数据版本，数据在这之后才变化时条目下次读取即失效
+        """
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._entries[key] = (time.monotonic() + self.ttl, version, value)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        """命中率、淘汰次数、内存占用等统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["generation"] = self._generation
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,41 @@
+"""
+SQL 指纹与执行计划工具
+
+fingerprint_sql 把字面量替换成 ?、折叠空白和 IN 列表，同一种查询形状得到同一个指纹；
+explain_query_plan 执行 EXPLAIN QUERY PLAN 并标出临时 B 树排序和全表扫描。
+"""
+import re
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+# 全表扫描：SCAN 后面没有 USING INDEX / USING COVERING INDEX / VIRTUAL TABLE
+_FULL_SCAN_RE = re.compile(r"^SCAN (\w+)(?!.*\bUSING\b.*INDEX)(?!.*VIRTUAL TABLE)")
+
+
+def fingerprint_sql(sql: str) -> str:
+    """规范化 SQL 作为查询形状的指纹"""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _SPACE_RE.sub(" ", sql).strip()
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return sql
+
+
+def explain_query_plan(conn, sql: str, params=()) -> list:
+    """返回 EXPLAIN QUERY PLAN 的 detail 列表"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def find_plan_issues(plan: list) -> list:
+    """从执行计划中找出临时 B 树排序和全表扫描"""
+    issues = []
+    for detail in plan:
+        if "USE TEMP B-TREE" in detail:
+            issues.append(f"临时B树排序: {detail}")
+        match = _FULL_SCAN_RE.match(detail)
+        if match and not detail.startswith("SCAN CONSTANT ROW"):
+            issues.append(f"全表扫描: {match.group(1)}")
+    return issues
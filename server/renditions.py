@@ -0,0 +1,92 @@
+"""
+上传图片的缩略图/预览图
+
+发帖时从原图生成固定尺寸的缩略图（列表用）和预览图（详情用）：按 EXIF 方向摆正、
+等比缩小到不超过目标尺寸、统一重新编码为 JPEG，不带任何 EXIF/GPS 等元数据。
+生成的图片和原图一样按内容哈希存入 ImageStore，客户端按显示尺寸只下载对应的版本。
+
+依赖 Pillow；未安装或原图无法解码时不生成，帖子只保留原图。
+"""
+import io
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 未安装时退化为只保存原图
+    Image = None
+
+# 名称 -> 最大 (宽, 高)，详情对话框按 300x200 显示，预览图取 2 倍以适配高分屏
+RENDITIONS = {
+    "thumb": (160, 160),
+    "preview": (600, 400),
+}
+
+JPEG_QUALITY = 82
+
+# 超过这个像素数的图片不处理，防止解压炸弹
+MAX_PIXELS = 50_000_000
+
+
+def _open_upright(path):
+    """打开图片并按 EXIF 方向摆正，返回 RGB 图像"""
+    image = Image.open(path)
+    if image.width * image.height > MAX_PIXELS:
+        raise ValueError("图片尺寸过大")
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        # 透明背景铺白，JPEG 不支持透明
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image) -> bytes:
+    """重新编码为渐进式 JPEG；新建的图像对象不带原图的元数据"""
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def create_renditions(image_store, staged) -> dict:
+    """
+    为已暂存的原图生成缩略图和预览图并暂存到 image_store
+
+    Returns:
+        dict: {"width": 原图宽, "height": 原图高,
+               "thumb": (StagedImage, 宽, 高), "preview": (StagedImage, 宽, 高)}；
+              无法生成时返回空字典
+    """
+    if Image is None:
+        return {}
+    try:
+        original = _open_upright(staged.temp_path)
+    except Exception:
+        return {}
+
+    result = {"width": original.width, "height": original.height}
+    try:
+        for name, size in RENDITIONS.items():
+            image = original.copy()
+            image.thumbnail(size, Image.LANCZOS)  # 只缩小不放大，保持宽高比
+            rendition = image_store.stage(io.BytesIO(_encode(image)), f"{name}.jpg")
+            result[name] = (rendition, image.width, image.height)
+    except BaseException:
+        # 写盘等错误：已暂存的缩略图一起删除，由调用方决定如何处理
+        discard_renditions(image_store, result)
+        raise
+    return result
+
+
+def publish_renditions(image_store, renditions: dict):
+    """登记的事务提交后，把缩略图/预览图移到正式位置"""
+    for name in RENDITIONS:
+        if name in renditions:
+            image_store.publish(renditions[name][0])
+
+
+def discard_renditions(image_store, renditions: dict):
+    """丢弃尚未登记的缩略图/预览图临时文件"""
+    for name in RENDITIONS:
+        if name in renditions:
+            image_store.discard(renditions[name][0])
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程生产服务器
+
+主进程应用数据库结构修订后 fork 出 N 个工作进程（默认每个 CPU 核心一个），每个工作进程
+用固定大小的线程池处理请求：
+- 共享监听套接字：默认主进程创建监听套接字由工作进程继承；--reuseport 时每个工作进程
+  各自绑定同一端口（SO_REUSEPORT），由内核在进程之间均匀分配连接
+- 线程池全忙时工作进程暂停 accept，新连接留给其他空闲的工作进程
+- SIGTERM/SIGINT：主进程通知所有工作进程停止接收新连接，处理完进行中的请求、写完排队
+  的写操作后退出，超过 --graceful-timeout 仍未退出的强制结束
+- --max-requests：工作进程处理这么多请求后平滑退出并由主进程重启，限制内存碎片和泄漏
+  的累积；加上随机抖动，避免所有进程同时重启
+- 定期优化和图片清理只在 0 号工作进程中运行
+- 各工作进程把请求指标快照写到共同的 METRICS_DIR（未设置时用临时目录），/api/metrics 合并输出
+- /api/stream 等长连接开始推送后归还线程池名额（environ['lostfound.detach']），在额外的
+  STREAM_MAX_SUBSCRIBERS 个线程里等待事件，不会占满处理普通请求的线程
+
+每个工作进程有自己的写线程，进程之间的写锁竞争由 SQLite 的 busy_timeout 处理。
+配置（DB_PATH、SECRET_KEY 等）见 settings.py；未设置 SECRET_KEY 时主进程生成一个临时密钥
+交给所有工作进程共用，否则各进程签发的 session 互不认识。
+
+没有 os.fork 的平台（Windows）退化为单进程多线程。
+
+用法:
+    python server/serve.py --bind 0.0.0.0:5000 --workers 8 --threads 8
+    python server/serve.py --reuseport --max-requests 10000 --max-requests-jitter 1000
+"""
+import argparse
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from settings import load_config, ensure_secret_key
+
+# 工作进程启动后这么多秒内就退出视为启动失败，重启前等待，避免疯狂 fork
+MIN_WORKER_LIFETIME = 1.0
+RESPAWN_BACKOFF = 1.0
+
+LISTEN_BACKLOG = 2048
+
+# 长连接空闲这么多秒后关闭，释放请求线程
+KEEPALIVE_TIMEOUT = 5
+
+
+class RequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+
+    def make_environ(self):
+        environ = super().make_environ()
+        environ["lostfound.detach"] = self.server.detach
+        return environ
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.server.detached():
+            self.close_connection = True  # 已不计入名额的线程不再处理这个连接上的后续请求
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """用固定大小线程池处理请求的 WSGI 服务器，达到请求数上限时调用 on_recycle"""
+    multithread = True
+
+    def __init__(self, host, port, app, threads=8, max_requests=0, on_recycle=None, fd=None, streams=0):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        # 多个进程共享同一个监听套接字时，select 报告可读后连接可能已被其他进程取走，
+        # 非阻塞 accept 才不会卡住
+        self.socket.setblocking(False)
+        self.max_requests = max_requests
+        self.on_recycle = on_recycle
+        self.handled = 0
+        # 长连接归还名额后仍占着线程，线程池为它们多留 streams 个线程
+        self._executor = ThreadPoolExecutor(max_workers=threads + streams, thread_name_prefix="http")
+        self._slots = threading.BoundedSemaphore(threads)
+        self._local = threading.local()
+
+    def get_request(self):
+        # 先等到有空闲线程再 accept，忙的时候把连接留给其他工作进程
+        self._slots.acquire()
+        try:
+            conn, address = self.socket.accept()
+        except BaseException:
+            self._slots.release()
+            raise
+        conn.setblocking(True)
+        return conn, address
+
+    def process_request(self, request, client_address):
+        self.handled += 1
+        if self.max_requests and self.handled == self.max_requests and self.on_recycle is not None:
+            self.on_recycle()
+        self._executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        self._local.detached = False
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            if not self._local.detached:
+                self._slots.release()
+
+    def detach(self) -> bool:
+        """当前请求成为长连接：提前归还名额，accept 可以继续接收普通请求"""
+        if getattr(self._local, "detached", True):
+            return False
+        self._local.detached = True
+        self._slots.release()
+        return True
+
+    def detached(self) -> bool:
+        return getattr(self._local, "detached", False)
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def drain(self):
+        """等待进行中的请求处理完"""
+        self._executor.shutdown(wait=True)
+
+
+def parse_bind(bind: str) -> tuple:
+    host, _, port = bind.rpartition(":")
+    return host.strip("[]") or "0.0.0.0", int(port)
+
+
+def create_listener(host: str, port: int, reuseport=False) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuseport:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    return sock
+
+
+def clear_metrics_dir(path: str):
+    """删除上次运行留下的指标快照，计数从零开始"""
+    for name in os.listdir(path):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(path, name))
+
+
+def run_worker(slot: int, args, listener=None) -> int:
+    """工作进程主体，返回退出码"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C 由主进程统一处理
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    import flask_app
+    app = flask_app.create_app()
+    flask_app.start_background_tasks(maintenance=slot == 0)
+
+    host, port = parse_bind(args.bind)
+    if listener is None:
+        listener = create_listener(host, port, reuseport=args.reuseport)
+    max_requests = args.max_requests
+    if max_requests and args.max_requests_jitter:
+        max_requests += random.randint(0, args.max_requests_jitter)
+    server = PooledWSGIServer(host, port, app, threads=args.threads, max_requests=max_requests,
+                              on_recycle=stop.set, fd=listener.fileno(),
+                              streams=flask_app.config["STREAM_MAX_SUBSCRIBERS"])
+    thread = threading.Thread(target=server.serve_forever, name="accept", daemon=True)
+    thread.start()
+    print(f"[worker {slot}] pid {os.getpid()} 已启动，{args.threads} 个线程")
+
+    while not stop.wait(1.0):
+        if not thread.is_alive():
+            break
+    server.shutdown()      # 停止 accept
+    flask_app.close_streams()  # 结束推送长连接，否则 drain 会一直等下去
+    server.drain()         # 处理完已接收的请求
+    server.server_close()
+    flask_app.shutdown_app(timeout=args.graceful_timeout)
+    print(f"[worker {slot}] pid {os.getpid()} 已退出，处理请求 {server.handled} 个")
+    return 0
+
+
+class Arbiter:
+    """主进程：启动、监视并在需要时重启工作进程"""
+
+    def __init__(self, args, listener):
+        self.args = args
+        self.listener = listener
+        self.workers = {}  # pid -> (编号, 启动时间)
+        self.stopping = False
+
+    def spawn(self, slot: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(slot, self.args, self.listener)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self.workers[pid] = (slot, time.monotonic())
+
+    def handle_stop(self, *_):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        for slot in range(self.args.workers):
+            self.spawn(slot)
+
+        while not self.stopping:
+            self.reap(respawn=True)
+            time.sleep(0.2)
+
+        print(f"[master] 正在停止 {len(self.workers)} 个工作进程")
+        for pid in self.workers:
+            self.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap(respawn=False)
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            self.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        print("[master] 已退出")
+
+    def reap(self, respawn: bool):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot, started = self.workers.pop(pid, (None, 0))
+            if slot is None or not respawn or self.stopping:
+                continue
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                print(f"[master] 工作进程 {slot} 启动后立即退出（状态 {status}），{RESPAWN_BACKOFF} 秒后重启")
+                time.sleep(RESPAWN_BACKOFF)
+            self.spawn(slot)
+
+    @staticmethod
+    def kill(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="失物招领多进程服务器")
+    parser.add_argument("--bind", default="0.0.0.0:5000", help="监听地址 host:port")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数，默认 CPU 核心数")
+    parser.add_argument("--threads", type=int, default=8, help="每个工作进程的请求线程数")
+    parser.add_argument("--max-requests", type=int, default=0, help="处理多少请求后重启工作进程，0 表示不重启")
+    parser.add_argument("--max-requests-jitter", type=int, default=0, help="重启阈值的随机增量上限")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0, help="停止时等待工作进程退出的秒数")
+    parser.add_argument("--reuseport", action="store_true", help="每个工作进程用 SO_REUSEPORT 各自监听")
+    args = parser.parse_args()
+
+    config = load_config()
+    # 工作进程继承环境变量，共用同一个密钥和指标快照目录
+    os.environ["SECRET_KEY"] = ensure_secret_key(config)
+    metrics_dir = config["METRICS_DIR"] or tempfile.mkdtemp(prefix="lostfound-metrics-")
+    os.environ["METRICS_DIR"] = metrics_dir
+    clear_metrics_dir(metrics_dir)
+
+    # 结构修订只在主进程执行一次；用完的写线程和连接在 fork 之前关闭
+    import flask_app
+    flask_app.create_app({"METRICS_DIR": None})
+    for description in flask_app.migrate_database():
+        print(f"已应用结构修订: {description}")
+    flask_app.shutdown_app()
+
+    if not hasattr(os, "fork"):
+        args.reuseport = False
+        sys.exit(run_worker(0, args))
+
+    if args.reuseport and not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("当前平台不支持 SO_REUSEPORT")
+    listener = None
+    if not args.reuseport:
+        listener = create_listener(*parse_bind(args.bind))
+    print(f"[master] pid {os.getpid()} 监听 {args.bind}，{args.workers} 个工作进程 x {args.threads} 线程")
+    Arbiter(args, listener).run()
+    if not config["METRICS_DIR"]:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
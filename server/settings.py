@@ -0,0 +1,75 @@
+"""
+服务器配置
+
+配置项从环境变量读取，create_app(overrides) 可以覆盖其中任意一项：
+    DB_PATH          数据库文件，默认 <项目根目录>/data/user.db
+    SECRET_KEY       session 签名密钥；多进程部署时所有工作进程必须相同
+    UPLOAD_DIR       上传图片目录，默认 <项目根目录>/data/uploads
+    QUERY_LOG_PATH   设置后记录执行的每条 SQL，供 index_advisor.py 分析
+    USE_X_SENDFILE   1 表示由前端服务器（nginx/Apache）用 X-Sendfile 发送图片
+    KDF_WORKERS / KDF_MAX_PENDING  密码哈希线程池大小和排队上限
+    METRICS_DIR      多进程部署时各工作进程写指标快照的目录，/api/metrics 合并后输出
+    SLOW_QUERY_LOG   慢查询日志，默认 <项目根目录>/data/slow_queries.log，报告见 slow_query_log.py
+    SLOW_QUERY_MS    慢查询阈值（毫秒，可为小数），默认 100，0 表示关闭
+    ADMIN_TOKEN      /api/admin/ 管理接口（剖析结果、数据导出）的口令，请求头 X-Admin-Token；未设置时这些接口不存在
+    PROFILE_TOKEN    设置后带 X-Profile-Token 请求头的请求会被剖析
+    PROFILE_SAMPLE_RATE  随机剖析的请求比例（0~1），默认 0
+    PROFILE_DIR / PROFILE_KEEP  剖析结果目录（默认 <项目根目录>/data/profiles）和保留个数
+    CHANGE_RETENTION_DAYS  /api/changes 变更记录保留天数，默认 7；客户端离线更久需要整体重新加载
+    STREAM_MAX_SUBSCRIBERS  每个工作进程同时保持的 /api/stream 连接上限，默认 1000
+"""
+import os
+import secrets
+import warnings
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULTS = {
+    "DB_PATH": os.path.join(PROJECT_ROOT, "data", "user.db"),
+    "SECRET_KEY": None,
+    "UPLOAD_DIR": os.path.join(PROJECT_ROOT, "data", "uploads"),
+    "QUERY_LOG_PATH": None,
+    "USE_X_SENDFILE": False,
+    "KDF_WORKERS": 2,
+    "KDF_MAX_PENDING": 64,
+    "METRICS_DIR": None,
+    "SLOW_QUERY_LOG": os.path.join(PROJECT_ROOT, "data", "slow_queries.log"),
+    "SLOW_QUERY_MS": 100.0,
+    "ADMIN_TOKEN": None,
+    "PROFILE_TOKEN": None,
+    "PROFILE_SAMPLE_RATE": 0.0,
+    "PROFILE_DIR": os.path.join(PROJECT_ROOT, "data", "profiles"),
+    "PROFILE_KEEP": 200,
+    "CHANGE_RETENTION_DAYS": 7,
+    "STREAM_MAX_SUBSCRIBERS": 1000,
+}
+
+
+def _convert(name, raw):
+    default = DEFAULTS[name]
+    if isinstance(default, bool):
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(raw)
+    if isinstance(default, float):
+        return float(raw)
+    return raw
+
+
+def load_config(overrides=None) -> dict:
+    """默认值 < 环境变量 < overrides"""
+    config = dict(DEFAULTS)
+    for name in DEFAULTS:
+        raw = os.environ.get(name)
+        if raw not in (None, ""):
+            config[name] = _convert(name, raw)
+    config.update(overrides or {})
+    return config
+
+
+def ensure_secret_key(config: dict) -> str:
+    """未配置 SECRET_KEY 时生成临时密钥：只在本进程内有效，重启后所有人需要重新登录"""
+    if not config["SECRET_KEY"]:
+        warnings.warn("未设置 SECRET_KEY，使用随机生成的临时密钥")
+        config["SECRET_KEY"] = secrets.token_hex(32)
+    return config["SECRET_KEY"]
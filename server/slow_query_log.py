@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+慢查询日志
+
+作为连接池的语句钩子，每条语句结束时拿到它的耗时（执行 + 取结果）；超过阈值的语句按
+查询指纹（query_plan.fingerprint_sql）在内存中聚合：次数、总耗时、最大耗时、参数形状
+（每个绑定参数的类型）、发出它的接口，以及一次 EXPLAIN QUERY PLAN 的结果。
+get_lost_items 等接口按筛选条件拼出不同的 SQL，每种组合是一个单独的指纹。
+
+聚合结果每隔 FLUSH_INTERVAL 秒以 JSON 行追加到日志文件（每个指纹一行），文件超过
+MAX_BYTES 时轮转为 .1 .2 ...，多个工作进程写同一个文件时用文件锁保护轮转。
+
+未超过阈值的语句只多一次比较；同一指纹的执行计划 PLAN_TTL 秒内只取一次。
+
+报告：按总耗时给指纹排名
+    python slow_query_log.py report data/slow_queries.log [--top 20] [--sort total|count|max|avg] [--json]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import fulltext
+from query_plan import fingerprint_sql, explain_query_plan, find_plan_issues
+
+try:
+    import fcntl
+except ImportError:  # Windows 只有单进程，不需要跨进程锁
+    fcntl = None
+
+# 聚合结果写入文件的间隔（秒）
+FLUSH_INTERVAL = 60
+
+# 同一指纹的执行计划缓存秒数
+PLAN_TTL = 600
+
+# 日志轮转
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+
+# 有执行计划可看的语句
+_EXPLAINED_PREFIXES = ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")
+
+
+def parameter_shape(parameters) -> str:
+    """绑定参数的形状：只保留类型，如 (str, int, null) 或 {id: int}"""
+    if parameters is None:
+        return "executemany"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {_type_name(v)}" for k, v in parameters.items()) + "}"
+    return "(" + ", ".join(_type_name(v) for v in parameters) + ")"
+
+
+def _type_name(value) -> str:
+    return "null" if value is None else type(value).__name__
+
+
+class SlowQueryLog:
+    """按指纹聚合的慢查询日志"""
+
+    def __init__(self, path: str, db_path: str, threshold_ms: float = 100, endpoint_of=None):
+        """
+        Args:
+            path: 日志文件
+            db_path: 数据库路径，取执行计划用（单独的只读连接）
+            threshold_ms: 慢查询阈值（毫秒）
+            endpoint_of: 返回当前接口名的函数
+        """
+        self.path = path
+        self.db_path = db_path
+        self.threshold = threshold_ms / 1000
+        self.endpoint_of = endpoint_of or (lambda: None)
+        self._lock = threading.Lock()
+        self._entries = {}  # 指纹 -> 聚合
+        self._window_start = time.time()
+        self._plans = {}    # 指纹 -> (取得时间, 执行计划, 问题)
+        self._explain_conn = None
+        self._explain_lock = threading.Lock()
+
+    def record(self, sql, parameters, seconds):
+        """ConnectionPool 语句钩子"""
+        if seconds < self.threshold:
+            return
+        try:
+            self._record_slow(sql, parameters, seconds)
+        except Exception:
+            pass  # 日志问题不能影响请求
+
+    def _record_slow(self, sql, parameters, seconds):
+        fingerprint = fingerprint_sql(sql)
+        shape = parameter_shape(parameters)
+        endpoint = self.endpoint_of() or "<none>"
+        plan, issues = self._plan_for(fingerprint, sql, parameters)
+        elapsed_ms = seconds * 1000
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                entry = self._entries[fingerprint] = {
+                    "fingerprint": fingerprint,
+                    "sql": sql,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "shapes": {},
+                    "endpoints": {},
+                }
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            if elapsed_ms > entry["max_ms"]:
+                entry["max_ms"] = elapsed_ms
+                entry["sql"] = sql
+            entry["shapes"][shape] = entry["shapes"].get(shape, 0) + 1
+            entry["endpoints"][endpoint] = entry["endpoints"].get(endpoint, 0) + 1
+            entry["plan"] = plan
+            entry["issues"] = issues
+
+    def _plan_for(self, fingerprint, sql, parameters) -> tuple:
+        cached = self._plans.get(fingerprint)
+        if cached is not None and time.monotonic() - cached[0] < PLAN_TTL:
+            return cached[1], cached[2]
+        if not sql.lstrip().upper().startswith(_EXPLAINED_PREFIXES):
+            plan = []
+        else:
+            params = parameters if parameters is not None else (None,) * sql.count("?")
+            try:
+                with self._explain_lock:
+                    if self._explain_conn is None:
+                        self._explain_conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                                                             check_same_thread=False)
+                        fulltext.register_functions(self._explain_conn)
+                    plan = explain_query_plan(self._explain_conn, sql, params)
+            except sqlite3.Error as e:
+                plan = [f"无法取得执行计划: {e}"]
+        issues = find_plan_issues(plan)
+        self._plans[fingerprint] = (time.monotonic(), plan, issues)
+        return plan, issues
+
+    def flush(self):
+        """把当前窗口的聚合写入日志文件并开始新窗口"""
+        with self._lock:
+            entries, self._entries = self._entries, {}
+            window_start, self._window_start = self._window_start, time.time()
+        if not entries:
+            return 0
+        window = {"window_start": round(window_start, 3), "window_end": round(time.time(), 3), "pid": os.getpid()}
+        lines = []
+        for entry in entries.values():
+            entry["total_ms"] = round(entry["total_ms"], 3)
+            entry["max_ms"] = round(entry["max_ms"], 3)
+            lines.append(json.dumps({**window, **entry}, ensure_ascii=False) + "\n")
+        self._append("".join(lines).encode("utf-8"))
+        return len(entries)
+
+    def _append(self, data: bytes):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > MAX_BYTES:
+                    self._rotate()
+                with open(self.path, "ab") as f:
+                    f.write(data)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rotate(self):
+        for i in range(BACKUP_COUNT - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def close(self):
+        self.flush()
+        with self._explain_lock:
+            if self._explain_conn is not None:
+                self._explain_conn.close()
+                self._explain_conn = None
+
+
+def load_entries(path: str) -> list:
+    """读取日志及其轮转文件，按指纹合并"""
+    merged = {}
+    paths = [f"{path}.{i}" for i in range(BACKUP_COUNT, 0, -1)] + [path]  # 从旧到新
+    for file_path in paths:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                total = merged.get(entry["fingerprint"])
+                if total is None:
+                    merged[entry["fingerprint"]] = entry
+                    continue
+                total["count"] += entry["count"]
+                total["total_ms"] += entry["total_ms"]
+                if entry["max_ms"] >= total["max_ms"]:
+                    total["max_ms"] = entry["max_ms"]
+                    total["sql"] = entry["sql"]
+                for key in ("shapes", "endpoints"):
+                    for name, count in entry[key].items():
+                        total[key][name] = total[key].get(name, 0) + count
+                total["plan"] = entry.get("plan", [])
+                total["issues"] = entry.get("issues", [])
+                total["window_end"] = entry["window_end"]
+    for entry in merged.values():
+        entry["avg_ms"] = entry["total_ms"] / entry["count"]
+    return list(merged.values())
+
+
+def report(path: str, top=20, sort="total", as_json=False):
+    entries = load_entries(path)
+    key = {"total": "total_ms", "count": "count", "max": "max_ms", "avg": "avg_ms"}[sort]
+    entries.sort(key=lambda e: e[key], reverse=True)
+    entries = entries[:top]
+    if as_json:
+        print(json.dumps(entries, ensure_ascii=False, indent=2))
+        return
+    if not entries:
+        print("没有慢查询记录")
+        return
+    for rank, entry in enumerate(entries, 1):
+        endpoints = ", ".join(f"{name} x{count}" for name, count in
+                              sorted(entry["endpoints"].items(), key=lambda item: -item[1]))
+        shapes = ", ".join(f"{shape} x{count}" for shape, count in
+                           sorted(entry["shapes"].items(), key=lambda item: -item[1]))
+        print(f"#{rank} 总计 {entry['total_ms']:.0f}ms  {entry['count']} 次  平均 {entry['avg_ms']:.1f}ms  "
+              f"最大 {entry['max_ms']:.1f}ms")
+        print(f"    {entry['fingerprint']}")
+        print(f"    接口: {endpoints}")
+        print(f"    参数: {shapes}")
+        for issue in entry.get("issues", []):
+            print(f"    ! {issue}")
+        for detail in entry.get("plan", []):
+            print(f"      {detail}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="慢查询日志报告")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="按指纹汇总排名")
+    report_parser.add_argument("path", help="慢查询日志（SLOW_QUERY_LOG）")
+    report_parser.add_argument("--top", type=int, default=20, help="显示前几名")
+    report_parser.add_argument("--sort", choices=["total", "count", "max", "avg"], default="total",
+                               help="排序依据，默认总耗时")
+    report_parser.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args()
+    if not os.path.exists(args.path):
+        print(f"文件不存在: {args.path}", file=sys.stderr)
+        sys.exit(1)
+    report(args.path, args.top, args.sort, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+上传图片的静态文件服务
+
+- 热门图片的文件描述符缓存（LRU）：不必每个请求都 open/fstat/close。多个请求共享同一个
+  描述符，各自用 os.pread 按自己的偏移读取，互不干扰；被淘汰的描述符等最后一个使用者
+  读完才真正关闭。
+- 条件请求与分段下载交给 werkzeug 的 make_conditional 处理（ETag、If-Modified-Since、
+  Range/If-Range、206/304/416）。
+- 按内容哈希命名的文件内容永不改变，返回 Cache-Control: immutable 和一年的 max-age，
+  客户端和代理缓存后不再回源验证；ETag 就是内容哈希。
+- 部署在 nginx/Apache 之后时设置 USE_X_SENDFILE，由前端服务器用 sendfile 零拷贝发送。
+
+没有 os.pread 的平台（Windows）不缓存描述符，每个请求单独打开文件。
+"""
+import io
+import mimetypes
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+# 内容寻址文件名：<2位>/<2位>/<64位sha256><扩展名>
+_CONTENT_ADDRESSED_RE = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})\.[a-z0-9]+$")
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+MUTABLE_MAX_AGE = 3600
+
+HAS_PREAD = hasattr(os, "pread")
+
+# 每次读取/发送的块大小
+CHUNK_SIZE = 64 * 1024
+
+
+class CachedFile:
+    """缓存中的一个已打开文件"""
+    __slots__ = ("path", "fd", "size", "mtime", "checked_at", "refs", "evicted")
+
+    def __init__(self, path, fd, size, mtime):
+        self.path = path
+        self.fd = fd
+        self.size = size
+        self.mtime = mtime
+        self.checked_at = time.monotonic()
+        self.refs = 0
+        self.evicted = False
+
+
+class FileHandleCache:
+    """按路径缓存打开的文件描述符"""
+
+    def __init__(self, max_entries=256, revalidate_after=5.0):
+        self.max_entries = max_entries
+        self.revalidate_after = revalidate_after  # 超过这么多秒重新 stat，发现文件被删除或替换
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def acquire(self, path) -> CachedFile:
+        """取得文件（引用计数加一），文件不存在时抛出 FileNotFoundError"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - entry.checked_at > self.revalidate_after:
+                if self._is_stale(entry):
+                    self._evict(path)
+                    entry = None
+                else:
+                    entry.checked_at = now
+            if entry is not None:
+                self._entries.move_to_end(path)
+                entry.refs += 1
+                self._stats["hits"] += 1
+                return entry
+            self._stats["misses"] += 1
+
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        st = os.fstat(fd)
+        entry = CachedFile(path, fd, st.st_size, st.st_mtime)
+        entry.refs = 1
+        with self._lock:
+            existing = self._entries.get(path)
+            if existing is not None:
+                # 并发打开了同一个文件，用已缓存的那个
+                os.close(fd)
+                existing.refs += 1
+                return existing
+            self._entries[path] = entry
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+        return entry
+
+    def release(self, entry: CachedFile):
+        """归还文件，已淘汰且无人使用时关闭描述符"""
+        with self._lock:
+            entry.refs -= 1
+            if entry.evicted and entry.refs == 0:
+                os.close(entry.fd)
+
+    def _is_stale(self, entry) -> bool:
+        try:
+            st = os.stat(entry.path)
+        except OSError:
+            return True
+        return st.st_size != entry.size or st.st_mtime != entry.mtime
+
+    def _evict(self, path):
+        entry = self._entries.pop(path)
+        entry.evicted = True
+        self._stats["evictions"] += 1
+        if entry.refs == 0:
+            os.close(entry.fd)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            for path in list(self._entries):
+                self._evict(path)
+
+
+class PreadReader(io.RawIOBase):
+    """共享描述符上的独立读取位置，关闭时归还给缓存"""
+
+    def __init__(self, cache: FileHandleCache, entry: CachedFile):
+        super().__init__()
+        self._cache = cache
+        self._entry = entry
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = self._entry.size + offset
+        return self._pos
+
+    def read(self, size=-1):
+        # 直接返回 pread 的结果，省掉 RawIOBase 默认实现里的一次拷贝
+        if size is None or size < 0:
+            size = max(self._entry.size - self._pos, 0)
+        data = os.pread(self._entry.fd, size, self._pos)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = os.pread(self._entry.fd, len(buffer), self._pos)
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._cache.release(self._entry)
+        super().close()
+
+
+class UploadServer:
+    """上传目录的文件服务"""
+
+    def __init__(self, root, fd_cache_size=1024):
+        self.root = root
+        self.fd_cache = FileHandleCache(fd_cache_size) if HAS_PREAD and fd_cache_size else None
+
+    def _open(self, path):
+        """返回 (文件对象, 大小, 修改时间)"""
+        if self.fd_cache is not None:
+            entry = self.fd_cache.acquire(path)
+            return PreadReader(self.fd_cache, entry), entry.size, entry.mtime
+        f = open(path, "rb")
+        st = os.fstat(f.fileno())
+        return f, st.st_size, st.st_mtime
+
+    def send(self, app, request, filename):
+        """发送 filename（相对上传目录），支持条件请求和 Range"""
+        path = safe_join(self.root, filename)
+        if path is None or filename.startswith(".") or not os.path.isfile(path):
+            raise NotFound()
+
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        match = _CONTENT_ADDRESSED_RE.match(filename)
+
+        if match and request.if_none_match.contains(match.group(3)):
+            # 内容寻址文件的 ETag 就是文件名里的哈希，不用打开文件就能确认未修改
+            response = app.response_class(status=304)
+            response.set_etag(match.group(3))
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+            return response
+
+        if app.config.get("USE_X_SENDFILE"):
+            # 前端服务器读取 X-Sendfile 头指定的文件，用 sendfile 零拷贝发送
+            st = os.stat(path)
+            response = app.response_class(mimetype=mimetype, direct_passthrough=True)
+            response.headers["X-Sendfile"] = path
+            size, mtime = st.st_size, st.st_mtime
+        else:
+            try:
+                f, size, mtime = self._open(path)
+            except FileNotFoundError:
+                raise NotFound()
+            response = app.response_class(wrap_file(request.environ, f, CHUNK_SIZE), mimetype=mimetype,
+                                          direct_passthrough=True)
+            response.content_length = size
+
+        response.last_modified = int(mtime)
+        response.cache_control.public = True
+        if match:
+            response.set_etag(match.group(3))
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.set_etag(f"{int(mtime)}-{size}")
+            response.cache_control.max_age = MUTABLE_MAX_AGE
+        try:
+            return response.make_conditional(request.environ, accept_ranges=True, complete_length=size)
+        except Exception:
+            response.close()  # 416 等异常响应不会再迭代文件，立即归还描述符
+            raise
@@ -0,0 +1,132 @@
+"""
+测试公用的夹具
+
+服务器模块按 server/ 目录下的平铺方式互相导入（import fulltext 等），这里把 server/ 和项目根目录加到路径里，
+与直接运行 python server/flask_app.py 时相同。
+"""
+import contextlib
+import itertools
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """已建表并执行完全部结构修订的空数据库"""
+    from frontend.init_database import init_database
+    path = str(tmp_path / "user.db")
+    init_database(path)
+    return path
+
+
+@pytest.fixture
+def open_db(db_path):
+    """打开与服务器相同设置（注册了分词函数）的连接，测试结束时关闭"""
+    from bulk_io import open_database
+    connections = []
+
+    def open_connection(query_only=False):
+        conn = open_database(db_path, query_only=query_only)
+        connections.append(conn)
+        return conn
+
+    yield open_connection
+    for conn in connections:
+        conn.close()
+
+
+@pytest.fixture
+def connect(open_db):
+    """Broadcaster 等需要的只读连接上下文管理器工厂（对应服务器的 get_database_connection）"""
+    conn = open_db(query_only=True)
+
+    @contextlib.contextmanager
+    def get_connection():
+        yield conn
+    return get_connection
+
+
+@pytest.fixture
+def add_post(open_db):
+    """直接写入一条帖子并提交，返回 id"""
+    conn = open_db()
+    user_id = conn.execute("INSERT INTO users (username, password, salt) VALUES ('poster', '', '')").lastrowid
+    conn.commit()
+
+    def insert(item_type="失物信息", item_name="黑色钱包", category="证件", **columns):
+        values = {"user_id": user_id, "type": item_type, "item_name": item_name, "item_category": category,
+                  "description": "", "location": "图书馆", **columns}
+        post_id = conn.execute(f"INSERT INTO posts ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                               list(values.values())).lastrowid
+        conn.commit()
+        return post_id
+    insert.conn = conn
+    return insert
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """
+    指向临时数据库和上传目录的服务器模块
+
+    flask_app 在导入时按环境变量创建全局对象，整个测试会话只能导入一次，各用例之间共享同一个数据库，
+    因此用例自己注册用户、只断言自己创建的帖子。
+    """
+    root = tmp_path_factory.mktemp("app")
+    os.environ["DB_PATH"] = str(root / "user.db")
+    os.environ["UPLOAD_DIR"] = str(root / "uploads")
+    os.environ.setdefault("SECRET_KEY", "test")
+    from frontend.init_database import init_database
+    init_database(os.environ["DB_PATH"])
+    import flask_app
+    yield flask_app
+    flask_app.shutdown_app()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+_usernames = itertools.count(1)
+
+
+@pytest.fixture
+def login(client):
+    """注册并登录一个新用户，返回用户名"""
+    username = f"tester{next(_usernames)}"
+    client.post("/api/register", json={"username": username, "password": "pw123456"})
+    response = client.post("/api/login", json={"username": username, "password": "pw123456"})
+    assert response.json["success"], response.json
+    return username
+
+
+@pytest.fixture
+def publish(client):
+    """以当前登录用户调用 /api/post 发帖，返回 id"""
+    def publish_post(**fields):
+        data = {"type": "失物信息", "item_name": "物品", "location": "图书馆", **fields}
+        response = client.post("/api/post", data=data, content_type="multipart/form-data")
+        assert response.json["success"], response.json
+        return response.json["data"]["id"]
+    return publish_post
+
+
+@pytest.fixture
+def query_db(app_module):
+    """在服务器的数据库上执行一条查询，返回全部结果"""
+    def query(sql, params=()):
+        conn = sqlite3.connect(os.environ["DB_PATH"])
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+    return query
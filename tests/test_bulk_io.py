@@ -0,0 +1,40 @@
+"""批量导入：缺省列取表结构默认值，出错时报告位置和已提交的条数"""
+import io
+
+import pytest
+
+from bulk_io import ImportAborted, import_posts, read_records
+
+
+def run_import(conn, text, fmt="csv", **options):
+    return import_posts(conn, read_records(io.StringIO(text), fmt), **options)
+
+
+def test_minimal_csv_gets_schema_defaults(open_db):
+    conn = open_db()
+    counts = run_import(conn, "username,type,item_name,location\nalice,失物信息,黑色钱包,图书馆\n")
+    assert counts == {"read": 1, "imported": 1, "skipped": 0, "users_created": 1}
+    status, created_at = conn.execute("SELECT status, created_at FROM posts").fetchone()
+    assert status == "active"
+    assert created_at is not None
+    # 计数表和匹配索引都按 active 维护
+    assert conn.execute("SELECT SUM(count) FROM post_counts WHERE status = 'active'").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM match_terms").fetchone()[0] > 0
+
+
+def test_given_status_and_time_are_kept(open_db):
+    conn = open_db()
+    run_import(conn, '{"username": "bob", "type": "招领信息", "item_name": "雨伞", "location": "食堂", '
+                     '"status": "found", "created_at": "2024-09-01 08:00:00"}\n', fmt="ndjson")
+    assert conn.execute("SELECT status, created_at FROM posts").fetchone() == ("found", "2024-09-01 08:00:00")
+
+
+def test_bad_record_reports_position_and_committed_counts(open_db):
+    conn = open_db()
+    rows = "".join(f"u{i},失物信息,物品{i},图书馆\n" for i in range(3))
+    with pytest.raises(ImportAborted) as excinfo:
+        run_import(conn, "username,type,item_name,location\n" + rows + "u3,失物信息,,图书馆\n", chunk_size=2)
+    assert "第 4 条" in str(excinfo.value)
+    assert excinfo.value.counts["imported"] == 2
+    # 出错记录所在的块整体回滚
+    assert conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0] == 2
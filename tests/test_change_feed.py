@@ -0,0 +1,53 @@
+"""变更日志：合并、墓碑与 reset"""
+import change_feed
+
+
+def test_changes_are_merged_per_post(add_post):
+    conn = add_post.conn
+    post_id = add_post()
+    conn.execute("UPDATE posts SET status = 'found' WHERE id = ?", (post_id,))
+    conn.commit()
+
+    data = change_feed.read_changes(conn, 0)
+    assert [(c["id"], c["op"]) for c in data["changes"]] == [(post_id, "created")]
+    assert data["next_since"] == data["latest"] == 2
+
+    data = change_feed.read_changes(conn, 1)
+    assert data["changes"] == [{"seq": 2, "id": post_id, "op": "status", "status": "found",
+                                "type": "失物信息", "item_category": "证件"}]
+
+
+def test_deleted_post_leaves_tombstone(add_post):
+    conn = add_post.conn
+    post_id = add_post(item_type="招领信息", category="电子产品")
+    kept_id = add_post()
+    conn.execute("DELETE FROM posts WHERE id = ?", (post_id,))
+    conn.commit()
+
+    changes = change_feed.read_changes(conn, 0)["changes"]
+    assert [(c["id"], c["op"]) for c in changes] == [(kept_id, "created"), (post_id, "deleted")]
+    # 墓碑带删除前的类型和分类，按类型订阅的客户端也能收到
+    assert changes[1]["type"] == "招领信息" and changes[1]["item_category"] == "电子产品"
+
+
+def test_pruned_or_replaced_log_resets(add_post):
+    conn = add_post.conn
+    add_post()
+    add_post()
+    conn.execute("DELETE FROM post_changes WHERE seq = 1")
+    conn.execute("UPDATE data_versions SET version = 1 WHERE name = 'post_changes_pruned'")
+    conn.commit()
+
+    assert change_feed.read_changes(conn, 0)["reset"] is True
+    assert change_feed.read_changes(conn, 1)["reset"] is False
+    # 客户端的序号比数据库的还新：数据库被换过
+    data = change_feed.read_changes(conn, 10)
+    assert data["reset"] is True and data["next_since"] == 2
+
+
+def test_latest_seq_does_not_go_back_after_prune(add_post):
+    conn = add_post.conn
+    add_post()
+    conn.execute("DELETE FROM post_changes")
+    conn.commit()
+    assert change_feed.latest_seq(conn) == 1
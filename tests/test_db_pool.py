@@ -0,0 +1,36 @@
+"""连接池：查询日志不记录密码哈希"""
+import json
+
+from db_pool import ConnectionPool, redact_statement
+
+
+def test_trace_log_redacts_user_writes(db_path, tmp_path):
+    trace_path = str(tmp_path / "queries.jsonl")
+    pool = ConnectionPool(db_path, trace_path=trace_path, query_only=True)
+    writer = pool.connect(query_only=False)
+    writer.execute("INSERT INTO users (username, password, salt) VALUES (?, ?, ?)",
+                   ("alice", "pbkdf2$secret-hash", "secret-salt"))
+    writer.execute("UPDATE users SET password = ?, salt = ? WHERE id = ?", ("new-hash", "new-salt", 1))
+    writer.commit()
+    with pool.connection() as conn:
+        conn.execute("SELECT id FROM posts WHERE item_name = ?", ("黑色钱包",)).fetchall()
+    writer.close()
+    pool.close_all()
+
+    with open(trace_path, encoding="utf-8") as f:
+        statements = [json.loads(line)["sql"] for line in f]
+    text = "\n".join(statements)
+    for secret in ("secret-hash", "secret-salt", "new-hash", "new-salt", "alice"):
+        assert secret not in text
+    assert "INSERT INTO users (username, password, salt) VALUES ('?', '?', '?')" in statements
+    # 其他语句照常记录参数值，供 index_advisor 回放
+    assert "SELECT id FROM posts WHERE item_name = '黑色钱包'" in statements
+
+
+def test_redact_keeps_statement_shape():
+    assert redact_statement("UPDATE users SET password = X'00ff' WHERE id = 3") == \
+        "UPDATE users SET password = '?' WHERE id = 3"
+    assert redact_statement("SELECT id, password, salt FROM users WHERE username = 'bob'") == \
+        "SELECT id, password, salt FROM users WHERE username = '?'"
+    sql = "SELECT p.id FROM posts p LEFT JOIN users u ON u.id = p.user_id WHERE p.type = '失物信息'"
+    assert redact_statement(sql) == sql
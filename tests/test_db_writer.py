@@ -0,0 +1,101 @@
+"""WriteQueue：组提交、任务级回滚与提交后才返回"""
+import sqlite3
+import threading
+
+import pytest
+
+from db_writer import WriteQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    path = str(tmp_path / "writer.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (value TEXT UNIQUE)")
+    conn.close()
+    write_queue = WriteQueue(lambda: sqlite3.connect(path, check_same_thread=False)).start()
+    write_queue.path = path
+    yield write_queue
+    write_queue.stop(5)
+
+
+def read_values(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(row[0] for row in conn.execute("SELECT value FROM t"))
+    finally:
+        conn.close()
+
+
+def insert(conn, value):
+    conn.execute("INSERT INTO t (value) VALUES (?)", (value,))
+    return value
+
+
+def insert_then_fail(conn, value):
+    conn.execute("INSERT INTO t (value) VALUES (?)", (value,))
+    raise RuntimeError("job failed")
+
+
+def hold_writer(queue):
+    """占住写线程，让随后提交的任务排队进同一个组事务；返回放行用的 Event"""
+    entered, release = threading.Event(), threading.Event()
+
+    def blocker(conn):
+        entered.set()
+        release.wait(5)
+    queue.submit(blocker)
+    assert entered.wait(5)
+    return release
+
+
+def test_execute_returns_after_commit(queue):
+    assert queue.execute(insert, "a") == "a"
+    # 另一个连接立即可见，说明已提交
+    assert read_values(queue.path) == ["a"]
+
+
+def test_failed_job_rolls_back_only_itself(queue):
+    release = hold_writer(queue)
+    ok_before = queue.submit(insert, "before")
+    failed = queue.submit(insert_then_fail, "failed")
+    ok_after = queue.submit(insert, "after")
+    release.set()
+
+    assert ok_before.result(5) == "before"
+    assert ok_after.result(5) == "after"
+    with pytest.raises(RuntimeError):
+        failed.result(5)
+    assert read_values(queue.path) == ["after", "before"]
+    stats = queue.stats()
+    assert stats["max_batch"] == 3
+    assert stats["failed"] == 1
+
+
+def test_constraint_error_is_isolated(queue):
+    queue.execute(insert, "dup")
+    release = hold_writer(queue)
+    duplicate = queue.submit(insert, "dup")
+    other = queue.submit(insert, "other")
+    release.set()
+
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result(5)
+    assert other.result(5) == "other"
+    assert read_values(queue.path) == ["dup", "other"]
+
+
+def test_exclusive_job_runs_outside_group_transaction(queue):
+    def in_transaction(conn):
+        return conn.in_transaction
+    assert queue.execute(in_transaction) is True
+    assert queue.execute(in_transaction, exclusive=True) is False
+
+
+def test_stop_drains_queued_jobs(queue):
+    release = hold_writer(queue)
+    futures = [queue.submit(insert, str(i)) for i in range(5)]
+    release.set()
+    queue.stop(5)
+    assert [future.result(0) for future in futures] == [str(i) for i in range(5)]
+    assert len(read_values(queue.path)) == 5
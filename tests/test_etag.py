@@ -0,0 +1,11 @@
+"""ETag / If-None-Match"""
+
+
+def test_list_revalidation(client, login, publish):
+    etag = client.get("/api/get_lost_items").headers["ETag"]
+    assert client.get("/api/get_lost_items", headers={"If-None-Match": etag}).status_code == 304
+
+    publish(item_name="新帖子")
+    changed = client.get("/api/get_lost_items", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
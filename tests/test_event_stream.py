@@ -0,0 +1,145 @@
+"""Broadcaster：订阅、推送、筛选、断线补读与关闭"""
+import json
+import threading
+import time
+
+import pytest
+
+from event_stream import Broadcaster, StreamFull
+
+
+def load_items(conn, ids):
+    """created/updated 事件附带的帖子（服务器用列表接口的字段，这里只取筛选用到的）"""
+    return {row[0]: {"id": row[0], "type": row[1], "item_category": row[2]} for row in conn.execute(
+        "SELECT id, type, item_category FROM posts WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),))}
+
+
+@pytest.fixture
+def broadcaster(connect):
+    # 轮询间隔设得很长，由用例显式调用 poll()，结果不依赖计时
+    b = Broadcaster(connect, item_loader=load_items, poll_interval=60, max_subscribers=2)
+    yield b
+    b.stop(5)
+
+
+def event_ids(events):
+    return [event[0] for event in events]
+
+
+def test_subscriber_receives_new_changes(broadcaster, add_post):
+    subscription = broadcaster.subscribe()
+    post_id = add_post()
+    broadcaster.poll()
+
+    chunk = subscription.next_chunk(timeout=0)
+    assert "event: created" in chunk
+    assert f'"id":{post_id}' in chunk
+    # 已发送的事件不会重复
+    assert subscription.next_chunk(timeout=0) == ""
+
+
+def test_filter_by_type(broadcaster, add_post):
+    subscription = broadcaster.subscribe(item_type="招领信息")
+    add_post(item_type="失物信息")
+    found_id = add_post(item_type="招领信息")
+    broadcaster.poll()
+
+    chunk = subscription.next_chunk(timeout=0)
+    assert chunk.count("event: created") == 1
+    assert f'"id":{found_id}' in chunk
+
+
+def test_waiting_subscriber_is_woken_by_poll(broadcaster, add_post):
+    subscription = broadcaster.subscribe()
+    received = []
+    waiter = threading.Thread(target=lambda: received.extend(subscription.next_events(timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+    post_id = add_post()
+    broadcaster.poll()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert len(received) == 1 and f'"id":{post_id}' in received[0][3]
+
+
+def test_close_releases_slot(broadcaster):
+    first = broadcaster.subscribe()
+    broadcaster.subscribe()
+    with pytest.raises(StreamFull):
+        broadcaster.subscribe()
+    first.close()
+    first.close()  # 重复关闭不会多减
+    assert broadcaster.stats()["subscribers"] == 1
+    broadcaster.subscribe()
+
+
+def test_stop_wakes_waiting_subscriber(broadcaster):
+    subscription = broadcaster.subscribe()
+    done = threading.Event()
+
+    def wait():
+        subscription.next_events(timeout=30)
+        done.set()
+    threading.Thread(target=wait, daemon=True).start()
+    time.sleep(0.1)
+    broadcaster.stop(5)
+    assert done.wait(5)
+
+
+def test_reconnect_catches_up_from_change_log(connect, add_post):
+    b = Broadcaster(connect, item_loader=load_items, poll_interval=60, buffer_size=2)
+    try:
+        b.start()
+        ids = [add_post(item_name=f"物品{i}") for i in range(5)]
+        b.poll()
+        # 缓冲只剩最后两条，从第一条之后重连要回到变更日志补读
+        subscription = b.subscribe(last_event_id=1)
+        events = subscription.next_events(timeout=0)
+        assert event_ids(events) == [2, 3, 4, 5]
+        assert all(f'"id":{post_id}' in event[3] for event, post_id in zip(events, ids[1:]))
+        assert b.stats()["catch_up"] == 1
+    finally:
+        b.stop(5)
+
+
+def test_last_event_id_ahead_of_database_resets(broadcaster, add_post):
+    add_post()
+    subscription = broadcaster.subscribe(last_event_id=100)
+    events = subscription.next_events(timeout=0)
+    assert "event: reset" in events[0][3]
+    assert subscription.position == 1
+
+
+def test_thousand_idle_subscribers_on_one_worker(connect, add_post):
+    b = Broadcaster(connect, item_loader=load_items, poll_interval=60, max_subscribers=1000)
+    subscriptions = [b.subscribe() for _ in range(1000)]
+    try:
+        with pytest.raises(StreamFull):
+            b.subscribe()
+        assert b.stats()["subscribers"] == 1000
+
+        # 每个订阅者一个线程阻塞等待，与 /api/stream 的响应生成器相同；一次轮询唤醒全部
+        received = [None] * len(subscriptions)
+        waiting = threading.Barrier(len(subscriptions) + 1)
+
+        def wait(i):
+            waiting.wait()
+            received[i] = subscriptions[i].next_events(timeout=10)
+        threads = [threading.Thread(target=wait, args=(i,), daemon=True) for i in range(len(subscriptions))]
+        for thread in threads:
+            thread.start()
+        waiting.wait()
+        post_id = add_post()
+        polls = b.stats()["polls"]
+        b.poll()
+        for thread in threads:
+            thread.join(10)
+
+        assert b.stats()["polls"] == polls + 1
+        assert all(events is not None and event_ids(events) == [1] for events in received)
+        assert all(f'"id":{post_id}' in events[0][3] for events in received)
+    finally:
+        for subscription in subscriptions:
+            subscription.close()
+        b.stop(5)
+    assert b.stats()["subscribers"] == 0
@@ -0,0 +1,33 @@
+"""关键字搜索：走全文索引和退回 LIKE 的结果必须与 LIKE 子串匹配一致"""
+import pytest
+
+import fulltext
+
+NAMES = ["iPhone 13", "AirPods Pro", "黑色手机", "蓝牙耳机", "U盘 64G", "校园卡"]
+
+
+@pytest.fixture
+def search_posts(client, login, publish):
+    category = "搜索测试"
+    for name in NAMES:
+        publish(item_name=name, item_category=category, description="在图书馆捡到")
+    return category
+
+
+@pytest.mark.parametrize("keyword", ["phone", "pods", "Phone 13", "PHONE", "64g", "手机", "耳机", "机", "图书馆"])
+def test_keyword_search_matches_like(client, query_db, search_posts, keyword):
+    data = client.get("/api/get_lost_items", query_string={"keyword": keyword, "category": search_posts,
+                                                           "limit": 100}).json["data"]
+    pattern = f"%{keyword}%"
+    expected = [row[0] for row in query_db(
+        "SELECT id FROM posts WHERE item_category = ? AND (item_name LIKE ? OR description LIKE ? OR location LIKE ?)"
+        " ORDER BY created_at DESC, id DESC", (search_posts, pattern, pattern, pattern))]
+    assert expected
+    assert [item["id"] for item in data["items"]] == expected
+
+
+def test_latin_keywords_do_not_use_the_index():
+    # 英文和数字按整词索引，词中间的子串查不到，只能走 LIKE
+    assert fulltext.build_match_query("phone") is None
+    assert fulltext.build_match_query("黑色 iPhone") is None
+    assert fulltext.build_match_query("黑色手机") == '("黑色" + "色手" + "手机")'
@@ -0,0 +1,58 @@
+"""图片按内容去重，引用计数由触发器维护"""
+import io
+import os
+
+from PIL import Image
+
+
+def png_bytes(color):
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_refcount_follows_posts(client, login, publish, query_db):
+    image = png_bytes("green")
+    first = publish(image=(io.BytesIO(image), "a.png"))
+    second = publish(image=(io.BytesIO(image), "b.png"))
+    paths = query_db("SELECT image_path FROM posts WHERE id IN (?, ?)", (first, second))
+    assert len({path for (path,) in paths}) == 1  # 相同内容只存一份
+    path = paths[0][0]
+
+    def refcount():
+        return query_db("SELECT refcount FROM images WHERE path = ?", (path,))[0][0]
+    assert refcount() == 2
+    assert client.post("/api/delete_item", json={"id": first}).json["success"]
+    assert refcount() == 1
+    # 编辑不能改图片，引用计数不变
+    client.post("/api/edit_item", json={"id": second, "item_name": "改名", "image_path": "other.png"})
+    assert refcount() == 1
+    assert client.post("/api/delete_item", json={"id": second}).json["success"]
+    assert refcount() == 0
+
+
+def test_staging_error_returns_json_and_leaves_no_temp_files(app_module, client, login, monkeypatch):
+    store = app_module.image_store
+    real_stage = store.stage
+    calls = []
+
+    def stage_then_fail(stream, filename):
+        # 原图暂存成功，写第一张缩略图时磁盘出错
+        calls.append(filename)
+        if len(calls) > 1:
+            raise OSError("No space left on device")
+        return real_stage(stream, filename)
+    monkeypatch.setattr(store, "stage", stage_then_fail)
+
+    data = {"type": "失物信息", "item_name": "物品", "location": "图书馆",
+            "image": (io.BytesIO(png_bytes("red")), "c.png")}
+    response = client.post("/api/post", data=data, content_type="multipart/form-data")
+    assert response.is_json and response.json["success"] is False
+    assert len(calls) == 2
+
+    calls.clear()
+    items = '[{"type": "失物信息", "item_name": "物品", "location": "图书馆"}]'
+    data = {"items": items, "image_0": (io.BytesIO(png_bytes("red")), "d.png")}
+    response = client.post("/api/post_batch", data=data, content_type="multipart/form-data")
+    assert response.status_code == 500 and response.json["success"] is False
+    assert os.listdir(store.temp_dir) == []
@@ -0,0 +1,26 @@
+"""失物/招领自动匹配"""
+import time
+
+
+def wait_for_matches(client, item_id, timeout=5):
+    """匹配在后台线程里计算，等到有结果或超时"""
+    deadline = time.monotonic() + timeout
+    while True:
+        matches = client.get(f"/api/matches/{item_id}").json["data"]["matches"]
+        if matches or time.monotonic() > deadline:
+            return [match["id"] for match in matches]
+        time.sleep(0.05)
+
+
+def test_lost_and_found_posts_are_matched(client, login, publish, query_db):
+    fields = {"item_name": "蓝色雨伞", "item_category": "生活用品", "description": "折叠蓝色雨伞",
+              "location": "体育馆东门"}
+    lost = publish(type="失物信息", **fields)
+    found = publish(type="招领信息", **fields)
+    assert wait_for_matches(client, lost) == [found]
+    assert wait_for_matches(client, found, timeout=0) == [lost]
+
+    # 找到后双方的匹配结果一起删除
+    assert client.post("/api/batch_items", json={"ids": [found], "action": "close"}).json["success"]
+    assert wait_for_matches(client, lost, timeout=0) == []
+    assert query_db("SELECT COUNT(*) FROM matches WHERE ? IN (post_id, match_id)", (found,))[0][0] == 0
@@ -0,0 +1,29 @@
+"""get_lost_items 分页：游标翻页与 limit 校验"""
+import pytest
+
+
+def test_keyset_cursor_walks_every_post_once(client, login, publish):
+    ids = [publish(item_category="分页测试") for _ in range(7)]
+    seen, cursor = [], ""
+    while True:
+        params = {"category": "分页测试", "limit": 3, "count": "none"}
+        if cursor:
+            params["cursor"] = cursor
+        data = client.get("/api/get_lost_items", query_string=params).json["data"]
+        seen.extend(item["id"] for item in data["items"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    # 同一秒内发布的帖子按 id 排序，翻页不重复不遗漏
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_bad_cursor_is_rejected(client):
+    response = client.get("/api/get_lost_items", query_string={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("limit", [-1, 0, 1001])
+def test_limit_out_of_range_is_rejected(client, login, limit):
+    assert client.get("/api/get_lost_items", query_string={"limit": limit}).status_code == 400
+    assert client.get("/api/my_items", query_string={"limit": limit}).status_code == 400
@@ -0,0 +1,49 @@
+"""结果缓存：条目带数据版本，其他进程写入后不再返回旧响应"""
+import os
+
+from bulk_io import open_database
+from query_cache import QueryCache
+
+
+def test_version_mismatch_is_a_miss():
+    cache = QueryCache()
+    key = QueryCache.make_key("list", {"limit": 10})
+    cache.put(key, b"old", cache.generation, "posts-v1")
+    assert cache.get(key, "posts-v1") == b"old"
+    assert cache.get(key, "posts-v2") is None
+    # 旧条目已删除，版本回到原值也不会再命中
+    assert cache.get(key, "posts-v1") is None
+    assert cache.stats()["stale"] == 1
+
+
+def test_put_after_local_write_is_dropped():
+    cache = QueryCache()
+    generation = cache.generation
+    cache.invalidate()
+    cache.put("key", b"body", generation, "posts-v1")
+    assert cache.get("key", "posts-v1") is None
+
+
+def test_write_from_another_process_is_not_served_from_cache(app_module, client, login, publish):
+    post_id = publish(item_name="缓存测试")
+    first = client.get(f"/api/get_item_detail/{post_id}")
+    assert client.get(f"/api/get_item_detail/{post_id}").get_data() == first.get_data()
+
+    # 绕过本进程的写队列直接改库，相当于另一个工作进程的写入
+    conn = open_database(os.environ["DB_PATH"], query_only=False)
+    try:
+        conn.execute("UPDATE posts SET item_name = '另一个进程改的' WHERE id = ?", (post_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    # 连接池换了新连接（工作进程刚启动或连接被回收）时也必须发现这次写入
+    app_module.pool.close_all()
+
+    second = client.get(f"/api/get_item_detail/{post_id}")
+    assert second.json["data"]["item_name"] == "另一个进程改的"
+    assert second.headers["ETag"] != first.headers["ETag"]
+    # 拿着旧 ETag 来的客户端得到新内容而不是 304
+    revalidated = client.get(f"/api/get_item_detail/{post_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 200
+    assert revalidated.json["data"]["item_name"] == "另一个进程改的"
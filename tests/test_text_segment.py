@@ -0,0 +1,31 @@
+"""前端本地镜像的分词必须与服务器相同，否则离线搜索和在线搜索的结果不一致"""
+import pytest
+
+import fulltext
+from frontend import text_segment
+from frontend.local_mirror import LocalMirror
+
+SAMPLES = ["", "黑色手机", "ＡＢＣ１２３ 黑色iPhone13", "黑色 手机 钱", "蓝色,雨伞", "丢了一个钱包！在图书馆3楼", "伞", "校园卡 张三",
+           "㐀㐁 豈更", "a", "蓝色 雨", "手 机"]
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_same_rules_as_server(text):
+    assert text_segment.segment_text(text) == fulltext.segment_text(text)
+    assert text_segment.build_match_query(text) == fulltext.build_match_query(text)
+
+
+def test_local_mirror_search(tmp_path):
+    mirror = LocalMirror(str(tmp_path / "mirror.db"))
+    items = [
+        {"id": 1, "type": "失物信息", "item_name": "黑色手机", "description": "", "location": "图书馆",
+         "created_at": "2026-10-01 10:00:00", "status": "active"},
+        {"id": 2, "type": "招领信息", "item_name": "校园卡", "description": "捡到一张校园卡", "location": "食堂",
+         "created_at": "2026-10-02 10:00:00", "status": "active"},
+    ]
+    mirror.bootstrap(5, [items])
+    assert [item["id"] for item in mirror.search("手机")["items"]] == [1]
+    assert [item["id"] for item in mirror.search("校园")["items"]] == [2]
+    # 单个汉字不能走索引，退回 LIKE
+    assert [item["id"] for item in mirror.search("卡")["items"]] == [2]
+    mirror.close()